@@ -6,11 +6,13 @@ load_dotenv()
 from hello_agents.protocols import A2AClient, A2AServer
 from hello_agents import SimpleAgent, HelloAgentsLLM
 from hello_agents.tools import Tool, ToolParameter
-import time, threading
+import os, time, threading
+
+# 每个专业 Agent 启动多个副本，由 A2ASkillRouter 在副本之间分发请求
+TECH_EXPERT_PORTS = [6000, 6010]
+SALES_ADVISOR_PORTS = [6001, 6011]
 
 # Technical Expert Agent
-tech_expert = A2AServer("tech_expert", "技术专家", version='1.0')
-@tech_expert.skill("answer")
 def answer_tech_question(text: str) -> str:
     import re
     match = re.search(r'answer\s+(.+)', text, re.IGNORECASE)
@@ -19,8 +21,6 @@ def answer_tech_question(text: str) -> str:
     return answer
 
 # Sales Advisor Agent
-sales_advisor = A2AServer("sales_advisor", "销售顾问", version='1.0')
-@sales_advisor.skill("answer")
 def answer_sales_question(text: str) -> str:
     import re
     match = re.search(r'answer\s+(.+)', text, re.IGNORECASE)
@@ -28,16 +28,24 @@ def answer_sales_question(text: str) -> str:
     answer = f"销售建议：关于'{question}'，我们目前有以下优惠活动..."
     return answer
 
+def start_replicas(name: str, description: str, skill, ports: list) -> list:
+    """ 在后台线程中启动同一 Agent 的多个副本，返回副本 URL 列表。 """
+    for port in ports:
+        server = A2AServer(name, description, version='1.0')
+        server.add_skill("answer", skill)
+        threading.Thread(target=lambda s=server, p=port: s.run(port=p), daemon=True).start()
+    return [f"http://localhost:{port}" for port in ports]
+
 # A2A Agent Service
 print("="*60)
 print("🚀 启动专业 Agent 服务")
 print("="*60)
-threading.Thread(target=lambda: tech_expert.run(port=6000), daemon=True).start()
-threading.Thread(target=lambda: sales_advisor.run(port=6001), daemon=True).start()
+tech_urls = start_replicas("tech_expert", "技术专家", answer_tech_question, TECH_EXPERT_PORTS)
+sales_urls = start_replicas("sales_advisor", "销售顾问", answer_sales_question, SALES_ADVISOR_PORTS)
 time.sleep(2)
 
-print("✓ 技术专家 Agent 启动在 http://localhost:6000")
-print("✓ 销售顾问 Agent 启动在 http://localhost:6001")
+print(f"✓ 技术专家 Agent 启动在 {', '.join(tech_urls)}")
+print(f"✓ 销售顾问 Agent 启动在 {', '.join(sales_urls)}")
 
 print("\n⏳ 等待服务启动...")
 time.sleep(2)
@@ -79,18 +87,43 @@ time.sleep(2)
 #         else:
 #             return f"Error: {response.get('error', 'Unknown error')}"
 
-from hello_agents.tools import A2ATool
+from a2a_intent import IntentClassifier
+from a2a_router import A2ASkillRouter, RoutedA2ATool
 
-tech_tool = A2ATool(
+# 工具名称和参数与 A2ATool 相同，接待员的工具列表不变；请求由路由器分发到负载最低 / 延迟最小的健康副本
+tech_router = A2ASkillRouter(tech_urls)
+sales_router = A2ASkillRouter(sales_urls)
+
+tech_tool = RoutedA2ATool(
+    tech_router,
     name="tech_expert",
     description="技术专家，回答技术相关问题",
-    agent_url="http://localhost:6000"
+    skill_name="answer",
+    on_call=lambda tool_name, _: llm_routes.append(tool_name)
 )
-sales_tool = A2ATool(
+sales_tool = RoutedA2ATool(
+    sales_router,
     name="sales_advisor",
     description="销售顾问，提供销售相关建议",
-    agent_url="http://localhost:6001"
+    skill_name="answer",
+    on_call=lambda tool_name, _: llm_routes.append(tool_name)
 )
+expert_tools = {tech_tool.name: tech_tool, sales_tool.name: sales_tool}
+
+# 本地意图预分类：有把握的问题直接转给对应专家，省去一次 LLM 调用；
+# 拿不准的才交给接待员 LLM，LLM 的选择作为分类器的训练样本；
+# 设置 A2A_ROUTE_LOG 时训练样本保存到该文件（自动轮转），否则只在内存中学习
+ROUTE_LOG = os.getenv("A2A_ROUTE_LOG") or None
+intent_classifier = IntentClassifier(
+    keywords={
+        "tech_expert": ["api", "sdk", "接口", "调用", "集成", "python", "代码", "报错", "错误", "部署",
+                        "配置", "安装", "文档", "bug", "技术", "参数", "版本兼容"],
+        "sales_advisor": ["价格", "多少钱", "报价", "优惠", "折扣", "购买", "企业版", "套餐", "订阅", "付费",
+                          "发票", "试用", "合同", "续费", "收费"],
+    },
+    log_path=ROUTE_LOG,
+)
+llm_routes = []
 
 print("\n" + "="*60)
 print("🤖 创建接待员 SimpleAgent")
@@ -119,9 +152,19 @@ print(f"✓ 已集成 A2A 工具: {receptionist.tool_registry.list_tools()}")
 def handle_customer_query(question: str) -> str:
     print(f"\n客户问题: {question}")
     print("=" * 50)
-    response = receptionist.run(question)
+    decision = intent_classifier.classify(question)
+    if decision.label is not None:
+        print(f"⚡ 本地路由 -> {decision.label}（{decision.source}，置信度 {decision.confidence:.2f}），跳过 LLM")
+        response = expert_tools[decision.label].run({"action": "ask", "question": question})
+    else:
+        llm_routes.clear()
+        response = receptionist.run(question)
+        # 只有 LLM 明确选择了一个专家时才作为训练样本
+        if len(set(llm_routes)) == 1:
+            intent_classifier.record(question, llm_routes[0], source="llm")
     print(f"\n客服回复: {response}")
     print("=" * 50)
+    return response
 
 # 测试不同类型的问题
 if __name__ == "__main__":
@@ -130,4 +173,12 @@ if __name__ == "__main__":
     print("=" * 60)
     handle_customer_query("你们的API如何调用？")
     handle_customer_query("企业版的价格是多少？")
-    handle_customer_query("如何集成到我的Python项目中？")
\ No newline at end of file
+    handle_customer_query("如何集成到我的Python项目中？")
+    handle_customer_query("企业版支持API调用吗？")
+
+    print(f"\n📊 路由决策来源: {intent_classifier.stats()}")
+
+    print("\n📊 副本负载:")
+    for router in (tech_router, sales_router):
+        for replica in router.stats():
+            print(f"   {replica}")
\ No newline at end of file
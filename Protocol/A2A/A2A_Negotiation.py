@@ -1,68 +1,115 @@
 from dotenv import load_dotenv
 
-from Protocol.A2A.A2A_Client import client
-
 load_dotenv()
-from hello_agents.protocols import A2AClient, A2AServer
-import time, threading
-
-agent1 = A2AServer("agent1", "Agent 1")
-@agent1.skill("propose")
-def handle_proposal(text: str) -> str:
-    print(f"[Agent 1] Received proposal: \n{text}\n")
-
-    import re
-    # 解析提案
-    match = re.search(r'propose\s+(.+)', text, re.IGNORECASE)
-    proposal_str = match.group(1).strip() if match else text
+import asyncio, time, threading
+
+from a2a_async import AsyncA2AClient, AsyncA2AServer, create_http_client, wait_until_ready
+from a2a_messages import Envelope, MessageValidationError
+from a2a_negotiation import ConcessionStrategy, NegotiationResponder, Negotiator, summarize
+
+# 四个可以承接任务的 Agent：报价策略、所需工期和响应速度各不相同
+WORKERS = {
+    # 名称: (端口, 让步策略, 最少天数, 每轮思考时间)
+    "agent1": (7000, ConcessionStrategy(initial=120, reservation=80), 5, 0.02),
+    "agent2": (7001, ConcessionStrategy(initial=100, reservation=70, exponent=0.5), 6, 0.05),
+    "agent3": (7002, ConcessionStrategy(initial=90, reservation=60), 10, 0.02),    # 工期太长，会被放弃
+    "agent4": (7003, ConcessionStrategy(initial=80, reservation=50), 5, 1.5),      # 响应太慢，单轮超时
+}
+WORKER_URLS = {name: f"http://localhost:{port}" for name, (port, *_) in WORKERS.items()}
+
+servers = {}
+responders = {}
+for name, (port, strategy, min_days, think_time) in WORKERS.items():
+    servers[name] = AsyncA2AServer(name, f"承接任务的 {name}")
+    responders[name] = NegotiationResponder(servers[name], strategy, min_days=min_days, think_time=think_time)
+
+coordinator = Negotiator(
+    "coordinator",
+    ConcessionStrategy(initial=60, reservation=100),
+    max_days=7,
+    deadline=3.0,
+    round_timeout=0.5,
+)
+
+
+def print_negotiation(negotiation):
+    info = negotiation.to_dict()
+    print(f"  {info['counterparty']:<24} {info['state']:<10} 轮数 {info['rounds']}  "
+          f"价格 {info['price']}  天数 {info['days']}  {info['elapsed_ms']:>7.1f} ms  {info['reason']}")
+
+
+async def run_negotiation(http_client):
+    clients = [AsyncA2AClient(url, http_client=http_client) for url in WORKER_URLS.values()]
+
+    print("🤝 与 agent1 单独协商：")
+    negotiation = await coordinator.negotiate(clients[0], "开发新功能")
+    for round_no, state, price, days in negotiation.history:
+        print(f"  第 {round_no} 轮 {state:<10} 价格 {price}  天数 {days}")
+    print_negotiation(negotiation)
+
+    for select in ("best", "first"):
+        winner, negotiations = await coordinator.negotiate_many(clients, "开发新功能", select=select)
+        print(f"\n🤝 同时与 {len(clients)} 个 Agent 协商 (select={select})：")
+        for negotiation in negotiations:
+            print_negotiation(negotiation)
+        print(f"  🏆 胜出: {winner.counterparty if winner else '无'}")
+
+    # 格式错误或轮次乱序的报价会被拒绝，不会改变对方的协商状态
+    try:
+        await clients[0].send_message("negotiate", Envelope("offer", {"task": "开发新功能", "deadline": "5天"}))
+    except MessageValidationError as e:
+        print(f"\n⚠️ 报价格式错误: {e}")
     try:
-        proposal = eval(proposal_str)
-        task = proposal.get("task", "unknown task")
-        deadline = proposal.get("deadline", "unknown deadline")
-        if deadline >= 7:
-            result = {"accepted": True, "message": "接受提案"}
-        else:
-            result = {"accepted": False, "message": "截止日期太紧，无法接受", "counter_proposal": {"task": task, "deadline": 7}}
-        return str(result)
-    except Exception as e:
-        return str({"accepted": False, "message": f"提案格式错误: {e}"})
-
-agent2 = A2AServer("agent2", "Agent 2")
-@agent2.skill("negotiate")
-def negotiate(text: str) -> str:
-    print(f"[Agent 2] Starting negotiation with: \n{text}\n")
-
-    import re
-    # 解析协商请求
-    match = re.search(r'negotiate\s+task:(.+?)\s+deadline:(\d+)', text, re.IGNORECASE)
-    if match:
-        task = match.group(1).strip()
-        deadline = int(match.group(2).strip())
-        proposal = {"task": task, "deadline": deadline}
-        return str({"status": "negotiating", "proposal": proposal})
-    else:
-        return str({"status": "error", "message": "协商请求格式错误"})
+        await clients[0].send_message("negotiate", Envelope("offer", {
+            "negotiation_id": "unknown", "round": 3, "task": "开发新功能",
+            "price": 90.0, "days": 7, "expires_at": time.time() + 3}))
+    except MessageValidationError as e:
+        print(f"⚠️ 轮次错误: {e}")
 
 
-if __name__ == "__main__":
-    threading.Thread(target=lambda: agent1.run(port=7000), daemon=True).start()
-    threading.Thread(target=lambda: agent2.run(port=7001), daemon=True).start()
-    time.sleep(2)
-    print()
+async def benchmark(http_client, parallel=(1, 10, 50, 100)):
+    """ N 个任务同时分配，每个任务与 agent1 ~ agent3 并行协商，统计达成协议的轮数和延迟。 """
+    # 基准测的是吞吐，放宽超时，避免负载高时协商因超时失败
+    negotiator = Negotiator("benchmark", coordinator.strategy, max_days=coordinator.max_days,
+                            deadline=30.0, round_timeout=10.0)
+    clients = [AsyncA2AClient(WORKER_URLS[name], http_client=http_client) for name in ("agent1", "agent2", "agent3")]
+
+    print(f"\n📊 并行协商基准（每个任务 {len(clients)} 个对手方，select=best）：")
+    print(f"  {'任务数':>6} {'协商数':>6} {'成交':>6} {'平均轮数':>8} {'p50 ms':>8} {'p95 ms':>8} {'总耗时 s':>9}")
+    for n in parallel:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            negotiator.negotiate_many(clients, f"任务-{i}", select="best") for i in range(n)))
+        elapsed = time.perf_counter() - start
+        negotiations = [negotiation for _, group in results for negotiation in group]
+        # 只统计胜出的协商：落选的协议会被取消
+        stats = summarize([winner for winner, _ in results if winner is not None])
+        print(f"  {n:>6} {len(negotiations):>6} {stats['total']:>6} {stats['avg_rounds']:>8} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {elapsed:>9.2f}")
 
-    client1 = A2AClient("http://localhost:7000")
-    client2 = A2AClient("http://localhost:7001")
+    # 对比：逐个对手方顺序协商
+    n = 10
+    start = time.perf_counter()
+    for i in range(n):
+        for client in clients:
+            await negotiator.negotiate(client, f"顺序任务-{i}")
+    print(f"  顺序协商 {n} 个任务 × {len(clients)} 个对手方: {time.perf_counter() - start:.2f}s")
+    print(f"  响应方会话: { {name: responders[name].stats() for name in ('agent1', 'agent2', 'agent3')} }")
 
-    negotiation = client2.execute_skill(
-        "negotiate",
-        "negotiate task:开发新功能 deadline:5"
-    )
-    print(f"协商请求：\n{negotiation.get('result')}\n")
 
-    proposal = client1.execute_skill(
-        "propose",
-        "propose {'task': '开发新功能', 'deadline': 5}"
-    )
-    print(f"提案评估：\n{proposal.get('result')}\n")
+async def main():
+    async with create_http_client(max_connections=500, max_keepalive=500) as http_client:
+        await wait_until_ready(list(WORKER_URLS.values()), http_client=http_client)
+        await run_negotiation(http_client)
+        await benchmark(http_client)
+
+
+if __name__ == "__main__":
+    for name, (port, *_) in WORKERS.items():
+        threading.Thread(target=servers[name].run, kwargs={"port": port}, daemon=True).start()
+    time.sleep(1)
+    print()
+
+    asyncio.run(main())
 
-    print("协商完成")
\ No newline at end of file
+    print("\n协商完成")
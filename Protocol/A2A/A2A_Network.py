@@ -1,43 +1,73 @@
-from hello_agents.protocols import A2AClient, A2AServer
-import time, threading
-
-researcher = A2AServer("researcher", "研究员")
-
-@researcher.skill("research")
-def do_research(text: str) -> str:
-    import re
-    match = re.search(r'research\s+(.+)', text, re.IGNORECASE)
-    topic = match.group(1).strip() if match else text.strip()
-    return str({'topic': topic, 'findings': f"Detailed research findings on {topic}."})
-
-writer = A2AServer("writer", "撰写者")
-@writer.skill("write")
-def do_write(text: str) -> str:
-    import re
-    match = re.search(r'write\s+(.+)', text, re.IGNORECASE)
-    content = match.group(1).strip() if match else text.strip()
-    try:
-        data = eval(content)
-        topic = data.get('topic', 'unknown topic')
-        findings = data.get('findings', '')
-    except:
-        topic = 'unknown topic'
-        findings = content
-
-    return f"Article on {topic}:\n{findings}\n\nThis article provides an in-depth look into {topic} based on the research findings."
-
-editor = A2AServer("editor", "编辑")
-@editor.skill("edit")
-def do_edit(text: str) -> str:
-    import re
-    match = re.search(r'edit\s+(.+)', text, re.IGNORECASE)
-    content = match.group(1).strip() if match else text.strip()
-    result = {
-        'article': content + "\n\nEdited for clarity and conciseness.",
+from hello_agents.protocols import A2AClient
+import asyncio, contextlib, time, threading
+
+from a2a_async import AsyncA2AClient, AsyncA2AServer, create_http_client, iter_lines, stream_pipeline
+from a2a_messages import Envelope, Field, register_schema
+
+# 模拟每个技能中调用 LLM / 外部服务的耗时（秒）
+SKILL_LATENCY = 0.05
+
+# 异步服务器：接口与 A2AServer 相同，async 技能在事件循环中执行，同一服务器可并发处理多个对话
+researcher = AsyncA2AServer("researcher", "研究员")
+writer = AsyncA2AServer("writer", "撰写者")
+editor = AsyncA2AServer("editor", "编辑")
+
+# 各阶段之间传递的消息类型：收发两端都按模式校验，不再用 str() 序列化、eval() 解析
+register_schema("research_request", topic=Field(str))
+register_schema("research_result", topic=Field(str), findings=Field(str))
+register_schema("article", topic=Field(str), content=Field(str))
+register_schema("edit_result", article=Field(str), feedback=Field(str), approved=Field(bool))
+
+@researcher.message_skill("research", "research_request", "research_result")
+async def do_research(request: dict) -> dict:
+    await asyncio.sleep(SKILL_LATENCY)
+    topic = request['topic'].strip()
+    return {'topic': topic, 'findings': f"Detailed research findings on {topic}."}
+
+@writer.message_skill("write", "research_result", "article")
+async def do_write(research: dict) -> dict:
+    await asyncio.sleep(SKILL_LATENCY)
+    topic = research['topic']
+    findings = research['findings']
+    content = f"Article on {topic}:\n{findings}\n\nThis article provides an in-depth look into {topic} based on the research findings."
+    return {'topic': topic, 'content': content}
+
+@editor.message_skill("edit", "article", "edit_result")
+async def do_edit(article: dict) -> dict:
+    await asyncio.sleep(SKILL_LATENCY)
+    return {
+        'article': article['content'] + "\n\nEdited for clarity and conciseness.",
         'feedback': "Well-structured article.",
         'approved': True
     }
-    return str(result)
+
+# ==================== 流式技能 ====================
+# 研究结果按行逐块产出，撰写者和编辑收到一行就处理一行，不必等待上游全部完成
+
+STREAM_SECTIONS = 5
+
+@researcher.stream_skill("research_stream")
+async def stream_research(chunks):
+    topic = "".join([chunk async for chunk in chunks]).strip()
+    for i in range(STREAM_SECTIONS):
+        await asyncio.sleep(SKILL_LATENCY)
+        yield f"Finding {i + 1} on {topic}.\n"
+
+@writer.stream_skill("write_stream")
+async def stream_write(chunks):
+    async for finding in iter_lines(chunks):
+        await asyncio.sleep(SKILL_LATENCY)
+        yield f"Paragraph based on: {finding}"
+
+@editor.stream_skill("edit_stream")
+async def stream_edit(chunks):
+    async for paragraph in iter_lines(chunks):
+        await asyncio.sleep(SKILL_LATENCY)
+        yield f"[edited] {paragraph}"
+
+# 流水线中每个阶段只接受上一个阶段作为上游
+writer.allow_upstreams("http://localhost:5000")
+editor.allow_upstreams("http://localhost:5001")
 
 threading.Thread(target=lambda: researcher.run(port=5000), daemon=True).start()
 threading.Thread(target=lambda: writer.run(port=5001), daemon=True).start()
@@ -48,21 +78,96 @@ researcher_client = A2AClient("http://localhost:5000")
 writer_client = A2AClient("http://localhost:5001")
 editor_client = A2AClient("http://localhost:5002")
 
-def collaborative_article_creation(topic: str) -> str:
-    research = researcher_client.execute_skill('research', f'research {topic}')
-    print(f"\nResearch结果：\n{research}")
-    research_data = research.get('result', '')
+def collaborative_article_creation(topic: str, verbose: bool = True) -> dict:
+    # 同步客户端走 /execute 接口，消息以 JSON 信封传递；每个阶段的回复正是下一阶段需要的消息，直接转发
+    request = Envelope("research_request", {"topic": topic}, sender="coordinator")
+    research = researcher_client.execute_skill('research', request.to_json())
+    if verbose:
+        print(f"\nResearch结果：\n{research}")
 
-    article = writer_client.execute_skill('write', f'write {research_data}')
-    print(f"\nWrite结果：\n{article}")
-    article_content = article.get('result', '')
+    article = writer_client.execute_skill('write', research.get('result', ''))
+    if verbose:
+        print(f"\nWrite结果：\n{article}")
 
-    edit = editor_client.execute_skill('edit', f'edit {article_content}')
-    print(f"\nEdit结果：\n{edit}")
-    edit_data = edit.get('result', '')
+    edit = editor_client.execute_skill('edit', article.get('result', ''))
+    if verbose:
+        print(f"\nEdit结果：\n{edit}")
 
-    return edit_data
+    if edit.get('status') != 'success':
+        return {'error': edit.get('error', 'Unknown error')}
+    return Envelope.from_json(edit['result']).payload
+
+async def collaborative_article_creation_async(topic: str, http_client=None, codec: str = None) -> dict:
+    """
+    异步版本：三个阶段仍按顺序执行，但等待网络时不阻塞线程，多个主题可以同时进行。消息默认以 msgpack 编码。
+    未传入 http_client 时三个阶段共用一个临时连接池，函数返回前关闭。
+    """
+    async with create_http_client() if http_client is None else contextlib.nullcontext(http_client) as client:
+        request = Envelope("research_request", {"topic": topic}, sender="coordinator")
+        research = await AsyncA2AClient("http://localhost:5000", http_client=client).send_message('research', request, codec)
+        article = await AsyncA2AClient("http://localhost:5001", http_client=client).send_message('write', research, codec)
+        edit = await AsyncA2AClient("http://localhost:5002", http_client=client).send_message('edit', article, codec)
+    return edit.payload
+
+async def create_articles_concurrently(topics: list) -> list:
+    """ 多个主题并发创作，所有客户端共享同一个长连接池。 """
+    async with create_http_client() as http_client:
+        return await asyncio.gather(*(collaborative_article_creation_async(topic, http_client) for topic in topics))
+
+def test_concurrent_articles(n: int = 20):
+    topics = [f"AI在医疗领域的应用 #{i}" for i in range(n)]
+
+    start = time.perf_counter()
+    for topic in topics:
+        collaborative_article_creation(topic, verbose=False)
+    sync_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = asyncio.run(create_articles_concurrently(topics))
+    async_elapsed = time.perf_counter() - start
+
+    print(f"\n⏱️ {n} 篇文章：同步逐个调用 {sync_elapsed:.2f}s，异步并发 {async_elapsed:.2f}s")
+    print(f"✓ 异步结果数: {len([r for r in results if r.get('approved')])}/{n}")
+
+STREAM_STAGES = [
+    ("http://localhost:5000", "research_stream"),
+    ("http://localhost:5001", "write_stream"),
+    ("http://localhost:5002", "edit_stream"),
+]
+
+async def compare_batch_and_pipeline(topic: str) -> dict:
+    """ 同一组流式技能：逐阶段整体调用 vs 流水线，对比首块延迟和端到端延迟。 """
+    async with create_http_client() as http_client:
+        start = time.perf_counter()
+        text = topic
+        for url, skill in STREAM_STAGES:
+            response = await AsyncA2AClient(url, http_client=http_client).execute_skill(skill, text)
+            text = response.get('result', '')
+        batch_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        first_chunk = None
+        chunks = []
+        async for chunk in stream_pipeline(STREAM_STAGES, topic, http_client=http_client):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            chunks.append(chunk)
+        pipeline_elapsed = time.perf_counter() - start
+
+    assert "".join(chunks) == text, "流水线结果与逐阶段调用结果不一致"
+    return {"batch": batch_elapsed, "pipeline": pipeline_elapsed, "first_chunk": first_chunk, "article": text}
+
+def test_streaming_pipeline():
+    # 第一轮用于建立各 Agent 之间的长连接，第二轮的数据才是稳态延迟
+    asyncio.run(compare_batch_and_pipeline("warm up"))
+    stats = asyncio.run(compare_batch_and_pipeline("AI在医疗领域的应用"))
+    print(f"\n流水线结果：\n{stats['article']}")
+    print(f"⏱️ 逐阶段调用: 端到端 {stats['batch']:.2f}s（首块即全文）")
+    print(f"⏱️ 流水线:     端到端 {stats['pipeline']:.2f}s，首块 {stats['first_chunk']:.2f}s")
 
 if __name__ == "__main__":
     result = collaborative_article_creation("AI在医疗领域的应用")
-    print(f"\n最终结果：\n{result}")
\ No newline at end of file
+    print(f"\n最终结果：\n{result}")
+
+    test_concurrent_articles()
+    test_streaming_pipeline()
\ No newline at end of file
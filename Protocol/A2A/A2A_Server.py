@@ -1,4 +1,5 @@
 from hello_agents.protocols import A2AServer
+import json
 import threading
 import time
 
@@ -21,7 +22,7 @@ def handle_research(text: str) -> str:
         'findings': f"Comprehensive research findings on '{topic}'.",
         'sources': ['Source A', 'Source B', 'Source C']
     }
-    return str(result)
+    return json.dumps(result, ensure_ascii=False)
 
 def start_server():
     researcher.run(host='localhost', port=5000)
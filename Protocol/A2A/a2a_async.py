@@ -0,0 +1,476 @@
+"""
+异步 A2A 服务端与客户端
+
+hello_agents 的 A2AServer 基于 Flask，每个技能都是阻塞函数；A2AClient 每次调用都新建一个 requests 连接，
+多 Agent 流水线只能一个接一个地等待网络往返。这里提供与之兼容的异步版本：
+
+- AsyncA2AServer：接口与 A2AServer 相同（/execute/<skill>、/ask、/info、/skills、/health），
+  基于 Starlette + uvicorn。@server.skill() 既可以装饰普通函数（在线程池中执行），
+  也可以装饰 async 函数（直接在事件循环中执行），一个服务器可以同时处理大量对话
+- AsyncA2AClient：基于 httpx.AsyncClient 的异步客户端，长连接复用 (keep-alive)，
+  多个客户端可以共享同一个连接池；返回格式与 A2AClient 相同
+
+流式技能（POST /stream/<skill>，响应为 SSE）：
+- @server.stream_skill() 注册 async 生成器 func(chunks)，逐块读取输入、逐块产出结果
+- 请求中可以指定上游 {"url", "skill", "text", "upstream"}：服务器自己订阅上游技能的输出流作为输入，
+  于是 research -> write -> edit 这样的链条中，下游 Agent 在上游产出第一块时就开始工作，各阶段重叠执行
+- stream_pipeline() 把多个阶段串成这样的嵌套上游请求，客户端只需读取最后一个阶段的输出
+- 服务器只会向 allow_upstreams() 登记过的对等 Agent 发起请求，否则返回 403：
+  上游地址来自请求体，不加限制时任何客户端都能让 Agent 访问任意内网地址 (SSRF)
+
+结构化消息技能（POST /message/<skill>，见 a2a_messages）：
+- @server.message_skill() 注册 func(payload) -> payload，请求和回复都按消息模式校验，不再 str()/eval()
+- 请求体为 msgpack 或 JSON 编码的消息信封，回复使用与请求相同的编码
+
+用法：
+    >>> server = AsyncA2AServer("researcher", "研究员")
+    >>> @server.skill("research")
+    ... async def do_research(text: str) -> str: ...
+    >>> async with AsyncA2AClient("http://localhost:5000") as client:
+    ...     response = await client.execute_skill("research", "research AI")
+"""
+import asyncio
+import contextlib
+import inspect
+import json
+import logging
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from hello_agents.protocols import A2AServer
+
+from a2a_messages import (CONTENT_TYPES, Envelope, MessageValidationError, decode, detect_codec, encode,
+                          resolve_codec)
+
+# 上游链的最大嵌套层数
+MAX_UPSTREAM_DEPTH = 8
+
+
+async def _single(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+async def iter_lines(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """ 把任意切分的输入流重新切分为行（保留换行符），让流式技能与整体调用的处理粒度一致。 """
+    buffer = ""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    if buffer:
+        yield buffer
+
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class AsyncA2AServer(A2AServer):
+    """ 异步 A2A 服务器，HTTP 接口与 A2AServer 相同；skill() / add_skill() 同时接受普通函数和 async 函数。 """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stream_skills: Dict[str, Callable[[AsyncIterator[str]], AsyncIterator[str]]] = {}
+        # skill_name -> (func, 请求消息类型, 回复消息类型)
+        self.message_skills: Dict[str, Tuple[Callable, str, str]] = {}
+        # 允许作为上游的对等 Agent URL；为空时不接受任何上游
+        self.upstream_peers: set = set()
+        # 订阅上游流所用的连接池，在服务器的事件循环中首次使用时创建，服务器关闭时释放
+        self._upstream_client: Optional[httpx.AsyncClient] = None
+
+    def allow_upstreams(self, *urls: str) -> None:
+        """ 登记允许订阅的上游 Agent（例如流水线中的上一个阶段）。 """
+        self.upstream_peers.update(url.rstrip('/') for url in urls)
+
+    def _check_upstream(self, upstream: Any, depth: int = 0) -> None:
+        """ 校验上游请求的结构；本服务器直接访问的一跳必须在白名单中，更深的各跳由对应的服务器自己校验。 """
+        if depth > MAX_UPSTREAM_DEPTH:
+            raise ValueError(f"上游嵌套超过 {MAX_UPSTREAM_DEPTH} 层")
+        if not isinstance(upstream, dict) or not isinstance(upstream.get("url"), str) \
+                or not isinstance(upstream.get("skill"), str) or not isinstance(upstream.get("text", ""), str):
+            raise ValueError("upstream 应为 {\"url\": str, \"skill\": str, \"text\": str, \"upstream\": 对象或 null}")
+        if depth == 0 and upstream["url"].rstrip('/') not in self.upstream_peers:
+            raise PermissionError(f"上游 {upstream['url']} 不在允许列表中")
+        if upstream.get("upstream") is not None:
+            self._check_upstream(upstream["upstream"], depth + 1)
+
+    async def aclose(self) -> None:
+        if self._upstream_client is not None:
+            await self._upstream_client.aclose()
+            self._upstream_client = None
+
+    def stream_skill(self, skill_name: str):
+        """
+        装饰器方式添加流式技能。func(chunks) 是 async 生成器：chunks 为输入块的异步迭代器，产出结果块。
+        流式技能同样可以通过 /execute 调用，此时输入为单个块，结果为所有输出块拼接后的文本。
+        """
+        def decorator(func):
+            self.stream_skills[skill_name] = func
+
+            async def run_batch(text: str) -> str:
+                return "".join([chunk async for chunk in func(_single(text))])
+
+            self.add_skill(skill_name, run_batch)
+            return func
+        return decorator
+
+    def message_skill(self, skill_name: str, request_type: str, response_type: str):
+        """
+        装饰器方式添加结构化消息技能。func(payload) 接收校验后的请求 payload，返回回复 payload (dict)，
+        可以是普通函数或 async 函数。通过 /execute 调用时 text 为 JSON 信封，返回 JSON 信封。
+        """
+        def decorator(func):
+            self.message_skills[skill_name] = (func, request_type, response_type)
+
+            async def run_text(text: str) -> str:
+                reply = await self.call_message_skill(skill_name, Envelope.from_json(text))
+                return reply.to_json()
+
+            self.add_skill(skill_name, run_text)
+            return func
+        return decorator
+
+    async def call_message_skill(self, skill_name: str, request: Envelope) -> Envelope:
+        """ 执行结构化消息技能，返回校验后的回复信封。 """
+        func, request_type, response_type = self.message_skills[skill_name]
+        if request.type != request_type:
+            raise MessageValidationError(f"技能 {skill_name} 需要 {request_type} 消息，收到 {request.type}")
+        if inspect.iscoroutinefunction(func):
+            payload = await func(request.payload)
+        else:
+            payload = await asyncio.to_thread(func, request.payload)
+        try:
+            return request.reply(response_type, payload, sender=self.name).validate()
+        except MessageValidationError as e:
+            # 回复不合法是技能自身的错误，不能当作请求错误返回
+            raise RuntimeError(f"技能 {skill_name} 的回复不符合模式: {e}")
+
+    async def stream_output(self, skill_name: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """ 以流的形式执行技能；普通技能先收齐输入，再把结果作为一个块返回。 """
+        if skill_name in self.stream_skills:
+            async for chunk in self.stream_skills[skill_name](chunks):
+                yield chunk
+        else:
+            text = "".join([chunk async for chunk in chunks])
+            yield str(await self.call_skill(skill_name, text))
+
+    def _upstream_chunks(self, upstream: Dict[str, Any]) -> AsyncIterator[str]:
+        if self._upstream_client is None:
+            self._upstream_client = create_http_client()
+        client = AsyncA2AClient(upstream["url"], http_client=self._upstream_client)
+        return client.stream_skill(upstream["skill"], upstream.get("text", ""), upstream=upstream.get("upstream"))
+
+    async def call_skill(self, skill_name: str, text: str) -> Any:
+        """ 执行技能：async 技能直接等待，同步技能放到线程池，避免阻塞事件循环。 """
+        func = self.skills[skill_name]
+        if inspect.iscoroutinefunction(func):
+            return await func(text)
+        return await asyncio.to_thread(func, text)
+
+    def create_app(self):
+        """ 创建 Starlette 应用，路由与 A2AServer.run 中的 Flask 应用一致。 """
+        from starlette.applications import Starlette
+        from starlette.requests import ClientDisconnect, Request
+        from starlette.responses import JSONResponse, Response, StreamingResponse
+        from starlette.routing import Route
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            yield
+            await self.aclose()
+
+        async def read_json(request: Request) -> Dict[str, Any]:
+            try:
+                data = await request.json()
+            except ValueError:
+                return {}
+            return data if isinstance(data, dict) else {}
+
+        async def get_info(request: Request) -> JSONResponse:
+            return JSONResponse(self.get_info())
+
+        async def list_skills(request: Request) -> JSONResponse:
+            return JSONResponse({"skills": list(self.skills.keys()), "count": len(self.skills)})
+
+        async def execute_skill(request: Request) -> JSONResponse:
+            skill_name = request.path_params["skill_name"]
+            if skill_name not in self.skills:
+                return JSONResponse({
+                    "error": f"Skill '{skill_name}' not found",
+                    "available_skills": list(self.skills.keys())
+                }, status_code=404)
+            try:
+                data = await read_json(request)
+                text = data.get('text', data.get('query', ''))
+                result = await self.call_skill(skill_name, text)
+                return JSONResponse({"skill": skill_name, "result": result, "status": "success"})
+            except Exception as e:
+                return JSONResponse({"error": str(e), "skill": skill_name, "status": "error"}, status_code=500)
+
+        async def stream_skill(request: Request):
+            skill_name = request.path_params["skill_name"]
+            if skill_name not in self.skills:
+                return JSONResponse({
+                    "error": f"Skill '{skill_name}' not found",
+                    "available_skills": list(self.skills.keys())
+                }, status_code=404)
+            data = await read_json(request)
+            upstream = data.get("upstream")
+            if upstream is not None:
+                try:
+                    self._check_upstream(upstream)
+                except PermissionError as e:
+                    return JSONResponse({"error": str(e), "skill": skill_name, "status": "forbidden"}, status_code=403)
+                except ValueError as e:
+                    return JSONResponse({"error": str(e), "skill": skill_name, "status": "invalid"}, status_code=400)
+            chunks = self._upstream_chunks(upstream) if upstream is not None else _single(data.get('text', data.get('query', '')))
+
+            async def events() -> AsyncIterator[str]:
+                try:
+                    async for chunk in self.stream_output(skill_name, chunks):
+                        yield _sse({"chunk": chunk})
+                    yield _sse({"skill": skill_name}, event="done")
+                except Exception as e:
+                    yield _sse({"error": str(e), "skill": skill_name}, event="error")
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        async def message_skill(request: Request) -> Response:
+            skill_name = request.path_params["skill_name"]
+            if skill_name not in self.message_skills:
+                return JSONResponse({
+                    "error": f"Message skill '{skill_name}' not found",
+                    "available_skills": list(self.message_skills.keys())
+                }, status_code=404)
+            try:
+                body = await request.body()
+            except ClientDisconnect:
+                # 客户端已放弃请求（例如协商被取消），没有人读取回复
+                return Response(status_code=499)
+            content_type = request.headers.get("content-type")
+            try:
+                codec = resolve_codec(detect_codec(body, content_type))
+                reply = await self.call_message_skill(skill_name, decode(body, content_type))
+            except MessageValidationError as e:
+                return JSONResponse({"error": str(e), "skill": skill_name, "status": "invalid"}, status_code=400)
+            except Exception as e:
+                return JSONResponse({"error": str(e), "skill": skill_name, "status": "error"}, status_code=500)
+            return Response(encode(reply, codec), media_type=CONTENT_TYPES[codec])
+
+        async def ask(request: Request) -> JSONResponse:
+            data = await read_json(request)
+            question = data.get('question', data.get('text', ''))
+            # 与 A2AServer 相同的策略：依次尝试所有技能，返回第一个非错误结果
+            for skill_name in self.skills:
+                try:
+                    result = await self.call_skill(skill_name, question)
+                except Exception:
+                    continue
+                if result and not str(result).startswith("Error"):
+                    return JSONResponse({"answer": result, "skill_used": skill_name, "status": "success"})
+            return JSONResponse({"answer": "No suitable skill found for this question", "status": "no_match"})
+
+        async def health(request: Request) -> JSONResponse:
+            return JSONResponse({"status": "healthy", "agent": self.name})
+
+        return Starlette(lifespan=lifespan, routes=[
+            Route("/info", get_info, methods=["GET"]),
+            Route("/skills", list_skills, methods=["GET"]),
+            Route("/execute/{skill_name}", execute_skill, methods=["POST"]),
+            Route("/stream/{skill_name}", stream_skill, methods=["POST"]),
+            Route("/message/{skill_name}", message_skill, methods=["POST"]),
+            Route("/ask", ask, methods=["POST"]),
+            Route("/health", health, methods=["GET"]),
+        ])
+
+    def run(self, host: str = "0.0.0.0", port: int = 5000):
+        """ 运行服务器（阻塞），可以像 A2AServer 一样放到后台线程中。 """
+        import uvicorn
+
+        print(f"🚀 异步 A2A 服务器 '{self.name}' 启动在 {host}:{port}")
+        print(f"🛠️  可用技能: {list(self.skills.keys())}")
+        config = uvicorn.Config(self.create_app(), host=host, port=port, log_level=logging.WARNING)
+        uvicorn.Server(config).run()
+
+
+class AsyncA2AClient:
+    """
+    异步 A2A 客户端。
+
+    :param server_url: 服务器 URL（例如：http://localhost:5000）
+    :param http_client: 共享的 httpx.AsyncClient；为空时自己创建一个，并在 aclose() 时关闭
+    :param timeout: 请求超时（秒）
+    :param max_connections: 自建连接池的最大连接数
+    """
+    def __init__(
+            self,
+            server_url: str,
+            http_client: Optional[httpx.AsyncClient] = None,
+            timeout: float = 30.0,
+            max_connections: int = 100,
+    ):
+        self.server_url = server_url.rstrip('/')
+        self.timeout = timeout
+        self._owns_client = http_client is None
+        self.http_client = http_client or create_http_client(max_connections=max_connections, timeout=timeout)
+
+    async def __aenter__(self) -> "AsyncA2AClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.http_client.aclose()
+
+    async def execute_skill(self, skill_name: str, text: str = "") -> Dict[str, Any]:
+        """ 执行指定技能，返回格式与 A2AClient.execute_skill 相同。 """
+        try:
+            response = await self.http_client.post(
+                f"{self.server_url}/execute/{skill_name}",
+                json={"text": text},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            return {"error": f"Failed to execute skill: {str(e)}", "status": "error"}
+
+    async def stream_skill(
+            self,
+            skill_name: str,
+            text: str = "",
+            upstream: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[str]:
+        """
+        以流的形式执行技能，逐块产出结果；技能出错或流意外中断时抛出 RuntimeError。
+
+        :param upstream: 上游技能 {"url", "skill", "text", "upstream"}，指定时服务器以上游的输出流作为输入
+        """
+        payload: Dict[str, Any] = {"text": text}
+        if upstream:
+            payload["upstream"] = upstream
+        async with self.http_client.stream(
+                "POST", f"{self.server_url}/stream/{skill_name}", json=payload, timeout=self.timeout) as response:
+            response.raise_for_status()
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "error":
+                        raise RuntimeError(f"技能 {skill_name} 执行失败: {data.get('error')}")
+                    if event == "done":
+                        return
+                    yield data["chunk"]
+                elif not line:
+                    event = None
+        raise RuntimeError(f"技能 {skill_name} 的输出流意外结束")
+
+    async def send_message(self, skill_name: str, message: Envelope, codec: Optional[str] = None) -> Envelope:
+        """
+        调用结构化消息技能，返回校验后的回复信封。
+
+        :param codec: "msgpack" 或 "json"，默认优先 msgpack（未安装时退回 JSON）
+        :raises MessageValidationError: 请求或回复不符合消息模式
+        :raises RuntimeError: 网络错误或技能执行失败
+        """
+        message.validate()
+        codec = resolve_codec(codec)
+        try:
+            response = await self.http_client.post(
+                f"{self.server_url}/message/{skill_name}",
+                content=encode(message, codec),
+                headers={"Content-Type": CONTENT_TYPES[codec], "Accept": CONTENT_TYPES[codec]},
+                timeout=self.timeout
+            )
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Failed to send message: {str(e)}")
+        if response.status_code >= 400:
+            try:
+                error = response.json().get("error", response.text)
+            except ValueError:
+                error = response.text
+            if response.status_code == 400:
+                raise MessageValidationError(error)
+            raise RuntimeError(f"Failed to execute skill: {error}")
+        return decode(response.content, response.headers.get("content-type"))
+
+    async def ask(self, question: str) -> str:
+        """ 向 Agent 提问（通用接口）。 """
+        try:
+            response = await self.http_client.post(
+                f"{self.server_url}/ask", json={"question": question}, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json().get("answer", "No response")
+        except Exception as e:
+            return f"Error communicating with agent: {str(e)}"
+
+    async def get_info(self) -> Dict[str, Any]:
+        """ 获取 Agent 信息。 """
+        try:
+            response = await self.http_client.get(f"{self.server_url}/info", timeout=10)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            return {"error": f"Failed to get agent info: {str(e)}"}
+
+    async def list_skills(self) -> List[str]:
+        """ 列出 Agent 的技能。 """
+        try:
+            response = await self.http_client.get(f"{self.server_url}/skills", timeout=10)
+            response.raise_for_status()
+            return response.json().get("skills", [])
+        except Exception:
+            return []
+
+    async def health(self) -> bool:
+        """ 健康检查。 """
+        try:
+            response = await self.http_client.get(f"{self.server_url}/health", timeout=5)
+            return response.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+
+def create_http_client(max_connections: int = 100, max_keepalive: int = 20, timeout: float = 30.0) -> httpx.AsyncClient:
+    """ 创建带长连接复用的 httpx.AsyncClient，可以在多个 AsyncA2AClient 之间共享。 """
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+async def wait_until_ready(urls: List[str], timeout: float = 10.0, http_client: Optional[httpx.AsyncClient] = None) -> None:
+    """ 等待所有 A2A 服务器的 /health 可用，超时抛出 TimeoutError。 """
+    async with create_http_client() if http_client is None else contextlib.nullcontext(http_client) as client:
+        async def wait_one(url: str) -> None:
+            probe = AsyncA2AClient(url, http_client=client)
+            while not await probe.health():
+                await asyncio.sleep(0.05)
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(wait_one(url) for url in urls)), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"A2A 服务器未在 {timeout}s 内就绪: {urls}")
+
+
+
+async def stream_pipeline(
+        stages: List[Tuple[str, str]],
+        text: str,
+        http_client: Optional[httpx.AsyncClient] = None,
+) -> AsyncIterator[str]:
+    """
+    流水线执行多个技能：stages 为 [(server_url, skill_name), ...]，text 作为第一个阶段的输入。
+    每个阶段订阅上一个阶段的输出流，所有阶段同时工作；这里只读取最后一个阶段的输出。
+    """
+    upstream = None
+    for url, skill in stages[:-1]:
+        upstream = {"url": url, "skill": skill, "text": text if upstream is None else "", "upstream": upstream}
+    url, skill = stages[-1]
+    async with AsyncA2AClient(url, http_client=http_client) as client:
+        async for chunk in client.stream_skill(skill, text if upstream is None else "", upstream=upstream):
+            yield chunk
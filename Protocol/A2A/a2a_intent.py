@@ -0,0 +1,187 @@
+"""
+A2A 意图预分类
+
+接待员原本每个问题都要经过一次 LLM 调用，只为了在 tech_expert 和 sales_advisor 之间做选择。
+这里在 LLM 之前加一个本地路由阶段，只有拿不准的问题才交给 LLM：
+
+1. 关键词规则：只命中一个类别的关键词时直接路由；同时命中多个类别的问题交给后续阶段。
+   英文关键词按整词匹配（"api" 不会命中 "capital"），中文关键词按子串匹配
+2. 朴素贝叶斯分类器：用 LLM（或人工标注）的路由结果增量训练，后验概率超过阈值时路由
+3. 都不确定时返回 None，由调用方交给 LLM；LLM 的选择通过 record() 记录下来，作为新的训练样本
+
+分类器自己的决定（关键词规则、模型）不进入训练集，避免错误被自我强化。
+指定 log_path 时路由记录以 JSON Lines 保存，重启后重新加载；文件超过 max_log_entries 条时轮转为 .1，
+磁盘上最多保留两个文件。
+"""
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# 本地分类器自己做出的决定（keyword / model）不回灌训练集，避免自我强化
+TRAINABLE_SOURCES = ("llm", "manual")
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[一-鿿]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """ 英文 / 数字按单词切分，中文按字符二元组 (bigram) 切分。 """
+    tokens: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(_normalize(text)):
+        word = match.group(0)
+        if word[0].isascii() or len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+@dataclass
+class RouteDecision:
+    """ 路由结果：label 为 None 表示本地无法确定，需要交给 LLM。 """
+    label: Optional[str]
+    confidence: float
+    source: str
+
+
+class _NaiveBayes:
+    """ 多项式朴素贝叶斯（词频二值化），支持增量训练。 """
+    def __init__(self):
+        self.doc_counts: Counter = Counter()
+        self.token_counts: Dict[str, Counter] = {}
+        self.token_totals: Counter = Counter()
+        self.vocab: set = set()
+
+    def add(self, tokens: List[str], label: str) -> None:
+        unique = set(tokens)
+        self.doc_counts[label] += 1
+        self.token_counts.setdefault(label, Counter()).update(unique)
+        self.token_totals[label] += len(unique)
+        self.vocab.update(unique)
+
+    def predict(self, tokens: List[str]) -> Dict[str, float]:
+        """ 返回各类别的后验概率。 """
+        total_docs = sum(self.doc_counts.values())
+        vocab_size = len(self.vocab) + 1
+        scores = {}
+        for label, docs in self.doc_counts.items():
+            counts = self.token_counts[label]
+            denominator = self.token_totals[label] + vocab_size
+            score = math.log(docs / total_docs)
+            for token in set(tokens):
+                score += math.log((counts[token] + 1) / denominator)
+            scores[label] = score
+        peak = max(scores.values())
+        exp_scores = {label: math.exp(score - peak) for label, score in scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: value / norm for label, value in exp_scores.items()}
+
+
+class IntentClassifier:
+    """
+    本地意图分类器。
+
+    :param keywords: 类别 -> 关键词列表，大小写不敏感；纯英文 / 数字关键词按整词匹配（"api" 不会命中 "capital"），中文等其他关键词按子串匹配
+    :param threshold: 分类器后验概率达到该值才直接路由
+    :param min_examples: 每个类别至少有多少条训练样本后才启用分类器
+    :param log_path: 路由记录文件 (JSON Lines)，为空时只在内存中学习
+    :param max_log_entries: 记录文件的最大条数，超过后轮转
+    """
+    def __init__(
+            self,
+            keywords: Dict[str, List[str]],
+            threshold: float = 0.9,
+            min_examples: int = 5,
+            log_path: Optional[str] = None,
+            max_log_entries: int = 5000,
+    ):
+        self.labels = list(keywords)
+        self.keywords = {label: [_normalize(word) for word in words] for label, words in keywords.items()}
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.log_path = log_path
+        self.max_log_entries = max_log_entries
+        self._log_entries = 0
+        self.model = _NaiveBayes()
+        self.decisions: Counter = Counter()
+        self._lock = threading.Lock()
+        self._load_log()
+
+    def classify(self, query: str) -> RouteDecision:
+        """ 依次尝试关键词规则和分类器，都不确定时返回 label=None。 """
+        decision = self._classify_keywords(query) or self._classify_model(query) or RouteDecision(None, 0.0, "llm")
+        with self._lock:
+            self.decisions[decision.source] += 1
+        return decision
+
+    def _classify_keywords(self, query: str) -> Optional[RouteDecision]:
+        text = _normalize(query)
+        words_in_text = set(_TOKEN_PATTERN.findall(text))
+        hits = {label: sum(_keyword_hit(word, text, words_in_text) for word in words)
+                for label, words in self.keywords.items()}
+        matched = [label for label, count in hits.items() if count > 0]
+        if len(matched) == 1:
+            return RouteDecision(matched[0], 1.0, "keyword")
+        return None
+
+    def _classify_model(self, query: str) -> Optional[RouteDecision]:
+        with self._lock:
+            if any(self.model.doc_counts[label] < self.min_examples for label in self.labels):
+                return None
+            probabilities = self.model.predict(tokenize(query))
+        label, confidence = max(probabilities.items(), key=lambda item: item[1])
+        if confidence >= self.threshold:
+            return RouteDecision(label, confidence, "model")
+        return None
+
+    def record(self, query: str, label: str, source: str = "llm") -> None:
+        """ 记录一次 LLM 或人工标注的路由结果并加入训练集；其他来源的记录被忽略。 """
+        if label not in self.labels or source not in TRAINABLE_SOURCES:
+            return
+        with self._lock:
+            self.model.add(tokenize(query), label)
+            if self.log_path:
+                if self._log_entries >= self.max_log_entries:
+                    os.replace(self.log_path, self.log_path + ".1")
+                    self._log_entries = 0
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"query": query, "label": label, "source": source}, ensure_ascii=False) + "\n")
+                self._log_entries += 1
+
+    def _load_log(self) -> None:
+        if not self.log_path:
+            return
+        for path in (self.log_path + ".1", self.log_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if path == self.log_path:
+                        self._log_entries += 1
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get("label") in self.labels and entry.get("source") in TRAINABLE_SOURCES:
+                        self.model.add(tokenize(entry.get("query", "")), entry["label"])
+
+    def stats(self) -> Dict[str, int]:
+        """ 各来源的决策次数；llm 即交给 LLM 的次数。 """
+        with self._lock:
+            return dict(self.decisions)
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _keyword_hit(keyword: str, text: str, words_in_text: set) -> bool:
+    """ 纯英文 / 数字关键词按整词匹配，其他关键词按子串匹配。 """
+    if keyword.isascii() and keyword.isalnum():
+        return keyword in words_in_text
+    return keyword in text
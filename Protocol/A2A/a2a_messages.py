@@ -0,0 +1,267 @@
+"""
+A2A 结构化消息
+
+技能之间原来用 str(dict) 序列化、eval(...) 解析：既慢，又会丢失类型，还会执行远端传来的任意代码。
+这里提供类型化的消息信封 (Envelope) 和消息模式 (MessageSchema)：
+
+- 每种消息类型注册一个模式，声明字段的类型、是否必填和默认值；字段类型也可以是另一种消息类型（嵌套）
+- 收发两端都按模式校验，不合法的消息抛出 MessageValidationError，不会执行任何远端输入
+- 编码：优先 msgpack（紧凑的二进制格式，需要 pip install msgpack），未安装时自动退回 JSON；
+  解码时根据 Content-Type 或首字节自动识别
+
+用法：
+    >>> register_schema("proposal", task=Field(str), deadline=Field(int))
+    >>> data = encode(Envelope("proposal", {"task": "开发新功能", "deadline": 5}))
+    >>> decode(data).payload["deadline"]
+    5
+"""
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ENVELOPE_VERSION = 1
+MAX_MESSAGE_BYTES = 1 << 20
+
+CONTENT_TYPES = {
+    "msgpack": "application/msgpack",
+    "json": "application/json",
+}
+DEFAULT_CODEC = "msgpack" if msgpack is not None else "json"
+
+
+class MessageValidationError(ValueError):
+    """ 消息格式或内容不符合模式。 """
+
+
+@dataclass
+class Field:
+    """
+    消息字段。
+
+    :param type: Python 类型（str / int / float / bool / list / dict）、类型元组，或已注册的消息类型名（嵌套消息）
+    :param required: 是否必填
+    :param default: 非必填字段缺省时的取值
+    """
+    type: Union[type, Tuple[type, ...], str]
+    required: bool = True
+    default: Any = None
+
+
+class MessageSchema:
+    """ 一种消息类型的字段定义；默认拒绝未声明的字段。 """
+    def __init__(self, name: str, fields: Dict[str, Field], allow_extra: bool = False):
+        self.name = name
+        self.fields = fields
+        self.allow_extra = allow_extra
+
+    def validate(self, payload: Any, path: str = "") -> Dict[str, Any]:
+        """ 校验并返回规范化的 payload（补全默认值）。 """
+        path = path or self.name
+        if not isinstance(payload, dict):
+            raise MessageValidationError(f"{path}: 应为对象，实际为 {type(payload).__name__}")
+        unknown = set(payload) - set(self.fields)
+        if unknown and not self.allow_extra:
+            raise MessageValidationError(f"{path}: 未知字段 {sorted(unknown)}")
+
+        result = dict(payload) if self.allow_extra else {}
+        for name, spec in self.fields.items():
+            if payload.get(name) is None:
+                if spec.required:
+                    raise MessageValidationError(f"{path}.{name}: 缺少必填字段")
+                result[name] = spec.default
+                continue
+            result[name] = _check_type(payload[name], spec.type, f"{path}.{name}")
+        return result
+
+
+def _check_type(value: Any, expected: Union[type, Tuple[type, ...], str], path: str) -> Any:
+    if isinstance(expected, str):
+        return get_schema(expected).validate(value, path)
+    types = expected if isinstance(expected, tuple) else (expected,)
+    # bool 是 int 的子类，需要单独排除；int 可以作为 float 字段的值
+    if isinstance(value, bool) and bool not in types:
+        raise MessageValidationError(f"{path}: 应为 {_type_names(types)}，实际为 bool")
+    if isinstance(value, int) and float in types and not isinstance(value, bool):
+        return value
+    if not isinstance(value, types):
+        raise MessageValidationError(f"{path}: 应为 {_type_names(types)}，实际为 {type(value).__name__}")
+    return value
+
+
+def _type_names(types: Tuple[type, ...]) -> str:
+    return " / ".join(t.__name__ for t in types)
+
+
+SCHEMAS: Dict[str, MessageSchema] = {}
+
+
+def register_schema(name: str, allow_extra: bool = False, **fields: Field) -> MessageSchema:
+    """ 注册一种消息类型；重复注册会覆盖旧的定义。 """
+    schema = MessageSchema(name, fields, allow_extra=allow_extra)
+    SCHEMAS[name] = schema
+    return schema
+
+
+def get_schema(name: str) -> MessageSchema:
+    if name not in SCHEMAS:
+        raise MessageValidationError(f"未注册的消息类型: {name}")
+    return SCHEMAS[name]
+
+
+@dataclass
+class Envelope:
+    """ 消息信封：类型、负载和路由信息。 """
+    type: str
+    payload: Dict[str, Any]
+    sender: str = ""
+    msg_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    reply_to: Optional[str] = None
+    timestamp: float = field(default_factory=time.time)
+    version: int = ENVELOPE_VERSION
+
+    def validate(self) -> "Envelope":
+        """ 按消息类型的模式校验并规范化 payload。 """
+        self.payload = get_schema(self.type).validate(self.payload)
+        return self
+
+    def reply(self, type: str, payload: Dict[str, Any], sender: str = "") -> "Envelope":
+        """ 构造一条回复消息。 """
+        return Envelope(type, payload, sender=sender, reply_to=self.msg_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "v": self.version,
+            "type": self.type,
+            "id": self.msg_id,
+            "sender": self.sender,
+            "reply_to": self.reply_to,
+            "ts": self.timestamp,
+            "payload": self.payload,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "Envelope":
+        """ 从解码后的字典构造信封，并校验信封结构和 payload。 """
+        if not isinstance(data, dict):
+            raise MessageValidationError("消息信封应为对象")
+        if data.get("v") != ENVELOPE_VERSION:
+            raise MessageValidationError(f"不支持的消息版本: {data.get('v')}")
+        if not isinstance(data.get("type"), str) or not isinstance(data.get("id"), str):
+            raise MessageValidationError("消息信封缺少 type 或 id")
+        if not isinstance(data.get("reply_to"), (str, type(None))) or isinstance(data.get("ts"), bool) \
+                or not isinstance(data.get("ts", 0.0), (int, float)):
+            raise MessageValidationError("消息信封的 reply_to 或 ts 类型错误")
+        envelope = cls(
+            type=data["type"],
+            payload=data.get("payload"),
+            sender=str(data.get("sender") or ""),
+            msg_id=data["id"],
+            reply_to=data.get("reply_to"),
+            timestamp=float(data.get("ts", 0.0)),
+        )
+        return envelope.validate()
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: str) -> "Envelope":
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise MessageValidationError(f"无法解析 JSON 消息: {e}")
+        return cls.from_dict(data)
+
+
+def resolve_codec(codec: Optional[str] = None) -> str:
+    """ 选择编码：未安装 msgpack 时 msgpack 退回 JSON。 """
+    codec = codec or DEFAULT_CODEC
+    if codec not in CONTENT_TYPES:
+        raise ValueError(f"不支持的编码: {codec}")
+    if codec == "msgpack" and msgpack is None:
+        return "json"
+    return codec
+
+
+def encode(envelope: Envelope, codec: Optional[str] = None) -> bytes:
+    """ 编码消息；codec 为 "msgpack" 或 "json"，默认优先 msgpack。 """
+    if resolve_codec(codec) == "msgpack":
+        return msgpack.packb(envelope.to_dict(), use_bin_type=True)
+    return envelope.to_json().encode("utf-8")
+
+
+def detect_codec(data: bytes, content_type: Optional[str] = None) -> str:
+    """ 根据 Content-Type 识别编码；没有时 JSON 对象以 '{' 开头，其余按 msgpack 处理。 """
+    if content_type:
+        media_type = content_type.split(";")[0].strip().lower()
+        for codec, known in CONTENT_TYPES.items():
+            if media_type == known:
+                return codec
+    return "json" if data.lstrip()[:1] == b"{" else "msgpack"
+
+
+def decode(data: bytes, content_type: Optional[str] = None) -> Envelope:
+    """ 解码并校验消息，任何不合法的输入都抛出 MessageValidationError。 """
+    if len(data) > MAX_MESSAGE_BYTES:
+        raise MessageValidationError(f"消息过大: {len(data)} 字节")
+    if detect_codec(data, content_type) == "json":
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError as e:
+            raise MessageValidationError(f"无法解析 JSON 消息: {e}")
+        return Envelope.from_json(text)
+    if msgpack is None:
+        raise MessageValidationError("收到 msgpack 消息，但未安装 msgpack")
+    try:
+        obj = msgpack.unpackb(data, raw=False, strict_map_key=True)
+    except Exception as e:
+        raise MessageValidationError(f"无法解析 msgpack 消息: {type(e).__name__} {e}".rstrip())
+    return Envelope.from_dict(obj)
+
+
+# ==================== 测试 ====================
+
+def test_codecs(rounds: int = 10000):
+    import ast
+
+    register_schema("proposal", task=Field(str), deadline=Field(int))
+    register_schema("proposal_reply", accepted=Field(bool), message=Field(str),
+                    counter_proposal=Field("proposal", required=False))
+    payload = {"accepted": False, "message": "截止日期太紧，无法接受",
+               "counter_proposal": {"task": "开发新功能", "deadline": 7}}
+    envelope = Envelope("proposal_reply", payload, sender="agent1")
+
+    def bench(name, dumps, loads):
+        data = dumps()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            loads(dumps())
+        elapsed = (time.perf_counter() - start) / rounds * 1e6
+        print(f"  {name:<12} {len(data):>4} 字节  {elapsed:6.1f} µs/往返")
+
+    print("📦 编码对比（同一条 proposal_reply 消息）：")
+    bench("str + eval", lambda: str(envelope.to_dict()).encode(), lambda d: eval(d.decode()))
+    bench("literal_eval", lambda: str(envelope.to_dict()).encode(), lambda d: ast.literal_eval(d.decode()))
+    bench("json", lambda: encode(envelope, "json"), decode)
+    if msgpack is not None:
+        bench("msgpack", lambda: encode(envelope, "msgpack"), decode)
+
+    try:
+        decode(b'{"v":1,"type":"proposal","id":"x","payload":{"task":"t","deadline":"5"}}')
+    except MessageValidationError as e:
+        print(f"✓ 拒绝类型错误的消息: {e}")
+    try:
+        decode(b'{"v":1,"type":"proposal","id":"x","payload":{"task":"__import__(\'os\')","deadline":5,"x":1}}')
+    except MessageValidationError as e:
+        print(f"✓ 拒绝未声明字段: {e}")
+
+
+if __name__ == "__main__":
+    test_codecs()
@@ -0,0 +1,403 @@
+"""
+A2A 多轮协商引擎
+
+A2A_Negotiation.py 原来只有一次写死的 提案 -> 反提案 交换。这里把协商做成可复用的调度原语，
+用于在多个 Agent 之间分配任务（类似合同网协议）：
+
+- 协商状态机 (Negotiation)：open -> offered -> countered -> offered -> ... -> agreed / rejected / expired / failed / cancelled，
+  非法的状态转换抛出 NegotiationError；收发两端各自维护一份状态
+- 让步策略 (ConcessionStrategy)：随轮数从初始价格向保留价格让步，exponent < 1 时后期才让步（强硬），> 1 时早期让步
+- 响应方 (NegotiationResponder)：在 AsyncA2AServer 上注册 negotiate / negotiate_close 两个消息技能，
+  按协商 ID 保存会话；轮次乱序的报价返回 400，重复的报价返回缓存的回复（客户端重试是幂等的）；
+  反提案在协商有效期内具有约束力：发起方按反提案的条件报价即达成协议
+- 发起方 (Negotiator)：negotiate() 与一个对手方多轮协商；negotiate_many() 同时与多个对手方协商，
+  select="first" 时第一个达成协议者胜出，select="best" 时等待全部结束后选价格最低者；
+  落选和未完成的协商会发送 negotiate_close 释放对方的会话
+- 截止时间：每个协商有整体有效期 (deadline)，报价中携带 expires_at，过期后响应方拒绝；
+  每轮还有单独的超时 (round_timeout)，对手方无响应时该协商失败，不会拖住其他并行协商
+
+消息类型（见 a2a_messages）：offer、offer_reply、negotiation_close、negotiation_status。
+
+用法：
+    >>> worker = AsyncA2AServer("worker", "执行任务的 Agent")
+    >>> NegotiationResponder(worker, ConcessionStrategy(initial=120, reservation=80), min_days=5)
+    >>> coordinator = Negotiator("coordinator", ConcessionStrategy(initial=60, reservation=100), max_days=7)
+    >>> winner, negotiations = await coordinator.negotiate_many(clients, "开发新功能")
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from a2a_async import AsyncA2AClient, AsyncA2AServer
+from a2a_messages import Envelope, Field, MessageValidationError, register_schema
+
+register_schema("offer", negotiation_id=Field(str), round=Field(int), task=Field(str),
+                price=Field(float), days=Field(int), expires_at=Field(float))
+register_schema("offer_reply", negotiation_id=Field(str), round=Field(int), status=Field(str),
+                price=Field(float, required=False), days=Field(int, required=False),
+                message=Field(str, required=False, default=""))
+register_schema("negotiation_close", negotiation_id=Field(str), reason=Field(str, required=False, default=""))
+register_schema("negotiation_status", negotiation_id=Field(str), state=Field(str))
+
+REPLY_STATUSES = ("accepted", "countered", "rejected", "expired")
+SELECT_MODES = ("first", "best")
+
+# 状态 -> 允许转换到的状态；没有出现在键中的状态是终态（agreed 仍可以被发起方取消）
+TRANSITIONS = {
+    "open": {"offered", "expired", "failed", "cancelled"},
+    "offered": {"countered", "agreed", "rejected", "expired", "failed", "cancelled"},
+    "countered": {"offered", "rejected", "expired", "failed", "cancelled"},
+    "agreed": {"cancelled"},
+}
+TERMINAL_STATES = {"agreed", "rejected", "expired", "failed", "cancelled"}
+
+
+class NegotiationError(RuntimeError):
+    """ 协商状态机收到非法的状态转换。 """
+
+
+@dataclass
+class ConcessionStrategy:
+    """
+    随时间让步的报价策略。
+
+    :param initial: 第一轮的报价
+    :param reservation: 保留价格（卖方的最低价 / 买方的最高价），不会越过
+    :param max_rounds: 在第几轮让步到保留价格；超过后不再继续协商
+    :param exponent: 让步曲线的指数，1 为线性，< 1 后期才让步，> 1 早期让步
+    """
+    initial: float
+    reservation: float
+    max_rounds: int = 5
+    exponent: float = 1.0
+
+    def target(self, round_no: int) -> float:
+        """ 第 round_no 轮（从 1 开始）的报价。 """
+        progress = min(1.0, max(0, round_no - 1) / max(1, self.max_rounds - 1))
+        return self.initial + (self.reservation - self.initial) * progress ** (1 / self.exponent)
+
+    def acceptable(self, price: float, round_no: int) -> bool:
+        """ 对方的价格是否不差于自己第 round_no 轮的报价。 """
+        if self.initial >= self.reservation:
+            return price >= self.target(round_no) - 1e-9
+        return price <= self.target(round_no) + 1e-9
+
+
+class Negotiation:
+    """ 一次双边协商的状态；发起方和响应方各自持有一份。 """
+    def __init__(self, negotiation_id: str, counterparty: str, task: str, expires_at: float):
+        self.negotiation_id = negotiation_id
+        self.counterparty = counterparty
+        self.task = task
+        self.expires_at = expires_at
+        self.state = "open"
+        self.round = 0
+        # 最近一次报价或反提案的条件；达成协议后即为协议条件
+        self.price: Optional[float] = None
+        self.days: Optional[int] = None
+        self.reason = ""
+        self.history: List[Tuple[int, str, Optional[float], Optional[int]]] = []
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        # 响应方：本轮回复，用于幂等地响应重复报价
+        self.last_reply: Optional[Dict[str, Any]] = None
+
+    @property
+    def terminal(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def transition(self, state: str, reason: str = "", price: Optional[float] = None, days: Optional[int] = None) -> None:
+        if state not in TRANSITIONS.get(self.state, ()):
+            raise NegotiationError(f"协商 {self.negotiation_id}: 不能从 {self.state} 转换到 {state}")
+        self.state = state
+        if price is not None:
+            self.price, self.days = price, days
+        if reason:
+            self.reason = reason
+        self.history.append((self.round, state, price, days))
+        if state in TERMINAL_STATES and self.finished is None:
+            self.finished = time.perf_counter()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "negotiation_id": self.negotiation_id,
+            "counterparty": self.counterparty,
+            "state": self.state,
+            "rounds": self.round,
+            "price": round(self.price, 2) if self.price is not None else None,
+            "days": self.days,
+            "reason": self.reason,
+            "elapsed_ms": round(self.elapsed * 1000, 1),
+        }
+
+
+class NegotiationResponder:
+    """
+    协商响应方：在 AsyncA2AServer 上注册 negotiate / negotiate_close 技能。
+
+    :param server: 异步 A2A 服务器
+    :param strategy: 卖方让步策略（initial >= reservation）
+    :param min_days: 完成任务至少需要的天数，报价的期限更短时以该天数还价
+    :param think_time: 每轮回复前的模拟思考时间（秒），例如调用 LLM 评估报价
+    :param max_sessions: 最多保存的会话数，超出时丢弃最早的会话
+    """
+    def __init__(
+            self,
+            server: AsyncA2AServer,
+            strategy: ConcessionStrategy,
+            min_days: int = 1,
+            think_time: float = 0.0,
+            max_sessions: int = 10000,
+    ):
+        self.server = server
+        self.strategy = strategy
+        self.min_days = min_days
+        self.think_time = think_time
+        self.max_sessions = max_sessions
+        self.sessions: "OrderedDict[str, Negotiation]" = OrderedDict()
+        server.message_skill("negotiate", "offer", "offer_reply")(self.handle_offer)
+        server.message_skill("negotiate_close", "negotiation_close", "negotiation_status")(self.handle_close)
+
+    def _evict(self) -> None:
+        now = time.time()
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if len(self.sessions) <= self.max_sessions and oldest.expires_at > now:
+                break
+            self.sessions.popitem(last=False)
+
+    async def handle_offer(self, offer: Dict[str, Any]) -> Dict[str, Any]:
+        if self.think_time:
+            await asyncio.sleep(self.think_time)
+        # 以下没有 await，在事件循环中原子执行，同一协商的并发报价不会交错修改状态
+        self._evict()
+        negotiation_id, round_no = offer["negotiation_id"], offer["round"]
+        session = self.sessions.get(negotiation_id)
+        if session is None:
+            if round_no != 1:
+                raise MessageValidationError(f"协商 {negotiation_id} 不存在或已过期")
+            session = Negotiation(negotiation_id, "", offer["task"], offer["expires_at"])
+            self.sessions[negotiation_id] = session
+
+        if round_no == session.round and session.last_reply is not None:
+            return session.last_reply
+        if session.terminal:
+            return self._reply(session, "rejected", message=f"协商已结束: {session.state}")
+        if round_no != session.round + 1:
+            raise MessageValidationError(f"协商 {negotiation_id}: 期望第 {session.round + 1} 轮，收到第 {round_no} 轮")
+
+        # 反提案具有约束力：发起方按上一轮反提案的条件报价即达成协议
+        price, days = offer["price"], offer["days"]
+        binding = session.state == "countered" and abs(price - session.price) < 1e-9 and days == session.days
+        session.round = round_no
+        session.transition("offered")
+        if time.time() > session.expires_at:
+            session.transition("expired", "超过截止时间")
+            return self._reply(session, "expired", message="超过截止时间")
+
+        if binding or (self.strategy.acceptable(price, round_no) and days >= self.min_days):
+            session.transition("agreed", price=price, days=days)
+            return self._reply(session, "accepted", price, days, "接受报价")
+        if round_no >= self.strategy.max_rounds:
+            session.transition("rejected", "超过最大轮数")
+            return self._reply(session, "rejected", message="超过最大轮数，无法达成一致")
+        ask = round_price(self.strategy.target(round_no + 1))
+        session.transition("countered", price=ask, days=max(days, self.min_days))
+        message = "截止日期太紧" if days < self.min_days else "价格过低"
+        return self._reply(session, "countered", session.price, session.days, message)
+
+    def _reply(self, session: Negotiation, status: str, price: Optional[float] = None,
+               days: Optional[int] = None, message: str = "") -> Dict[str, Any]:
+        session.last_reply = {"negotiation_id": session.negotiation_id, "round": session.round,
+                              "status": status, "price": price, "days": days, "message": message}
+        return session.last_reply
+
+    async def handle_close(self, close: Dict[str, Any]) -> Dict[str, Any]:
+        session = self.sessions.get(close["negotiation_id"])
+        if session is None:
+            return {"negotiation_id": close["negotiation_id"], "state": "unknown"}
+        if not session.terminal or session.state == "agreed":
+            session.transition("cancelled", close["reason"] or "发起方取消")
+        return {"negotiation_id": session.negotiation_id, "state": session.state}
+
+    def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for session in self.sessions.values():
+            counts[session.state] = counts.get(session.state, 0) + 1
+        return counts
+
+
+class Negotiator:
+    """
+    协商发起方。
+
+    :param name: 发起方名称，作为消息的 sender
+    :param strategy: 买方让步策略（initial <= reservation）
+    :param max_days: 任务的最晚期限（天），对方要求更长时放弃该对手方
+    :param deadline: 每个协商的整体有效期（秒）
+    :param round_timeout: 每轮等待回复的超时（秒）
+    :param codec: 消息编码，默认优先 msgpack
+    """
+    def __init__(
+            self,
+            name: str,
+            strategy: ConcessionStrategy,
+            max_days: int,
+            deadline: float = 5.0,
+            round_timeout: float = 1.0,
+            codec: Optional[str] = None,
+    ):
+        self.name = name
+        self.strategy = strategy
+        self.max_days = max_days
+        self.deadline = deadline
+        self.round_timeout = round_timeout
+        self.codec = codec
+
+    def _new(self, client: AsyncA2AClient, task: str) -> Negotiation:
+        return Negotiation(uuid.uuid4().hex, client.server_url, task, time.time() + self.deadline)
+
+    async def negotiate(self, client: AsyncA2AClient, task: str) -> Negotiation:
+        """ 与一个对手方协商直到结束，返回协商状态（state 为终态）。 """
+        negotiation = self._new(client, task)
+        await self._run(client, negotiation)
+        return negotiation
+
+    async def _run(self, client: AsyncA2AClient, negotiation: Negotiation) -> None:
+        price, days = round_price(self.strategy.target(1)), self.max_days
+        while True:
+            remaining = negotiation.expires_at - time.time()
+            if remaining <= 0:
+                negotiation.transition("expired", "超过截止时间")
+                return
+            negotiation.round += 1
+            negotiation.transition("offered", price=price, days=days)
+            offer = Envelope("offer", {
+                "negotiation_id": negotiation.negotiation_id, "round": negotiation.round, "task": negotiation.task,
+                "price": price, "days": days, "expires_at": negotiation.expires_at,
+            }, sender=self.name)
+            try:
+                reply = await asyncio.wait_for(
+                    client.send_message("negotiate", offer, codec=self.codec), min(self.round_timeout, remaining))
+            except asyncio.TimeoutError:
+                expired = time.time() >= negotiation.expires_at
+                negotiation.transition("expired" if expired else "failed",
+                                       "超过截止时间" if expired else f"第 {negotiation.round} 轮回复超时")
+                return
+            except (RuntimeError, MessageValidationError) as e:
+                negotiation.transition("failed", str(e))
+                return
+
+            status = reply.payload["status"]
+            if status not in REPLY_STATUSES:
+                negotiation.transition("failed", f"未知的回复状态: {status}")
+                return
+            if status == "accepted":
+                negotiation.transition("agreed", price=reply.payload["price"], days=reply.payload["days"])
+                return
+            if status != "countered":
+                negotiation.transition("expired" if status == "expired" else "rejected", reply.payload["message"])
+                return
+
+            counter_price, counter_days = reply.payload["price"], reply.payload["days"]
+            negotiation.transition("countered", price=counter_price, days=counter_days)
+            if counter_price is None or counter_days is None or counter_days > self.max_days:
+                negotiation.transition("rejected", f"对方要求 {counter_days} 天，超过期限 {self.max_days} 天")
+                await self._send_close(client, negotiation)
+                return
+            if self.strategy.acceptable(counter_price, negotiation.round + 1):
+                # 按反提案的条件报价，对方必须接受
+                price, days = counter_price, counter_days
+            elif negotiation.round >= self.strategy.max_rounds:
+                negotiation.transition("rejected", "超过最大轮数")
+                await self._send_close(client, negotiation)
+                return
+            else:
+                price, days = round_price(self.strategy.target(negotiation.round + 1)), self.max_days
+
+    async def negotiate_many(
+            self,
+            clients: List[AsyncA2AClient],
+            task: str,
+            select: str = "best",
+    ) -> Tuple[Optional[Negotiation], List[Negotiation]]:
+        """
+        同时与多个对手方协商同一个任务，返回 (胜出的协商或 None, 所有协商)。
+
+        :param select: "first" 第一个达成协议者胜出，其余协商立即取消；"best" 等待全部结束后选价格最低者
+        """
+        if select not in SELECT_MODES:
+            raise ValueError(f"不支持的选择方式: {select}，可选: {SELECT_MODES}")
+        negotiations = [self._new(client, task) for client in clients]
+        tasks = {asyncio.create_task(self._run(client, negotiation)): negotiation
+                 for client, negotiation in zip(clients, negotiations)}
+        winner = None
+        try:
+            if select == "first":
+                for done in asyncio.as_completed(tasks):
+                    await done
+                    agreed = [n for n in negotiations if n.state == "agreed"]
+                    if agreed:
+                        winner = agreed[0]
+                        break
+            else:
+                await asyncio.gather(*tasks)
+                agreed = [n for n in negotiations if n.state == "agreed"]
+                if agreed:
+                    winner = min(agreed, key=lambda n: (n.price, n.days, n.elapsed))
+        finally:
+            for pending in tasks:
+                pending.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        losers = [(client, n) for client, n in zip(clients, negotiations)
+                  if n is not winner and n.state in ("open", "offered", "countered", "agreed")]
+        await asyncio.gather(*(self.close(client, n, "已选择其他对手方") for client, n in losers))
+        return winner, negotiations
+
+    async def close(self, client: AsyncA2AClient, negotiation: Negotiation, reason: str) -> None:
+        """ 取消协商并通知对手方释放会话；通知失败不影响本地状态。 """
+        if negotiation.state in ("open", "offered", "countered", "agreed"):
+            negotiation.transition("cancelled", reason)
+        await self._send_close(client, negotiation)
+
+    async def _send_close(self, client: AsyncA2AClient, negotiation: Negotiation) -> None:
+        message = Envelope("negotiation_close",
+                           {"negotiation_id": negotiation.negotiation_id, "reason": negotiation.reason}, sender=self.name)
+        try:
+            await asyncio.wait_for(client.send_message("negotiate_close", message, codec=self.codec), self.round_timeout)
+        except (asyncio.TimeoutError, RuntimeError, MessageValidationError):
+            pass
+
+
+def round_price(price: float) -> float:
+    return round(price, 2)
+
+
+def summarize(negotiations: List[Negotiation]) -> Dict[str, Any]:
+    """ 汇总协商结果：各状态的数量、达成协议所需的平均轮数和延迟分位数。 """
+    states: Dict[str, int] = {}
+    for negotiation in negotiations:
+        states[negotiation.state] = states.get(negotiation.state, 0) + 1
+    agreed = [n for n in negotiations if n.state == "agreed"]
+    latencies = sorted(n.elapsed * 1000 for n in agreed)
+
+    def percentile(p: float) -> Optional[float]:
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 1)
+
+    return {
+        "total": len(negotiations),
+        "states": states,
+        "avg_rounds": round(sum(n.round for n in agreed) / len(agreed), 2) if agreed else None,
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+    }
@@ -0,0 +1,297 @@
+"""
+A2A 技能路由
+
+同一个技能可以由多个副本 (replica) 提供，路由器在客户端一侧把请求分发到其中一个副本：
+- 健康检查：后台线程定期请求每个副本的 /health；连续失败的副本暂时摘除，
+  冷却期过后健康检查通过才重新加入（/health 正常但技能持续报错的副本不会被反复加回）
+- 负载感知选择：least_loaded 选择进行中请求最少的副本；latency 按 平均延迟 × (进行中请求数 + 1)
+  估算排队时间，选择最小者（没有延迟样本的新副本优先，以便尽快探测）
+- 重试：连接失败或 502/503/504 时换一个尚未尝试过的副本重试；读超时只在幂等调用 (idempotent=True) 时重试，
+  否则请求可能已经在副本上执行过。技能自身报错（500）和 4xx 是请求本身的问题，不重试，也不计入副本健康度
+
+RoutedA2ATool 与 A2ATool 的名称、参数相同，接待员的工具列表不需要任何改动，
+只需把单个 agent_url 换成一组副本即可水平扩展。
+
+用法：
+    >>> router = A2ASkillRouter(["http://localhost:6000", "http://localhost:6010"])
+    >>> router.execute_skill("answer", "answer 如何调用API")
+"""
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from hello_agents.tools import A2ATool
+from requests.adapters import HTTPAdapter
+
+ROUTING_STRATEGIES = ("least_loaded", "latency")
+# 网关错误 / 过载：请求没有被技能处理，可以换副本重试
+RETRYABLE_STATUS = (502, 503, 504)
+
+
+class Replica:
+    """ 一个副本的状态；由 A2ASkillRouter 在锁内更新。 """
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.inflight = 0
+        self.consecutive_failures = 0
+        self.latency_ewma: Optional[float] = None
+        self.down_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def expected_wait(self) -> float:
+        return (self.latency_ewma or 0.0) * (self.inflight + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "inflight": self.inflight,
+            "latency_ms": round(self.latency_ewma * 1000, 2) if self.latency_ewma is not None else None,
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+
+class _ReplicaError(Exception):
+    """ 副本不可用（连接失败、超时或 502/503/504）；retryable 表示可以安全地换副本重试。 """
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class A2ASkillRouter:
+    """
+    在多个 A2A 副本之间分发请求的路由器（线程安全）。
+
+    :param replica_urls: 副本 URL 列表，所有副本应提供相同的技能
+    :param strategy: 选择策略，"least_loaded" 或 "latency"
+    :param max_attempts: 单次请求最多尝试的副本数
+    :param timeout: 单个副本的请求超时（秒）
+    :param failure_threshold: 连续失败多少次后摘除副本
+    :param cooldown: 副本被摘除后，至少经过多久（秒）才允许健康检查把它加回
+    :param health_interval: 健康检查间隔（秒），为 0 时不启动后台检查
+    :param latency_alpha: 延迟指数滑动平均的权重
+    """
+    def __init__(
+            self,
+            replica_urls: List[str],
+            strategy: str = "latency",
+            max_attempts: int = 3,
+            timeout: float = 30.0,
+            failure_threshold: int = 2,
+            cooldown: float = 10.0,
+            health_interval: float = 5.0,
+            latency_alpha: float = 0.3,
+    ):
+        if not replica_urls:
+            raise ValueError("至少需要一个副本")
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"不支持的路由策略: {strategy}，可选: {ROUTING_STRATEGIES}")
+        self.replicas = [Replica(url) for url in replica_urls]
+        self.strategy = strategy
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency_alpha = latency_alpha
+        self._lock = threading.Lock()
+        # 长连接复用；连接池大小按副本数和并发量预留
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.replicas), pool_maxsize=32)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        self._closed = threading.Event()
+        self._health_thread = None
+        if health_interval > 0:
+            self._health_thread = threading.Thread(
+                target=self._health_loop, args=(health_interval,), name="a2a-router-health", daemon=True)
+            self._health_thread.start()
+
+    # ---------- 选择与状态更新 ----------
+
+    def _pick(self, exclude: set) -> Optional[Replica]:
+        with self._lock:
+            candidates = [r for r in self.replicas if r.url not in exclude]
+            healthy = [r for r in candidates if r.healthy]
+            # 全部副本都被摘除时仍然尝试，避免健康检查误判导致整体不可用
+            candidates = healthy or candidates
+            if not candidates:
+                return None
+            if self.strategy == "least_loaded":
+                key = lambda r: (r.inflight, r.latency_ewma or 0.0, random.random())
+            else:
+                key = lambda r: (r.expected_wait(), r.inflight, random.random())
+            replica = min(candidates, key=key)
+            replica.inflight += 1
+            return replica
+
+    def _record(self, replica: Replica, latency: Optional[float], error: bool) -> None:
+        with self._lock:
+            replica.inflight -= 1
+            replica.calls += 1
+            if error:
+                replica.errors += 1
+                self._mark_failure(replica)
+                return
+            replica.consecutive_failures = 0
+            replica.healthy = True
+            if latency is not None:
+                if replica.latency_ewma is None:
+                    replica.latency_ewma = latency
+                else:
+                    replica.latency_ewma += self.latency_alpha * (latency - replica.latency_ewma)
+
+    def _mark_failure(self, replica: Replica) -> None:
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= self.failure_threshold:
+            if replica.healthy:
+                replica.down_until = time.monotonic() + self.cooldown
+            replica.healthy = False
+
+    # ---------- 请求 ----------
+
+    def _post(self, replica: Replica, path: str, payload: Dict[str, Any], idempotent: bool) -> Dict[str, Any]:
+        try:
+            response = self._session.post(f"{replica.url}{path}", json=payload, timeout=self.timeout)
+        except requests.ConnectionError as e:
+            raise _ReplicaError(str(e))
+        except requests.RequestException as e:
+            # 读超时等：请求可能已经送达并在执行，只有幂等调用才能换副本重试
+            raise _ReplicaError(str(e), retryable=idempotent)
+        if response.status_code in RETRYABLE_STATUS:
+            raise _ReplicaError(f"HTTP {response.status_code}: {response.text[:200]}")
+        try:
+            data = response.json()
+        except ValueError:
+            data = {"error": response.text[:200]}
+        if response.status_code >= 400:
+            data.setdefault("status", "error")
+        return data
+
+    def request(self, path: str, payload: Dict[str, Any], idempotent: bool = False) -> Dict[str, Any]:
+        """
+        把请求发送到选中的副本，副本不可用时换副本重试；返回值带有 replica 字段。
+
+        :param idempotent: 请求可以安全地重复执行时为 True，此时读超时也会换副本重试
+        """
+        tried: set = set()
+        errors = []
+        for _ in range(min(self.max_attempts, len(self.replicas))):
+            replica = self._pick(tried)
+            if replica is None:
+                break
+            tried.add(replica.url)
+            start = time.perf_counter()
+            try:
+                data = self._post(replica, path, payload, idempotent)
+            except _ReplicaError as e:
+                self._record(replica, None, error=True)
+                errors.append(f"{replica.url}: {e}")
+                if not e.retryable:
+                    break
+                continue
+            self._record(replica, time.perf_counter() - start, error=False)
+            data["replica"] = replica.url
+            return data
+        return {"error": f"请求失败: {'; '.join(errors) or '没有可用副本'}", "status": "error"}
+
+    def execute_skill(self, skill_name: str, text: str = "", idempotent: bool = False) -> Dict[str, Any]:
+        """ 执行技能，返回格式与 A2AClient.execute_skill 相同；技能是只读查询时可以传 idempotent=True。 """
+        return self.request(f"/execute/{skill_name}", {"text": text}, idempotent=idempotent)
+
+    def ask(self, question: str) -> str:
+        """ 通用问答接口。 """
+        data = self.request("/ask", {"question": question})
+        if data.get("status") == "error":
+            return f"Error communicating with agent: {data.get('error')}"
+        return data.get("answer", "No response")
+
+    def get_info(self) -> Dict[str, Any]:
+        """ 从任一健康副本获取 Agent 信息。 """
+        for replica in sorted(self.replicas, key=lambda r: not r.healthy):
+            try:
+                response = self._session.get(f"{replica.url}/info", timeout=10)
+                response.raise_for_status()
+                return response.json()
+            except requests.RequestException:
+                continue
+        return {"error": "Failed to get agent info: 没有可用副本"}
+
+    # ---------- 健康检查 ----------
+
+    def check_health(self) -> Dict[str, bool]:
+        """ 检查一次所有副本，返回 url -> 是否可用（冷却期内的副本即使检查通过也视为不可用）。 """
+        results = {}
+        for replica in self.replicas:
+            try:
+                ok = self._session.get(f"{replica.url}/health", timeout=min(self.timeout, 5)).status_code == 200
+            except requests.RequestException:
+                ok = False
+            with self._lock:
+                if not ok:
+                    self._mark_failure(replica)
+                elif replica.healthy or time.monotonic() >= replica.down_until:
+                    replica.healthy = True
+                    replica.consecutive_failures = 0
+                results[replica.url] = replica.healthy
+        return results
+
+    def _health_loop(self, interval: float) -> None:
+        while not self._closed.wait(interval):
+            self.check_health()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [replica.to_dict() for replica in self.replicas]
+
+    def close(self) -> None:
+        self._closed.set()
+        self._session.close()
+
+
+class RoutedA2ATool(A2ATool):
+    """
+    名称和参数与 A2ATool 相同，但通过 A2ASkillRouter 把请求分发到多个副本。
+
+    :param router: 副本路由器
+    :param skill_name: 指定时 ask 操作调用该技能（文本为 "<skill_name> <question>"），否则调用副本的 /ask
+    :param on_call: 每次 ask 前以 (工具名, 问题) 调用，例如记录 LLM 选择了哪个工具
+    """
+    def __init__(self, router: A2ASkillRouter, name: str = "a2a", description: str = None,
+                 skill_name: Optional[str] = None, on_call: Optional[Callable[[str, str], None]] = None):
+        super().__init__(agent_url=router.replicas[0].url, name=name, description=description)
+        self.router = router
+        self.skill_name = skill_name
+        self.on_call = on_call
+
+    def run(self, parameters: Dict[str, Any]) -> str:
+        action = parameters.get("action", "").lower()
+        if not action:
+            return "错误：必须指定 action 参数"
+
+        if action == "ask":
+            question = parameters.get("question")
+            if not question:
+                return "错误：必须指定 question 参数"
+            if self.on_call is not None:
+                self.on_call(self.name, question)
+            if self.skill_name is None:
+                return f"Agent 回答:\n{self.router.ask(question)}"
+            response = self.router.execute_skill(self.skill_name, f"{self.skill_name} {question}")
+            if response.get("status") == "success":
+                return f"Agent 回答:\n{response.get('result', 'No response')}"
+            return f"A2A 操作失败: {response.get('error', 'Unknown error')}"
+
+        if action == "get_info":
+            info = self.router.get_info()
+            result = "Agent 信息:\n"
+            for key, value in info.items():
+                result += f"- {key}: {value}\n"
+            return result
+
+        return f"错误：不支持的操作 '{action}'"
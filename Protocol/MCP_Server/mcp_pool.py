@@ -0,0 +1,369 @@
+"""
+MCP 服务器常驻进程池
+
+MCPTool 每次调用都会新建一个 MCPClient，也就是重新拉起一个 stdio 服务器进程，每次都要付出 Python 启动和导入的开销。
+这里维护一组常驻（预热）的服务器连接，供多个 Agent 共享：
+- 预热：创建连接池时即启动全部服务器进程并完成握手，第一次工具调用不再有冷启动
+- 多路复用：同一连接上可以并发发送多个请求，调用时选择在途请求最少的连接
+- 健康检查：后台定期 ping 每个连接，失败则重启对应的服务器进程
+- 崩溃重启：调用失败且连接已不可用时，重启该连接并在重启后的连接上重试一次
+
+用法：
+    >>> tool = PooledMCPTool(name="weather", server_command=["python", "weather_server.py"], pool_size=2)
+    >>> agent.add_tool(tool)
+"""
+import asyncio
+import atexit
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from hello_agents.protocols.mcp.client import MCPClient
+from hello_agents.tools import MCPTool
+
+
+class _Connection:
+    """ 池中的一个服务器连接。客户端的进入与退出都在同一个任务 (_serve) 中完成。 """
+    def __init__(self, index: int):
+        self.index = index
+        self.client: Optional[MCPClient] = None
+        self.task: Optional[asyncio.Task] = None
+        self.ready: Optional[asyncio.Event] = None
+        self.stop: Optional[asyncio.Event] = None
+        self.lock: Optional[asyncio.Lock] = None
+        self.inflight = 0
+        self.calls = 0
+        self.restarts = 0
+        self.error: Optional[BaseException] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.client is not None
+
+
+class MCPServerPool:
+    """
+    常驻 MCP 服务器连接池，内部在独立线程中运行一个事件循环，对外提供同步接口。
+
+    :param server_command: 服务器启动命令，如 ["python", "server.py"]
+    :param server_args: 额外的服务器参数
+    :param env: 传给服务器进程的环境变量
+    :param size: 常驻进程数
+    :param health_interval: 健康检查间隔（秒）
+    :param call_timeout: 单次请求超时（秒）
+    :param startup_timeout: 单个服务器进程的启动超时（秒）
+    """
+    def __init__(
+            self,
+            server_command: List[str],
+            server_args: Optional[List[str]] = None,
+            env: Optional[Dict[str, str]] = None,
+            size: int = 2,
+            health_interval: float = 30.0,
+            call_timeout: float = 60.0,
+            startup_timeout: float = 30.0,
+    ):
+        self.server_command = list(server_command)
+        self.server_args = list(server_args or [])
+        self.env = dict(env or {})
+        self.size = max(1, size)
+        self.health_interval = health_interval
+        self.call_timeout = call_timeout
+        self.startup_timeout = startup_timeout
+        self._connections: List[_Connection] = []
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mcp-pool", daemon=True)
+        self._thread.start()
+        self._run(self._start())
+
+    # ---------- 同步接口 ----------
+
+    def list_tools(self) -> List[Dict[str, Any]]:
+        return self._run(self._execute(lambda client: client.list_tools()))
+
+    def call_tool(self, tool_name: str, arguments: Optional[Dict[str, Any]] = None) -> Any:
+        return self._run(self._execute(lambda client: client.call_tool(tool_name, arguments or {})))
+
+    def run_action(self, action: str, parameters: Dict[str, Any]) -> str:
+        """ 执行与 MCPTool.run 相同的操作，返回相同格式的文本。 """
+        try:
+            return self._run(self._execute(lambda client: _run_action(client, action, parameters)))
+        except Exception as e:
+            return f"MCP 操作失败: {str(e)}"
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {"index": c.index, "healthy": c.healthy, "inflight": c.inflight,
+             "calls": c.calls, "restarts": c.restarts}
+            for c in self._connections
+        ]
+
+    def close(self) -> None:
+        """ 关闭所有服务器进程并停止后台事件循环。 """
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._run(self._shutdown(), timeout=self.startup_timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+
+    def _run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        if not self._thread.is_alive():
+            raise RuntimeError("MCP 连接池已关闭")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    # ---------- 连接管理 ----------
+
+    async def _start(self) -> None:
+        self._connections = [_Connection(i) for i in range(self.size)]
+        await asyncio.gather(*(self._spawn(conn) for conn in self._connections))
+        self._health_task = asyncio.create_task(self._health_loop())
+        ready = sum(1 for conn in self._connections if conn.healthy)
+        print(f"♨️ MCP 连接池已预热: {ready}/{self.size} 个服务器进程就绪")
+
+    async def _spawn(self, conn: _Connection) -> None:
+        conn.ready = asyncio.Event()
+        conn.stop = asyncio.Event()
+        if conn.lock is None:
+            conn.lock = asyncio.Lock()
+        conn.task = asyncio.create_task(self._serve(conn))
+        try:
+            await asyncio.wait_for(conn.ready.wait(), self.startup_timeout)
+        except asyncio.TimeoutError:
+            conn.error = TimeoutError("MCP 服务器启动超时")
+
+    async def _serve(self, conn: _Connection) -> None:
+        try:
+            async with MCPClient(self.server_command, self.server_args, env=self.env) as client:
+                conn.client = client
+                conn.error = None
+                conn.ready.set()
+                await conn.stop.wait()
+        except Exception as e:
+            conn.error = e
+        finally:
+            conn.client = None
+            conn.ready.set()
+
+    async def _restart(self, conn: _Connection) -> None:
+        async with conn.lock:
+            if conn.stop is not None:
+                conn.stop.set()
+            if conn.task is not None:
+                try:
+                    await asyncio.wait_for(conn.task, self.startup_timeout)
+                except (asyncio.TimeoutError, Exception):
+                    conn.task.cancel()
+            conn.restarts += 1
+            await self._spawn(conn)
+
+    async def _is_alive(self, conn: _Connection) -> bool:
+        client = conn.client
+        if client is None:
+            return False
+        try:
+            return await asyncio.wait_for(client.ping(), 5)
+        except Exception:
+            return False
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for conn in self._connections:
+                if not await self._is_alive(conn):
+                    print(f"⚠️ MCP 服务器连接 #{conn.index} 不可用，正在重启...")
+                    await self._restart(conn)
+
+    async def _pick(self) -> _Connection:
+        """ 选择在途请求最少的健康连接；没有健康连接时先尝试重启。 """
+        healthy = [conn for conn in self._connections if conn.healthy]
+        if not healthy:
+            await asyncio.gather(*(self._restart(conn) for conn in self._connections))
+            healthy = [conn for conn in self._connections if conn.healthy]
+        if not healthy:
+            errors = "; ".join(str(conn.error) for conn in self._connections if conn.error)
+            raise RuntimeError(f"没有可用的 MCP 服务器连接: {errors}")
+        return min(healthy, key=lambda conn: (conn.inflight, conn.calls))
+
+    async def _execute(self, op: Callable[[MCPClient], Awaitable]) -> Any:
+        last_error: Optional[BaseException] = None
+        restarted: Optional[_Connection] = None
+        for _ in range(2):
+            # 重试时优先使用刚重启过的连接，其它连接可能也已经随同一原因失效
+            conn = restarted if restarted is not None and restarted.healthy else await self._pick()
+            conn.inflight += 1
+            conn.calls += 1
+            try:
+                return await asyncio.wait_for(op(conn.client), self.call_timeout)
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                # 连接仍然可用说明是工具本身的错误，直接抛出；否则重启后换一个连接重试
+                if await self._is_alive(conn):
+                    raise
+                last_error = e
+                await self._restart(conn)
+                restarted = conn
+            finally:
+                conn.inflight -= 1
+        raise last_error
+
+    async def _shutdown(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for conn in self._connections:
+            if conn.stop is not None:
+                conn.stop.set()
+        tasks = [conn.task for conn in self._connections if conn.task is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _run_action(client: MCPClient, action: str, parameters: Dict[str, Any]) -> str:
+    """ 与 MCPTool.run 中的操作分发保持一致。 """
+    if action == "list_tools":
+        tools = await client.list_tools()
+        if not tools:
+            return "没有找到可用的工具"
+        result = f"找到 {len(tools)} 个工具:\n"
+        for tool in tools:
+            result += f"- {tool['name']}: {tool['description']}\n"
+        return result
+
+    elif action == "call_tool":
+        tool_name = parameters.get("tool_name")
+        arguments = parameters.get("arguments", {})
+        if not tool_name:
+            return "错误：必须指定 tool_name 参数"
+        result = await client.call_tool(tool_name, arguments)
+        return f"工具 '{tool_name}' 执行结果:\n{result}"
+
+    elif action == "list_resources":
+        resources = await client.list_resources()
+        if not resources:
+            return "没有找到可用的资源"
+        result = f"找到 {len(resources)} 个资源:\n"
+        for resource in resources:
+            result += f"- {resource['uri']}: {resource['name']}\n"
+        return result
+
+    elif action == "read_resource":
+        uri = parameters.get("uri")
+        if not uri:
+            return "错误：必须指定 uri 参数"
+        content = await client.read_resource(uri)
+        return f"资源 '{uri}' 内容:\n{content}"
+
+    elif action == "list_prompts":
+        prompts = await client.list_prompts()
+        if not prompts:
+            return "没有找到可用的提示词"
+        result = f"找到 {len(prompts)} 个提示词:\n"
+        for prompt in prompts:
+            result += f"- {prompt['name']}: {prompt['description']}\n"
+        return result
+
+    elif action == "get_prompt":
+        prompt_name = parameters.get("prompt_name")
+        prompt_arguments = parameters.get("prompt_arguments", {})
+        if not prompt_name:
+            return "错误：必须指定 prompt_name 参数"
+        messages = await client.get_prompt(prompt_name, prompt_arguments)
+        result = f"提示词 '{prompt_name}':\n"
+        for msg in messages:
+            result += f"[{msg['role']}] {msg['content']}\n"
+        return result
+
+    else:
+        return f"错误：不支持的操作 '{action}'"
+
+
+_pools: Dict[Tuple, MCPServerPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_mcp_pool(
+        server_command: List[str],
+        server_args: Optional[List[str]] = None,
+        env: Optional[Dict[str, str]] = None,
+        size: int = 2,
+) -> MCPServerPool:
+    """ 获取共享的连接池，相同命令、参数和环境变量的工具共用一个池。 """
+    key = (tuple(server_command), tuple(server_args or []), tuple(sorted((env or {}).items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = MCPServerPool(server_command, server_args, env, size=size)
+    return pool
+
+
+@atexit.register
+def close_all_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        try:
+            pool.close()
+        except Exception:
+            pass
+
+
+class PooledMCPTool(MCPTool):
+    """
+    使用常驻连接池的 MCPTool，接口与 MCPTool 相同（仅支持 server_command 方式）。
+
+    :param pool_size: 常驻进程数，只在该命令的连接池首次创建时生效
+    :param pool: 直接指定要使用的连接池
+    """
+    def __init__(self,
+                 name: str = "mcp",
+                 description: Optional[str] = None,
+                 server_command: Optional[List[str]] = None,
+                 server_args: Optional[List[str]] = None,
+                 auto_expand: bool = True,
+                 env: Optional[Dict[str, str]] = None,
+                 env_keys: Optional[List[str]] = None,
+                 pool_size: int = 2,
+                 pool: Optional[MCPServerPool] = None):
+        if not server_command and pool is None:
+            raise ValueError("PooledMCPTool 需要指定 server_command 或 pool")
+        # MCPTool.__init__ 会调用 _discover_tools，需要提前准备好连接池参数
+        self._pool = pool
+        self._pool_size = pool_size
+        super().__init__(
+            name=name,
+            description=description,
+            server_command=server_command or pool.server_command,
+            server_args=server_args,
+            auto_expand=auto_expand,
+            env=env,
+            env_keys=env_keys
+        )
+
+    @property
+    def pool(self) -> MCPServerPool:
+        if self._pool is None:
+            self._pool = get_mcp_pool(self.server_command, self.server_args, self.env, size=self._pool_size)
+        return self._pool
+
+    def _discover_tools(self):
+        """通过连接池发现工具，同时完成服务器进程预热"""
+        try:
+            self._available_tools = self.pool.list_tools()
+        except Exception as e:
+            print(f"⚠️ MCP 工具发现失败: {e}")
+            self._available_tools = []
+
+    def run(self, parameters: Dict[str, Any]) -> str:
+        action = parameters.get("action", "").lower()
+        if not action and "tool_name" in parameters:
+            action = "call_tool"
+            parameters["action"] = action
+        if not action:
+            return "错误：必须指定 action 参数或 tool_name 参数"
+        return self.pool.run_action(action, parameters)
@@ -31,6 +31,12 @@ async def test_weather_server():
                     print(f"{city} 天气: {weather['temperature']}°C, {weather['condition']}")
                 await asyncio.sleep(1)
 
+            # 批量查询天气（一次工具调用）
+            batch = json.loads(await client.call_tool("get_weather_batch", {"cities": test_cities + ["上海市"]}))
+            print(f"批量查询: 成功 {batch['succeeded']} 个, 失败 {batch['failed']} 个")
+            for error in batch["errors"]:
+                print(f"{error['city']} 查询失败: {error['error']}")
+
             print("\n✅ 所有测试完成！")
 
     except Exception as e:
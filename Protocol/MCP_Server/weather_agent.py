@@ -6,9 +6,10 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 from hello_agents import SimpleAgent, HelloAgentsLLM
-from hello_agents.tools import MCPTool
 from datetime import datetime
 
+from mcp_pool import PooledMCPTool
+
 def create_weather_agent():
     """
     Create a weather agent that can provide weather information.
@@ -23,11 +24,13 @@ def create_weather_agent():
                 当前系统时间是：{current_time}。
                 如果用户询问日期或时间，请直接使用上述系统时间，不要编造。
                 使用 get_weather 工具查询天气，支持中文城市名。
+                需要同时查询或比较多个城市时，使用 get_weather_batch 工具一次查询所有城市。
                 """
     )
 
     server_script = os.path.join(os.path.dirname(__file__), "weather_server.py")
-    weather_tool = MCPTool(server_command=['python', server_script])
+    # 使用常驻连接池：服务器进程在多个 Agent 之间共享，首次工具调用无需冷启动
+    weather_tool = PooledMCPTool(server_command=['python', server_script], pool_size=2)
     assistant.add_tool(weather_tool)
 
     return assistant
@@ -2,59 +2,39 @@
 A simple MCP server that provides weather information for a given city.
 """
 import json
-import time
-import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Any
 
-import requests
 from hello_agents.protocols import MCPServer
 
-CITY_MAP = {
-    "北京": "Beijing",
-    "上海": "Shanghai",
-    "广州": "Guangzhou",
-    "深圳": "Shenzhen",
-    "纽约": "New York",
-    "伦敦": "London",
-    "巴黎": "Paris",
-    "东京": "Tokyo"
-}
+from myAgent.my_weather_cache import CITY_MAP, canonical_city, get_current_weather
+from Protocol.mcp_metrics import install_metrics
+
+# 批量查询的城市数上限与并发数
+MAX_BATCH_CITIES = 20
+BATCH_WORKERS = 8
 
 # 创建 MCP 服务器
 weather_server = MCPServer(name="天气信息服务", description="提供城市天气信息的服务")
 
+# 工具调用追踪：metrics://tools 资源 + 可选的 Prometheus 文件（环境变量 MCP_METRICS_FILE）
+metrics = install_metrics(weather_server.mcp, "weather_server")
+
 def get_weather_data(city: str) -> dict[str, float | str | int | Any] | None:
-    """Fetch weather data from a public API."""
-    city_en = CITY_MAP.get(city, city)
-    safe_city = urllib.parse.quote(city_en)
-    url = f"https://wttr.in/{safe_city}?format=j1"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+    """Fetch weather data from a public API (through the shared TTL cache)."""
+    current = get_current_weather(city)
+    return {
+        "city": city,
+        "temperature": current['temp_C'],
+        "feels_like": float(current["FeelsLikeC"]),
+        "humidity": int(current["humidity"]),
+        "condition": current["weatherDesc"][0]["value"],
+        "wind_speed": round(float(current["windspeedKmph"]) / 3.6, 1),
+        "visibility": float(current["visibility"]),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
-    for attempt in range(3):
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            current = data['current_condition'][0]
-            return {
-                "city": city,
-                "temperature": current['temp_C'],
-                "feels_like": float(current["FeelsLikeC"]),
-                "humidity": int(current["humidity"]),
-                "condition": current["weatherDesc"][0]["value"],
-                "wind_speed": round(float(current["windspeedKmph"]) / 3.6, 1),
-                "visibility": float(current["visibility"]),
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-        except Exception as e:
-            if attempt < 2:
-                time.sleep(1)
-                continue
-            raise e
-
 
 def get_weather(city: str) -> str:
     """MCP method to get weather information for a given city."""
@@ -65,6 +45,43 @@ def get_weather(city: str) -> str:
         return json.dumps({"error": str(e)}, ensure_ascii=False)
 
 
+def get_weather_batch(cities: list[str]) -> str:
+    """MCP method to get weather information for several cities in one call.
+
+    Cities are fetched concurrently through the shared cache; failed cities are
+    reported in "errors" without failing the whole batch.
+    """
+    # 同一城市的不同写法只查询一次，结果按输入顺序返回
+    unique: dict[str, str] = {}
+    for city in cities:
+        if isinstance(city, str) and city.strip():
+            unique.setdefault(canonical_city(city), city.strip())
+    if not unique:
+        return json.dumps({"error": "cities 不能为空"}, ensure_ascii=False)
+    if len(unique) > MAX_BATCH_CITIES:
+        return json.dumps({"error": f"一次最多查询 {MAX_BATCH_CITIES} 个城市"}, ensure_ascii=False)
+
+    def fetch(city: str) -> tuple[str, dict | None, str | None]:
+        try:
+            return city, get_weather_data(city), None
+        except Exception as e:
+            return city, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=min(BATCH_WORKERS, len(unique))) as executor:
+        outcomes = list(executor.map(fetch, unique.values()))
+
+    results = [data for _, data, error in outcomes if error is None]
+    errors = [{"city": city, "error": error} for city, _, error in outcomes if error is not None]
+    summary = {
+        "count": len(outcomes),
+        "succeeded": len(results),
+        "failed": len(errors),
+        "results": results,
+        "errors": errors
+    }
+    return json.dumps(summary, ensure_ascii=False, indent=2)
+
+
 def list_supported_cities() -> str:
     """MCP method to list supported cities."""
     result = {'cities': list(CITY_MAP.keys()), 'count': len(CITY_MAP)}
@@ -77,13 +94,14 @@ def get_server_info() -> str:
         "name": weather_server.name,
         "description": weather_server.description,
         "version": "1.0.0",
-        "tools": ["get_weather", "list_supported_cities", "get_server_info"]
+        "tools": ["get_weather", "get_weather_batch", "list_supported_cities", "get_server_info"]
     }
     return json.dumps(info, ensure_ascii=False, indent=2)
 
 
 # 注册 MCP 方法
 weather_server.add_tool(get_weather)
+weather_server.add_tool(get_weather_batch)
 weather_server.add_tool(list_supported_cities)
 weather_server.add_tool(get_server_info)
 
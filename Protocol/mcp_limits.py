@@ -0,0 +1,150 @@
+"""
+MCP 工具并发控制
+
+一个 HTTP / SSE 模式的 MCP 服务器会同时服务很多客户端，需要限制单个工具的资源占用：
+- 并发上限：每个工具一个信号量，超出上限的调用排队等待
+- 超时：调用超过时间上限直接返回错误，避免拖住客户端
+- 工作池：普通同步工具放到线程池执行，不阻塞事件循环；CPU 密集型工具放到进程池执行，绕开 GIL
+
+用法（limited 放在 @mcp.tool() 下面）：
+    >>> @mcp.tool()
+    ... @limited(max_concurrency=4, timeout=10, cpu_bound=True)
+    ... def heavy(text: str) -> int: ...
+
+未显式指定的上限取自 LIMITS，可在服务器启动前通过 configure_limits() 统一修改。
+"""
+import asyncio
+import atexit
+import functools
+import inspect
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 全局默认值；limited() 未指定的参数在首次调用时从这里读取
+LIMITS: Dict[str, Any] = {
+    "max_concurrency": 16,
+    "timeout": 30.0,
+    "cpu_workers": max(1, (os.cpu_count() or 2) - 1),
+}
+
+# CPU 密集型工具的原始函数，进程池中的工作进程通过名字查找
+_CPU_TOOLS: Dict[str, Callable] = {}
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def configure_limits(
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cpu_workers: Optional[int] = None,
+) -> None:
+    """ 修改全局默认的并发上限、超时和 CPU 工作进程数，需在处理第一个请求之前调用。 """
+    if max_concurrency is not None:
+        LIMITS["max_concurrency"] = max_concurrency
+    if timeout is not None:
+        LIMITS["timeout"] = timeout
+    if cpu_workers is not None:
+        LIMITS["cpu_workers"] = cpu_workers
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=LIMITS["cpu_workers"])
+    return _process_pool
+
+
+@atexit.register
+def _shutdown_process_pool() -> None:
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_cpu_tool(name: str, args: tuple, kwargs: dict) -> Any:
+    """ 在工作进程中执行 CPU 密集型工具。 """
+    return _CPU_TOOLS[name](*args, **kwargs)
+
+
+def limited(
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cpu_bound: bool = False,
+) -> Callable[[Callable], Callable]:
+    """
+    把工具函数包装为带并发上限和超时的异步函数。
+    同步函数放到线程池 / 进程池执行；异步函数（需自行把重计算移出事件循环）直接在事件循环中等待。
+
+    :param max_concurrency: 该工具的最大并发数，默认 LIMITS["max_concurrency"]
+    :param timeout: 单次调用超时（秒），默认 LIMITS["timeout"]
+    :param cpu_bound: 是否在进程池中执行（仅对同步函数有效）；参数和返回值需要可序列化
+        进程间传递参数和结果有固定开销，只适合单次计算远比序列化昂贵的工具；字符串反转、计数等轻量操作用线程池即可
+    """
+    def decorator(func: Callable) -> Callable:
+        # 只用限定名作为键：spawn 方式启动的工作进程里，主模块名会变成 __mp_main__
+        name = func.__qualname__
+        is_async = inspect.iscoroutinefunction(func)
+        if cpu_bound and not is_async:
+            _CPU_TOOLS[name] = func
+        state: Dict[str, Any] = {}
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            # 信号量在事件循环中首次调用时创建，此时 configure_limits() 的设置已经生效
+            semaphore = state.get("semaphore")
+            if semaphore is None:
+                semaphore = state["semaphore"] = asyncio.Semaphore(max_concurrency or LIMITS["max_concurrency"])
+            limit = timeout if timeout is not None else LIMITS["timeout"]
+
+            async with semaphore:
+                loop = asyncio.get_running_loop()
+                if is_async:
+                    future = func(*args, **kwargs)
+                elif cpu_bound:
+                    future = loop.run_in_executor(_get_process_pool(), _run_cpu_tool, name, args, kwargs)
+                else:
+                    future = loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+                try:
+                    return await asyncio.wait_for(future, limit)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"工具 {func.__name__} 执行超时 ({limit}s)")
+
+        return wrapper
+    return decorator
+
+
+# ==================== 测试 ====================
+# 测试用的 CPU 工具定义在模块顶层：工作进程按限定名在 _CPU_TOOLS 中查找原始函数
+
+def _square_in_worker(x: int) -> tuple:
+    return os.getpid(), x * x
+
+
+def _sleep_in_worker(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+_limited_square = limited(cpu_bound=True)(_square_in_worker)
+_limited_sleep = limited(cpu_bound=True, timeout=0.2)(_sleep_in_worker)
+
+
+def test_cpu_bound():
+    async def main():
+        pid, value = await _limited_square(12)
+        assert value == 144
+        assert pid != os.getpid(), "cpu_bound 工具应在工作进程中执行"
+        print(f"✓ cpu_bound 工具在工作进程 {pid} 中执行，结果 {value}")
+
+        try:
+            await _limited_sleep(1.0)
+        except TimeoutError as e:
+            print(f"✓ 超时返回错误: {e}")
+        else:
+            raise AssertionError("超过 timeout 的调用应抛出 TimeoutError")
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    test_cpu_bound()
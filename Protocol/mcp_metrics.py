@@ -0,0 +1,262 @@
+"""
+MCP 工具调用追踪
+
+以 FastMCP 中间件的形式记录每个工具的调用情况，用于判断 Agent 慢在 LLM 还是慢在 MCP 工具：
+- 调用次数与错误次数（错误率）
+- 延迟直方图（Prometheus 风格的累积分桶），以及由分桶估算的 p50 / p95 / p99
+- 请求参数与返回结果的大小（字节）
+
+暴露方式：
+- MCP 资源 metrics://tools，返回 JSON 摘要
+- Prometheus 文本格式文件：设置 prometheus_path（或环境变量 MCP_METRICS_FILE）后由后台线程定期写出，
+  不占用事件循环；进程退出时再写出最后一次。路径中的 {server} 会替换为服务器名，方便多个服务器共用同一个环境变量
+
+用法：
+    >>> metrics = install_metrics(mcp, "my_server")
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastmcp import FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+
+# 延迟分桶上界（秒）
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _ToolStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """ 由分桶估算分位数：返回所在桶的上界（不超过观测到的最大值）。 """
+        if not self.calls:
+            return None
+        target = q * self.calls
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.bucket_counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.latency_max)
+        return self.latency_max
+
+
+class ToolMetrics:
+    """
+    线程安全的工具调用指标。
+
+    :param server_name: 服务器名，作为 Prometheus 标签
+    :param prometheus_path: Prometheus 文本文件路径，为空时不写文件
+    :param export_interval: 后台线程写文件的间隔（秒），期间没有新调用时不写
+    """
+    def __init__(self, server_name: str, prometheus_path: Optional[str] = None, export_interval: float = 5.0):
+        self.server_name = server_name
+        self.prometheus_path = prometheus_path
+        self.export_interval = export_interval
+        self.started_at = time.time()
+        self._tools: Dict[str, _ToolStats] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._export_lock = threading.Lock()
+        self._exporter: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def record(self, tool: str, latency: float, request_bytes: int, response_bytes: int, error: bool) -> None:
+        with self._lock:
+            stats = self._tools.setdefault(tool, _ToolStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.latency_sum += latency
+            stats.latency_max = max(stats.latency_max, latency)
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    stats.bucket_counts[i] += 1
+                    break
+            else:
+                stats.bucket_counts[-1] += 1
+            self._dirty = True
+        if self.prometheus_path and self._exporter is None:
+            self._start_exporter()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """ JSON 友好的指标摘要。 """
+        with self._lock:
+            tools = {}
+            for name, stats in sorted(self._tools.items()):
+                tools[name] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "error_rate": round(stats.errors / stats.calls, 4) if stats.calls else 0.0,
+                    "latency_avg_ms": round(stats.latency_sum / stats.calls * 1000, 3) if stats.calls else None,
+                    "latency_max_ms": round(stats.latency_max * 1000, 3),
+                    "latency_p50_ms": _to_ms(stats.quantile(0.5)),
+                    "latency_p95_ms": _to_ms(stats.quantile(0.95)),
+                    "latency_p99_ms": _to_ms(stats.quantile(0.99)),
+                    "request_bytes_avg": stats.request_bytes // stats.calls if stats.calls else 0,
+                    "response_bytes_avg": stats.response_bytes // stats.calls if stats.calls else 0,
+                }
+        return {"server": self.server_name, "uptime_s": round(time.time() - self.started_at, 1), "tools": tools}
+
+    def to_prometheus(self) -> str:
+        """ Prometheus 文本格式。 """
+        server = _escape_label(self.server_name)
+        lines: List[str] = [
+            "# HELP mcp_tool_calls_total Total MCP tool calls.",
+            "# TYPE mcp_tool_calls_total counter",
+        ]
+        with self._lock:
+            items = sorted(self._tools.items())
+            for name, stats in items:
+                lines.append(f'mcp_tool_calls_total{{server="{server}",tool="{_escape_label(name)}"}} {stats.calls}')
+            lines += ["# HELP mcp_tool_errors_total Failed MCP tool calls.", "# TYPE mcp_tool_errors_total counter"]
+            for name, stats in items:
+                lines.append(f'mcp_tool_errors_total{{server="{server}",tool="{_escape_label(name)}"}} {stats.errors}')
+            lines += ["# HELP mcp_tool_latency_seconds MCP tool call latency.",
+                      "# TYPE mcp_tool_latency_seconds histogram"]
+            for name, stats in items:
+                labels = f'server="{server}",tool="{_escape_label(name)}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                    cumulative += count
+                    lines.append(f'mcp_tool_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'mcp_tool_latency_seconds_bucket{{{labels},le="+Inf"}} {stats.calls}')
+                lines.append(f'mcp_tool_latency_seconds_sum{{{labels}}} {stats.latency_sum:.6f}')
+                lines.append(f'mcp_tool_latency_seconds_count{{{labels}}} {stats.calls}')
+            for metric, attr, help_text in (
+                    ("mcp_tool_request_bytes_total", "request_bytes", "Total size of tool call arguments."),
+                    ("mcp_tool_response_bytes_total", "response_bytes", "Total size of tool call results.")):
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+                for name, stats in items:
+                    lines.append(f'{metric}{{server="{server}",tool="{_escape_label(name)}"}} {getattr(stats, attr)}')
+        return "\n".join(lines) + "\n"
+
+    def _start_exporter(self) -> None:
+        """ 首次记录时启动后台写文件线程，并注册退出时的最后一次写出。 """
+        with self._lock:
+            if self._exporter is not None:
+                return
+            self._exporter = threading.Thread(target=self._export_loop, name=f"metrics-{self.server_name}", daemon=True)
+        self._exporter.start()
+        atexit.register(self.close)
+
+    def _export_loop(self) -> None:
+        while not self._stop.wait(self.export_interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """ 有新的调用记录时写出 Prometheus 文件；写失败时保留标记，下次重试。 """
+        if not self.prometheus_path:
+            return
+        with self._export_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+            try:
+                self.write_prometheus(self.prometheus_path)
+            except OSError:
+                with self._lock:
+                    self._dirty = True
+
+    def close(self) -> None:
+        """ 停止后台线程并写出最后一个窗口的数据，进程退出时自动调用。 """
+        self._stop.set()
+        self.flush()
+
+    def write_prometheus(self, path: str) -> None:
+        """ 先写临时文件再替换，避免采集端读到写了一半的文件。 """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _to_ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _payload_size(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value.encode("utf-8") if isinstance(value, str) else value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return len(str(value).encode("utf-8"))
+
+
+def _result_size(result: Any) -> int:
+    content = getattr(result, "content", None)
+    if content is None:
+        return _payload_size(result)
+    return sum(_payload_size(getattr(item, "text", None) or getattr(item, "data", None)) for item in content)
+
+
+class ToolMetricsMiddleware(Middleware):
+    """ 记录每次工具调用的 FastMCP 中间件。 """
+    def __init__(self, metrics: ToolMetrics):
+        self.metrics = metrics
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        tool = getattr(context.message, "name", "unknown")
+        request_bytes = _payload_size(getattr(context.message, "arguments", None) or {})
+        start = time.perf_counter()
+        error = False
+        response_bytes = 0
+        try:
+            result = await call_next(context)
+            error = bool(getattr(result, "is_error", False) or getattr(result, "isError", False))
+            response_bytes = _result_size(result)
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.metrics.record(tool, time.perf_counter() - start, request_bytes, response_bytes, error)
+
+
+def install_metrics(
+        mcp: FastMCP,
+        server_name: str,
+        prometheus_path: Optional[str] = None,
+        export_interval: float = 5.0,
+) -> ToolMetrics:
+    """
+    为 FastMCP 服务器安装调用追踪中间件，并注册 metrics://tools 资源。
+    返回的 ToolMetrics 可以在启动前修改 prometheus_path。
+
+    :param prometheus_path: Prometheus 文件路径，默认读取环境变量 MCP_METRICS_FILE；{server} 会替换为服务器名
+    """
+    path = prometheus_path or os.getenv("MCP_METRICS_FILE")
+    if path:
+        path = path.format(server=server_name)
+    metrics = ToolMetrics(server_name, prometheus_path=path, export_interval=export_interval)
+    mcp.add_middleware(ToolMetricsMiddleware(metrics))
+
+    def get_tool_metrics() -> str:
+        """
+        获取工具调用指标：调用次数、错误率、延迟分位数和负载大小
+        """
+        return json.dumps(metrics.snapshot(), ensure_ascii=False, indent=2)
+
+    mcp.resource("metrics://tools", name="tool_metrics")(get_tool_metrics)
+    return metrics
@@ -0,0 +1,273 @@
+"""
+MCP 资源缓存
+
+配置、能力列表这类资源很少变化，但每次读取都要重新生成字符串，客户端每个会话也都会重新拉取一遍。
+资源变得昂贵之后（文件列表、数据库 schema 等）这部分开销会更明显。这里提供两端的缓存：
+
+服务端 ResourceCache：
+- 资源内容只在首次读取或 invalidate() 之后生成一次，之后直接返回缓存
+- 每个资源有一个内容哈希 (ETag)，通过 etags://resources 资源统一暴露
+- invalidate() 重新生成内容，ETag 发生变化时发送 notifications/resources/updated：
+  随触发变更的请求一起发回（传入 ctx 时），并发给读取过该资源、仍保持会话的客户端。
+  无会话 (sessionless) 的连接没有常驻的服务端推送通道，这类客户端依靠 ETag 清单发现变化
+
+客户端 ResourceClientCache：
+- 先读取很小的 etags://resources，ETag 与本地缓存一致的资源直接使用本地内容，不再读取
+- ETag 清单本身按 manifest_ttl 定期刷新；收到资源更新通知时立即丢弃对应条目
+- 可选把缓存持久化到文件，跨会话复用
+
+用法：
+    >>> resources = ResourceCache(mcp)
+    >>> @resources.resource("config://server")
+    ... def get_server_config() -> str: ...
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from fastmcp import Context, FastMCP
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from mcp import types as mcp_types
+
+ETAG_URI = "etags://resources"
+# 每个资源最多记录的订阅会话数；无会话连接的 session_id 每次请求都不同，需要限制数量
+MAX_SUBSCRIBERS = 256
+
+
+def compute_etag(content: Any) -> str:
+    """ 内容哈希：sha256 的前 16 位十六进制。 """
+    data = content if isinstance(content, bytes) else str(content).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class _Entry:
+    def __init__(self, render: Callable[[], Any], ttl: Optional[float]):
+        self.render = render
+        self.ttl = ttl
+        self.content: Any = None
+        self.etag: Optional[str] = None
+        self.rendered_at = 0.0
+        self.updated_at = 0.0
+        # 读取过该资源的会话 (session_id -> session)，内容变化时逐个通知
+        self.subscribers: "OrderedDict[str, Any]" = OrderedDict()
+
+    def fresh(self) -> bool:
+        if self.etag is None:
+            return False
+        return self.ttl is None or time.monotonic() - self.rendered_at < self.ttl
+
+
+class _SessionTracker(Middleware):
+    """ 记录读取缓存资源的会话，用于发送更新通知。 """
+    def __init__(self, cache: "ResourceCache"):
+        self.cache = cache
+
+    async def on_read_resource(self, context: MiddlewareContext, call_next):
+        entry = self.cache._entries.get(str(getattr(context.message, "uri", "")))
+        fastmcp_context = context.fastmcp_context
+        if entry is not None and fastmcp_context is not None:
+            try:
+                session_id, session = fastmcp_context.session_id, fastmcp_context.session
+            except RuntimeError:
+                session_id = session = None
+            if session is not None:
+                with self.cache._lock:
+                    entry.subscribers[session_id] = session
+                    entry.subscribers.move_to_end(session_id)
+                    while len(entry.subscribers) > MAX_SUBSCRIBERS:
+                        entry.subscribers.popitem(last=False)
+        return await call_next(context)
+
+
+class ResourceCache:
+    """
+    服务端资源缓存。
+
+    :param mcp: FastMCP 服务器实例，会注册 etags://resources 资源和会话追踪中间件
+    """
+    def __init__(self, mcp: FastMCP):
+        self.mcp = mcp
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        mcp.add_middleware(_SessionTracker(self))
+
+        def get_resource_etags() -> str:
+            """
+            获取所有缓存资源的 ETag，客户端据此判断本地缓存是否仍然有效
+            """
+            return json.dumps(self.manifest(), ensure_ascii=False, indent=2)
+
+        mcp.resource(ETAG_URI, name="resource_etags", mime_type="application/json")(get_resource_etags)
+
+    def resource(self, uri: str, ttl: Optional[float] = None, **kwargs) -> Callable[[Callable], Callable]:
+        """
+        注册一个缓存资源，用法与 @mcp.resource 相同。
+
+        :param ttl: 缓存有效期（秒），默认一直有效，直到调用 invalidate()
+        """
+        def decorator(func: Callable[[], Any]) -> Callable[[], Any]:
+            self._entries[uri] = _Entry(func, ttl)
+
+            def read() -> Any:
+                return self.get(uri)[0]
+
+            read.__name__ = func.__name__
+            read.__doc__ = func.__doc__
+            self.mcp.resource(uri, **kwargs)(read)
+            return func
+        return decorator
+
+    def _render(self, entry: _Entry) -> bool:
+        """ 重新生成内容，返回 ETag 是否变化。 """
+        content = entry.render()
+        etag = compute_etag(content)
+        with self._lock:
+            changed = etag != entry.etag
+            entry.content = content
+            entry.rendered_at = time.monotonic()
+            if changed:
+                entry.etag = etag
+                entry.updated_at = time.time()
+        return changed
+
+    def get(self, uri: str) -> tuple:
+        """ 返回 (内容, ETag)，缓存失效时重新生成。 """
+        entry = self._entries[uri]
+        if not entry.fresh():
+            self._render(entry)
+        return entry.content, entry.etag
+
+    def manifest(self) -> Dict[str, Dict[str, Any]]:
+        """ 所有缓存资源的 ETag 和最后变化时间。 """
+        manifest = {}
+        for uri in list(self._entries):
+            content, etag = self.get(uri)
+            entry = self._entries[uri]
+            manifest[uri] = {
+                "etag": etag,
+                "updated_at": round(entry.updated_at, 3),
+                "size": len(content) if isinstance(content, (str, bytes)) else None,
+            }
+        return manifest
+
+    async def invalidate(self, uri: Optional[str] = None, ctx: Optional[Context] = None) -> list:
+        """
+        重新生成指定资源（或全部资源），对内容发生变化的资源发送更新通知。
+
+        :param ctx: 触发变更的请求上下文（例如修改数据的工具），通知会随该请求的响应一起发回
+        :return: 内容发生变化的资源 URI 列表
+        """
+        uris = [uri] if uri is not None else list(self._entries)
+        changed = [u for u in uris if self._render(self._entries[u])]
+        for u in changed:
+            notification = mcp_types.ResourceUpdatedNotification(
+                params=mcp_types.ResourceUpdatedNotificationParams(uri=u))
+            if ctx is not None:
+                await ctx.send_notification(notification)
+            with self._lock:
+                subscribers = list(self._entries[u].subscribers.items())
+            for session_id, session in subscribers:
+                if ctx is not None and session_id == ctx.session_id:
+                    continue
+                try:
+                    await session.send_notification(notification)
+                except Exception:
+                    # 会话已断开，下次读取时会重新登记
+                    with self._lock:
+                        self._entries[u].subscribers.pop(session_id, None)
+        return changed
+
+
+async def _read_text(client: Any, uri: str) -> Any:
+    """ 兼容 fastmcp.Client（返回内容列表）和 hello_agents MCPClient（直接返回文本）。 """
+    result = await client.read_resource(uri)
+    contents = getattr(result, "contents", result)
+    if isinstance(contents, list):
+        if len(contents) != 1:
+            return [getattr(c, "text", c) for c in contents]
+        contents = contents[0]
+    return getattr(contents, "text", contents)
+
+
+class ResourceClientCache:
+    """
+    客户端资源缓存：ETag 未变化的资源不再重新读取。
+
+    :param cache_file: 持久化缓存的 JSON 文件路径，为空时只在内存中缓存
+    :param manifest_ttl: ETag 清单的有效期（秒），过期后下次读取时重新获取
+    """
+    def __init__(self, cache_file: Optional[str] = None, manifest_ttl: float = 30.0):
+        self.cache_file = cache_file
+        self.manifest_ttl = manifest_ttl
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._manifest: Optional[Dict[str, Dict[str, Any]]] = None
+        self._manifest_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+
+    async def refresh_manifest(self, client: Any) -> Dict[str, Dict[str, Any]]:
+        """ 重新读取服务器的 etags://resources。 """
+        self._manifest = json.loads(await _read_text(client, ETAG_URI))
+        self._manifest_at = time.monotonic()
+        return self._manifest
+
+    async def read(self, client: Any, uri: str) -> Any:
+        """ 读取资源：ETag 与本地缓存一致时直接返回本地内容。 """
+        if self._manifest is None or time.monotonic() - self._manifest_at >= self.manifest_ttl:
+            await self.refresh_manifest(client)
+        remote = self._manifest.get(uri)
+        local = self._entries.get(uri)
+        if remote is not None and local is not None and local["etag"] == remote["etag"]:
+            self.hits += 1
+            return local["content"]
+
+        self.misses += 1
+        content = await _read_text(client, uri)
+        if remote is not None:
+            # 只缓存服务端声明了 ETag 的资源；读取期间内容可能已变化，以实际内容的哈希为准
+            self._entries[uri] = {"etag": compute_etag(content), "content": content}
+            self._manifest[uri] = dict(remote, etag=self._entries[uri]["etag"])
+            self._save()
+        return content
+
+    def on_resource_updated(self, uri: str) -> None:
+        """ 收到更新通知：丢弃本地条目和过期的 ETag 清单。 """
+        self._entries.pop(uri, None)
+        self._manifest = None
+        self._save()
+
+    def message_handler(self) -> Callable:
+        """ 供 fastmcp.Client(message_handler=...) 使用，自动处理资源更新通知。 """
+        from fastmcp.client.messages import MessageHandler
+
+        cache = self
+
+        class _Handler(MessageHandler):
+            async def on_resource_updated(self, message) -> None:
+                cache.on_resource_updated(str(message.params.uri))
+
+            async def on_resource_list_changed(self, message) -> None:
+                cache._manifest = None
+
+        return _Handler()
+
+    def _save(self) -> None:
+        if not self.cache_file:
+            return
+        tmp_path = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass
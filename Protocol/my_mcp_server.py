@@ -5,21 +5,50 @@
 用于演示如何创建自己的MCP服务器。
 
 运行方式：
-    python my_mcp_server.py
+    python my_mcp_server.py                                   # stdio（默认）
+    python my_mcp_server.py --transport http --port 8000      # Streamable HTTP，可同时服务多个客户端
+    python my_mcp_server.py --transport sse --port 8000       # SSE
 
 或者作为MCP服务器被客户端调用：
     MCPClient(["python", "my_mcp_server.py"])
+    MCPClient("http://127.0.0.1:8000/mcp")
+
+每个工具都经过 limited() 包装：限制并发数和执行时间，同步工具在线程池中执行。
+目前的工具都很轻量，没有使用 limited(cpu_bound=True) 的进程池；新增 CPU 密集型工具时再启用。
+静态资源通过 ResourceCache 缓存并带 ETag，客户端可用 ResourceClientCache 跳过未变化资源的重复读取。
 """
+import argparse
+import asyncio
+import json
+import math
+import operator
+from typing import Callable, List, Optional
+
+from fastmcp import Context, FastMCP
 
-from fastmcp import FastMCP
+from mcp_limits import configure_limits, limited
+from mcp_metrics import install_metrics
+from mcp_resource_cache import ResourceCache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 # 创建MCP服务器实例
 mcp = FastMCP("MyCustomServer")
 
+# 工具调用追踪：metrics://tools 资源 + 可选的 Prometheus 文件
+metrics = install_metrics(mcp, "MyCustomServer")
+
+# 资源缓存：内容只生成一次，ETag 通过 etags://resources 暴露
+resources = ResourceCache(mcp)
+
 
 # ==================== 数学工具 ====================
 
 @mcp.tool()
+@limited()
 def add(a: float, b: float) -> float:
     """
     加法计算器
@@ -35,6 +64,7 @@ def add(a: float, b: float) -> float:
 
 
 @mcp.tool()
+@limited()
 def subtract(a: float, b: float) -> float:
     """
     减法计算器
@@ -50,6 +80,7 @@ def subtract(a: float, b: float) -> float:
 
 
 @mcp.tool()
+@limited()
 def multiply(a: float, b: float) -> float:
     """
     乘法计算器
@@ -65,6 +96,7 @@ def multiply(a: float, b: float) -> float:
 
 
 @mcp.tool()
+@limited()
 def divide(a: float, b: float) -> float:
     """
     除法计算器
@@ -87,6 +119,7 @@ def divide(a: float, b: float) -> float:
 # ==================== 文本处理工具 ====================
 
 @mcp.tool()
+@limited()
 def reverse_text(text: str) -> str:
     """
     反转文本
@@ -101,6 +134,7 @@ def reverse_text(text: str) -> str:
 
 
 @mcp.tool()
+@limited()
 def count_words(text: str) -> int:
     """
     统计文本中的单词数量
@@ -115,6 +149,7 @@ def count_words(text: str) -> int:
 
 
 @mcp.tool()
+@limited()
 def to_uppercase(text: str) -> str:
     """
     将文本转换为大写
@@ -129,6 +164,7 @@ def to_uppercase(text: str) -> str:
 
 
 @mcp.tool()
+@limited()
 def to_lowercase(text: str) -> str:
     """
     将文本转换为小写
@@ -142,9 +178,225 @@ def to_lowercase(text: str) -> str:
     return text.lower()
 
 
+# ==================== 批量工具 ====================
+# 一次调用处理整个列表，省去逐个元素的 JSON-RPC 往返；
+# 大输入按块处理，每块完成后通过 ctx.report_progress 上报进度（客户端提供了 progress handler 时可见）。
+
+BATCH_CHUNK_SIZE = 10_000
+MAX_BATCH_SIZE = 1_000_000
+
+
+def _check_batch_size(*sizes: int) -> int:
+    total = max(sizes)
+    if total > MAX_BATCH_SIZE:
+        raise ValueError(f"批量大小超过上限 {MAX_BATCH_SIZE}")
+    for size in sizes:
+        if size not in (1, total):
+            raise ValueError("两个列表的长度必须相同（或其中一个长度为1）")
+    return total
+
+
+async def _process_in_chunks(total: int, process: Callable[[int, int], list], ctx: Optional[Context]) -> list:
+    """ 按块在线程池中执行 process(start, end)，拼接结果并上报进度。 """
+    results: list = []
+    for start in range(0, total, BATCH_CHUNK_SIZE):
+        end = min(start + BATCH_CHUNK_SIZE, total)
+        results.extend(await asyncio.to_thread(process, start, end))
+        if ctx is not None:
+            await ctx.report_progress(end, total)
+    return results
+
+
+def _raise_if_not_finite(bad_indices: List[int]) -> None:
+    """ 结果超出 float 范围（inf / nan）无法作为 JSON 数字返回，列出出错的位置。 """
+    if bad_indices:
+        raise ValueError(f"计算结果溢出 (位置: {bad_indices[:10]}{'...' if len(bad_indices) > 10 else ''})")
+
+
+async def _binary_many(op: Callable, a: List[float], b: List[float], ctx: Optional[Context]) -> List[float]:
+    total = _check_batch_size(len(a), len(b))
+
+    def chunk(values: List[float], start: int, end: int) -> List[float]:
+        # 长度为1的列表广播到所有元素
+        return values * (end - start) if len(values) == 1 else values[start:end]
+
+    def process(start: int, end: int) -> List[float]:
+        xs, ys = chunk(a, start, end), chunk(b, start, end)
+        if np is not None:
+            with np.errstate(over='ignore', invalid='ignore'):
+                values = op(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+            _raise_if_not_finite((np.flatnonzero(~np.isfinite(values)) + start).tolist())
+            return values.tolist()
+        values = [float(op(x, y)) for x, y in zip(xs, ys)]
+        _raise_if_not_finite([start + i for i, value in enumerate(values) if not math.isfinite(value)])
+        return values
+
+    return await _process_in_chunks(total, process, ctx)
+
+
+# 文本批量操作以整块为单位执行：map 串联 C 实现的 str 方法，避免逐条调用 Python 函数。
+# numpy.char 需要先把列表转成定长 Unicode 数组再转回 Python 字符串，实测比 str 方法慢 2~5 倍，因此不使用。
+_reverse_item = operator.itemgetter(slice(None, None, -1))
+
+
+def _reverse_chunk(chunk: List[str]) -> List[str]:
+    return list(map(_reverse_item, chunk))
+
+
+def _count_words_chunk(chunk: List[str]) -> List[int]:
+    return list(map(len, map(str.split, chunk)))
+
+
+def _upper_chunk(chunk: List[str]) -> List[str]:
+    return list(map(str.upper, chunk))
+
+
+def _lower_chunk(chunk: List[str]) -> List[str]:
+    return list(map(str.lower, chunk))
+
+
+async def _text_many(texts: List[str], chunk_op: Callable[[List[str]], list], ctx: Optional[Context]) -> list:
+    total = _check_batch_size(len(texts))
+
+    def process(start: int, end: int) -> list:
+        return chunk_op(texts[start:end])
+
+    return await _process_in_chunks(total, process, ctx)
+
+
+@mcp.tool()
+@limited()
+async def add_many(a: List[float], b: List[float], ctx: Context = None) -> List[float]:
+    """
+    批量加法：逐元素计算 a[i] + b[i]
+
+    Args:
+        a: 第一组数字
+        b: 第二组数字（长度与 a 相同，或只有1个元素时对所有元素广播）
+
+    Returns:
+        逐元素之和
+    """
+    return await _binary_many(operator.add, a, b, ctx)
+
+
+@mcp.tool()
+@limited()
+async def subtract_many(a: List[float], b: List[float], ctx: Context = None) -> List[float]:
+    """
+    批量减法：逐元素计算 a[i] - b[i]
+
+    Args:
+        a: 被减数列表
+        b: 减数列表（长度与 a 相同，或只有1个元素时对所有元素广播）
+
+    Returns:
+        逐元素之差
+    """
+    return await _binary_many(operator.sub, a, b, ctx)
+
+
+@mcp.tool()
+@limited()
+async def multiply_many(a: List[float], b: List[float], ctx: Context = None) -> List[float]:
+    """
+    批量乘法：逐元素计算 a[i] * b[i]
+
+    Args:
+        a: 第一组数字
+        b: 第二组数字（长度与 a 相同，或只有1个元素时对所有元素广播）
+
+    Returns:
+        逐元素之积
+    """
+    return await _binary_many(operator.mul, a, b, ctx)
+
+
+@mcp.tool()
+@limited()
+async def divide_many(a: List[float], b: List[float], ctx: Context = None) -> List[float]:
+    """
+    批量除法：逐元素计算 a[i] / b[i]
+
+    Args:
+        a: 被除数列表
+        b: 除数列表（长度与 a 相同，或只有1个元素时对所有元素广播）
+
+    Returns:
+        逐元素之商
+
+    Raises:
+        ValueError: 任一除数为0或结果溢出时，列出出错的位置
+    """
+    zero_indices = [i for i, value in enumerate(b) if value == 0]
+    if zero_indices:
+        raise ValueError(f"除数不能为零 (位置: {zero_indices[:10]}{'...' if len(zero_indices) > 10 else ''})")
+    return await _binary_many(operator.truediv, a, b, ctx)
+
+
+@mcp.tool()
+@limited()
+async def reverse_text_batch(texts: List[str], ctx: Context = None) -> List[str]:
+    """
+    批量反转文本
+
+    Args:
+        texts: 要反转的文本列表
+
+    Returns:
+        反转后的文本列表
+    """
+    return await _text_many(texts, _reverse_chunk, ctx)
+
+
+@mcp.tool()
+@limited()
+async def count_words_batch(texts: List[str], ctx: Context = None) -> List[int]:
+    """
+    批量统计单词数量
+
+    Args:
+        texts: 要统计的文本列表
+
+    Returns:
+        每段文本的单词数量
+    """
+    return await _text_many(texts, _count_words_chunk, ctx)
+
+
+@mcp.tool()
+@limited()
+async def to_uppercase_batch(texts: List[str], ctx: Context = None) -> List[str]:
+    """
+    批量转换为大写
+
+    Args:
+        texts: 要转换的文本列表
+
+    Returns:
+        大写文本列表
+    """
+    return await _text_many(texts, _upper_chunk, ctx)
+
+
+@mcp.tool()
+@limited()
+async def to_lowercase_batch(texts: List[str], ctx: Context = None) -> List[str]:
+    """
+    批量转换为小写
+
+    Args:
+        texts: 要转换的文本列表
+
+    Returns:
+        小写文本列表
+    """
+    return await _text_many(texts, _lower_chunk, ctx)
+
+
 # ==================== 资源定义 ====================
 
-@mcp.resource("config://server")
+@resources.resource("config://server")
 def get_server_config() -> str:
     """
     获取服务器配置信息
@@ -152,17 +404,16 @@ def get_server_config() -> str:
     Returns:
         服务器配置的JSON字符串
     """
-    import json
     config = {
         "name": "MyCustomServer",
         "version": "1.0.0",
-        "tools_count": 8,
+        "tools_count": 16,
         "description": "自定义MCP服务器示例"
     }
     return json.dumps(config, ensure_ascii=False, indent=2)
 
 
-@mcp.resource("info://capabilities")
+@resources.resource("info://capabilities")
 def get_capabilities() -> str:
     """
     获取服务器能力列表
@@ -185,9 +436,15 @@ def get_capabilities() -> str:
 - to_uppercase: 转换为大写
 - to_lowercase: 转换为小写
 
+批量处理（一次调用处理整个列表）：
+- add_many / subtract_many / multiply_many / divide_many: 逐元素批量计算
+- reverse_text_batch / count_words_batch / to_uppercase_batch / to_lowercase_batch: 批量文本处理
+
 资源：
 - config://server: 服务器配置
 - info://capabilities: 能力列表（本资源）
+- metrics://tools: 工具调用指标（次数、错误率、延迟分位数、负载大小）
+- etags://resources: 缓存资源的 ETag，ETag 未变化时可直接使用本地缓存
 """
     return capabilities.strip()
 
@@ -207,7 +464,9 @@ def math_helper() -> str:
 - subtract(a, b): 计算两数之差
 - multiply(a, b): 计算两数之积
 - divide(a, b): 计算两数之商
+- add_many / subtract_many / multiply_many / divide_many(a, b): 对两组数字逐元素批量计算
 
+需要对多组数字做同样的运算时，请使用批量工具一次完成。
 请根据用户的问题选择合适的工具进行计算。"""
 
 
@@ -224,13 +483,36 @@ def text_processor() -> str:
 - count_words(text): 统计单词数
 - to_uppercase(text): 转换为大写
 - to_lowercase(text): 转换为小写
+- reverse_text_batch / count_words_batch / to_uppercase_batch / to_lowercase_batch(texts): 批量处理文本列表
 
+需要处理多段文本时，请使用批量工具一次完成。
 请根据用户的需求选择合适的工具处理文本。"""
 
 
 # ==================== 主程序 ====================
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="自定义MCP服务器示例")
+    parser.add_argument("--transport", choices=["stdio", "http", "sse"], default="stdio",
+                        help="传输方式：stdio 为单客户端子进程模式，http / sse 可同时服务多个客户端")
+    parser.add_argument("--host", default="127.0.0.1", help="HTTP / SSE 监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="HTTP / SSE 监听端口")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="每个工具的最大并发数")
+    parser.add_argument("--timeout", type=float, default=None, help="单次工具调用超时（秒）")
+    parser.add_argument("--cpu-workers", type=int, default=None, help="CPU 密集型工具的工作进程数")
+    parser.add_argument("--metrics-file", default=None, help="Prometheus 文本格式的指标文件路径")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    configure_limits(max_concurrency=args.max_concurrency, timeout=args.timeout, cpu_workers=args.cpu_workers)
+    if args.metrics_file:
+        metrics.prometheus_path = args.metrics_file
+
     # 运行MCP服务器
-    # FastMCP会自动处理stdio传输
-    mcp.run()
\ No newline at end of file
+    if args.transport == "stdio":
+        # FastMCP会自动处理stdio传输
+        mcp.run()
+    else:
+        mcp.run(transport=args.transport, host=args.host, port=args.port)
\ No newline at end of file
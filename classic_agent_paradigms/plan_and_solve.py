@@ -2,7 +2,7 @@ import json
 
 from llm import LLM
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import List, Dict, Optional, Any, Iterator
 import re
 
 load_dotenv()
@@ -29,10 +29,22 @@ PLANNER_SYSTEM_PROMPT = """
 """
 
 class Planner:
-    def __init__(self, llm: LLM):
+    def __init__(self, llm: LLM, plan_cache: Optional[Any] = None):
+        """
+        :param llm: LLM 客户端
+        :param plan_cache: 可选的计划缓存，需提供 get(question) / put(question, plan)，
+                           例如 myAgent/my_plan_cache.py 中的 PlanCache
+        """
         self.llm = llm
+        self.plan_cache = plan_cache
 
     def plan(self, question: str) -> List[str]:
+        if self.plan_cache is not None:
+            cached_plan = self.plan_cache.get(question)
+            if cached_plan:
+                print(f"♻️ [Planner] 命中计划缓存，共 {len(cached_plan)} 步。")
+                return cached_plan
+
         print(f"📋 [Planner] 正在分析问题并生成计划...")
 
         messages = [
@@ -41,7 +53,33 @@ class Planner:
         ]
 
         response_text = self.llm.think(messages=messages) or ""
+        plan_list = self._parse_plan(response_text)
+        if plan_list:
+            print(f"✅ [Planner] 计划生成成功，共 {len(plan_list)} 步。")
+            if self.plan_cache is not None:
+                self.plan_cache.put(question, plan_list)
+        return plan_list
+
+    def replan(self, question: str, history: str, failed_step: str, reason: str, remaining: List[str]) -> List[str]:
+        """ 某一步骤失败后，结合已完成的历史重新规划剩余步骤。 """
+        print(f"🔁 [Planner] 步骤失败，正在重新规划剩余步骤...")
 
+        messages = [
+            {'role': 'system', 'content': PLANNER_SYSTEM_PROMPT},
+            {'role': 'user', 'content': REPLANNER_USER_PROMPT.format(
+                question=question,
+                history=history or "（无）",
+                failed_step=failed_step,
+                reason=reason,
+                remaining=json.dumps(remaining, ensure_ascii=False)
+            )}
+        ]
+
+        response_text = self.llm.think(messages=messages) or ""
+        return self._parse_plan(response_text)
+
+    @staticmethod
+    def _parse_plan(response_text: str) -> List[str]:
         try:
             clean_text = re.sub(r'```json\s*|\s*```', '', response_text).strip()
             if clean_text.startswith("["):
@@ -51,13 +89,31 @@ class Planner:
                 plan_list = data.get("plan", [])
             if not isinstance(plan_list, list):
                 raise ValueError("计划不是一个列表")
-            print(f"✅ [Planner] 计划生成成功，共 {len(plan_list)} 步。")
             return plan_list
         except Exception as e:
             print(f"❌ [Planner] 计划解析失败: {e}")
             print(f"原始响应: {response_text}")
             return []
 
+REPLANNER_USER_PROMPT = """
+# 原始问题:
+{question}
+
+# 已完成的步骤与结果:
+{history}
+
+# 失败的步骤:
+{failed_step}
+
+# 失败原因:
+{reason}
+
+# 原计划中尚未执行的步骤:
+{remaining}
+
+请根据失败原因重新规划剩余步骤，不要重复已完成的步骤，输出格式与之前相同。
+"""
+
 EXECUTOR_SYSTEM_PROMPT = """ 
 你是一位执行专家。你的任务是根据给定的计划步骤，结合已有的历史信息，计算或推理出当前步骤的结果。
 
@@ -65,6 +121,7 @@ EXECUTOR_SYSTEM_PROMPT = """
 1. 专注于解决“当前步骤”。
 2. 必须参考“历史步骤与结果”中的数据，不要重复计算已经得出的结论。
 3. 输出必须简洁明了，直接给出当前步骤的结论或数值。 
+4. 如果当前步骤确实无法完成，请以 [STEP_FAILED] 开头并简要说明原因。
 """
 
 USER_SYSTEM_PROMPT = """
@@ -104,33 +161,75 @@ class Executor:
         print(f"💡 [Result]: {result}")
         return result
 
+STEP_FAILED_MARKER = "[STEP_FAILED]"
+
 class PlanAndSolveAgent:
-    def __init__(self, llm: LLM):
+    def __init__(self, llm: LLM, plan_cache: Optional[Any] = None, max_replans: int = 2):
         self.llm = llm
-        self.planner = Planner(llm)
+        self.max_replans = max_replans
+        self.planner = Planner(llm, plan_cache=plan_cache)
         self.executor = Executor(llm)
 
-    def run(self, question: str):
+    def run(self, question: str) -> Optional[str]:
         print(f"\n{'=' * 40}\n🤖 开始处理任务: {question}\n{'=' * 40}")
+        final_answer = None
+        for event in self.run_events(question):
+            if event["type"] == "error":
+                print(f"❌ {event['message']}")
+            elif event["type"] == "summary":
+                final_answer = event["answer"]
+                print(f"\n🎉 任务完成！最终答案: {final_answer}\n{'=' * 40}")
+        return final_answer
+
+    def run_events(self, question: str) -> Iterator[Dict[str, Any]]:
+        """
+        以事件流的形式执行任务，事件类型: plan / step / result / replan / error / summary。
+        只有全部步骤成功时才产生 summary；出现 error 事件即表示任务失败并结束。
+        调用方停止迭代即可取消后续步骤。
+        """
         plan = self.planner.plan(question)
         if not plan:
-            print("❌ 无法生成有效的计划，任务终止。")
+            yield {"type": "error", "message": "无法生成有效的计划，任务终止。"}
             return
+        yield {"type": "plan", "plan": list(plan)}
 
         history = ""
         final_answer = ""
+        pending = list(plan)
+        replans = 0
+        idx = 0
+
+        while pending:
+            step = pending.pop(0)
+            idx += 1
+            total_steps = idx + len(pending)
+            yield {"type": "step", "index": idx, "total": total_steps, "step": step}
 
-        for idx, step in enumerate(plan, start=1):
             step_result = self.executor.execute_step(
                 question=question,
                 step=step,
                 history=history,
                 step_idx=idx,
-                total_steps=len(plan)
+                total_steps=total_steps
             )
+            failed = STEP_FAILED_MARKER in step_result
+            yield {"type": "result", "index": idx, "step": step, "result": step_result, "failed": failed}
+
+            if failed:
+                if replans >= self.max_replans:
+                    # 任务没有完成，不产生 summary，避免把上一步的结果当作最终答案
+                    yield {"type": "error", "message": f"步骤 {idx} 执行失败且已达到最大重新规划次数，任务终止。"}
+                    return
+                replans += 1
+                reason = step_result.replace(STEP_FAILED_MARKER, "").strip()
+                # 重新规划没有给出新计划时重试失败的步骤，不能把它丢掉
+                pending = self.planner.replan(question, history, step, reason, pending) or [step] + pending
+                yield {"type": "replan", "index": idx, "reason": reason, "plan": list(pending)}
+                continue
+
             history += f"步骤 {idx}: {step}\n结果: {step_result}\n\n"
             final_answer = step_result
-        print(f"\n🎉 任务完成！最终答案: {final_answer}\n{'=' * 40}")
+        yield {"type": "summary", "answer": final_answer}
 
 
 if __name__ == "__main__":
@@ -3,10 +3,16 @@ import inspect
 import json
 from symbol import parameters
 from typing import Dict, Any, Callable, Optional, List
-from serpapi import SerpApiClient
 from dotenv import load_dotenv
+
+from myAgent.my_http_pool import serpapi_search
+from myAgent.my_local_search import is_local_backend, local_search
+from myAgent.my_search_result import format_results, from_items, from_serpapi
 load_dotenv()
 
+# 搜索结果交给 LLM 时的 token 预算
+SEARCH_TOKEN_BUDGET = 600
+
 
 def search(query: str, gl: str = "cn", hl: str = "zh-cn") -> str:
     """
@@ -17,6 +23,8 @@ def search(query: str, gl: str = "cn", hl: str = "zh-cn") -> str:
         gl: 地理位置 (默认 'cn' 中国)
         hl: 语言 (默认 'zh-cn' 简体中文)
     """
+    if is_local_backend():
+        return _search_local(query)
     try:
         api_key = os.getenv('SERPAPI_API_KEY')
         if not api_key:
@@ -31,43 +39,33 @@ def search(query: str, gl: str = "cn", hl: str = "zh-cn") -> str:
             "num": 5
         }
 
-        client = SerpApiClient(params)
-        results = client.get_dict()
+        # 通过共享连接池请求，复用 keep-alive 连接
+        results = serpapi_search(params)
 
         # error 处理
         if "error" in results:
             return f"Search Error: {results['error']}"
 
-        # 1. 优先返回 Answer Box (直接答案)
-        if "answer_box" in results:
-            box = results["answer_box"]
-            if "answer" in box: return f"直接答案: {box['answer']}"
-            if "snippet" in box: return f"精选摘要: {box['snippet']}"
-            if "snippet_highlighted_words" in box: return f"重点: {box['snippet_highlighted_words']}"
-
-        # 2. 其次返回 Knowledge Graph (知识图谱)
-        if "knowledge_graph" in results:
-            kg = results["knowledge_graph"]
-            title = kg.get("title", "")
-            desc = kg.get("description", "")
-            if desc: return f"知识卡片 ({title}): {desc}"
-
-        # 3. 最后返回 Organic Results (自然搜索结果)
-        if "organic_results" in results:
-            snippets = []
-            for i, res in enumerate(results["organic_results"][:3]):
-                title = res.get("title", "No Title")
-                snippet = res.get("snippet", "No Content")
-                link = res.get("link", "")
-                snippets.append(f"[{i + 1}] {title}\n    摘要: {snippet}\n    来源: {link}")
-
-            if snippets:
-                return "搜索结果:\n" + "\n\n".join(snippets)
+        # Answer Box / Knowledge Graph 作为直接答案，自然搜索结果去重打分后按预算打包
+        answer, organic = from_serpapi(results)
+        if not answer and not organic:
+            return f"未找到关于 '{query}' 的相关信息。"
+        return format_results(organic, query, token_budget=SEARCH_TOKEN_BUDGET, answer=answer,
+                              answer_label="", results_label="搜索结果:")
 
-        return f"未找到关于 '{query}' 的相关信息。"
+    except Exception as e:
+        return f"An error occurred during the search: {str(e)}"
 
+def _search_local(query: str) -> str:
+    """ SEARCH_BACKEND=local 时使用本地 BM25 索引检索，输出格式与自然搜索结果一致。 """
+    try:
+        results = local_search(query, top_k=3)["results"]
     except Exception as e:
         return f"An error occurred during the search: {str(e)}"
+    if not results:
+        return f"未找到关于 '{query}' 的相关信息。"
+    return format_results(from_items(results, "local"), query, token_budget=SEARCH_TOKEN_BUDGET,
+                          results_label="搜索结果:")
 
 from typing import Dict, Any
 
@@ -18,6 +18,8 @@ from langgraph.graph.message import add_messages
 from pydantic import BaseModel, Field
 from tavily import TavilyClient
 
+from myAgent.my_search_result import format_results, from_tavily
+
 load_dotenv()
 
 def get_current_date():
@@ -117,21 +119,14 @@ async def analyze_node(state: SearchState) -> dict:
         "analysis": analysis,
     }
 
-def _format_search_results(tavily_response:dict) -> str:
-    """格式化 Tavily 返回的 JSON"""
-    results = []
-    if tavily_response.get("answer"):
-        results.append(f"--- 智能摘要 ---\n{tavily_response['answer']}\n")
-
-    raw_results = tavily_response.get("results", [])
-    if raw_results:
-        results.append("--- 详细来源 ---")
-        for i, res in enumerate(raw_results[:5], 1):
-            title = res.get("title", "无标题")
-            content = res.get("content", "无内容")
-            url = res.get("url", "#")
-            results.append(f"[{i}] {title}\n摘要: {content}\n链接: {url}\n")
-    return "\n".join(results) if results else "无搜索结果。"
+def _format_search_results(tavily_response: dict, query: str = "", token_budget: int = 800) -> str:
+    """格式化 Tavily 返回的 JSON，去重打分后在 token 预算内保留与查询最相关的片段"""
+    answer, results = from_tavily(tavily_response)
+    context = format_results(
+        results, query, token_budget=token_budget, answer=answer,
+        answer_label="--- 智能摘要 ---\n", results_label="--- 详细来源 ---", link_label="链接"
+    )
+    return context or "无搜索结果。"
 
 async def search_node(state: SearchState) -> dict:
     """执行搜索"""
@@ -150,9 +145,9 @@ async def search_node(state: SearchState) -> dict:
             tavily_client.search,
             query=query,
             include_answer=True,
-            max_results=3
+            max_results=5
         )
-        context = _format_search_results(response)
+        context = _format_search_results(response, query)
     except Exception as e:
         print(f"执行搜索时出错: {e}")
         context = "搜索失败，无法获取结果。"
@@ -1,32 +1,69 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from difflib import SequenceMatcher
 from typing import Optional, List, Dict, Any
 from hello_agents import ToolRegistry
+from myAgent.my_http_pool import get_http_pool, serpapi_search
+from myAgent.my_local_search import is_local_backend, local_search
+from myAgent.my_search_result import SearchResult, format_results, from_items, normalize_title, normalize_url
+
+SEARCH_MODES = ("sequential", "race", "merge")
+
 
 class MyAdvancedSearchTool:
     """ 自定义搜索工具类, 多源数据搜索和智能结果整合 """
-    def __init__(self):
+    def __init__(
+            self,
+            mode: str = "sequential",
+            hedge_delay: float = 0.0,
+            timeout: float = 15.0,
+            max_results: int = 5,
+            snippet_budget: int = 600
+    ):
+        """
+        :param mode: 多数据源的调度方式
+            - sequential: 按顺序尝试，前一个失败才尝试下一个
+            - race: 并发查询，返回第一个有效结果
+            - merge: 并发查询所有数据源，去重并按多源排名融合后返回
+        :param hedge_delay: race 模式下依次启动数据源的间隔（秒），0 表示同时启动
+        :param timeout: race / merge 模式下等待结果的总超时（秒）
+        :param max_results: 每个数据源请求、以及最终返回的结果条数
+        :param snippet_budget: 返回给 LLM 的摘要 token 预算，按相关度挑选片段填满
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支持的搜索模式: {mode}，可选: {SEARCH_MODES}")
         self.name = "my_advanced_search"
         self.description = "一个高级搜索工具，支持多源数据搜索和智能结果整合。"
+        self.mode = mode
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.max_results = max_results
+        self.snippet_budget = snippet_budget
         self.search_sources = []
         self._setup_search_sources()
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.search_sources), 1) * 2)
 
     def _setup_search_sources(self):
         """ 初始化搜索数据源 """
+        if os.getenv("LOCAL_SEARCH_DIR"):
+            # 本地索引延迟低，放在最前面优先查询
+            self.search_sources.append("local")
+            print("✅ 本地 BM25 数据源已启用。")
+        if is_local_backend():
+            if not self.search_sources:
+                print("❌ SEARCH_BACKEND=local 但未设置 LOCAL_SEARCH_DIR。")
+            return
         if os.getenv("TAVILY_API_KEY"):
             try:
-                from tavily import TavilyClient
-                self.tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+                self.tavily_client = get_http_pool().tavily_client(os.getenv("TAVILY_API_KEY"))
                 self.search_sources.append("tavily")
                 print("✅ Tavily 数据源已启用。")
             except ImportError:
                 print("⚠️ Tavily 库未安装，跳过 Tavily 数据源。")
         if os.getenv("SERPAPI_API_KEY"):
-            try:
-                import serpapi
-                self.search_sources.append("serpapi")
-                print("✅ SerpAPI 数据源已启用。")
-            except ImportError:
-                print("⚠️ SerpAPI 库未安装，跳过 SerpAPI 数据源。")
+            self.search_sources.append("serpapi")
+            print("✅ SerpAPI 数据源已启用。")
         if self.search_sources:
             print(f"🔍 可用搜索数据源: {', '.join(self.search_sources)}")
         else:
@@ -39,58 +76,171 @@ class MyAdvancedSearchTool:
         if not self.search_sources:
             return "❌ 未配置任何搜索数据源，无法执行搜索。"
         print(f"🔎 执行搜索查询: {query}")
+        if self.mode == "race":
+            return self._search_race(query)
+        if self.mode == "merge":
+            return self._search_merge(query)
         for source in self.search_sources:
             try:
-                if source == "tavily":
-                    result = self._search_with_tavily(query)
-                    if result and "未找到" not in result:
-                        return f"📊 Tavily 搜索结果:\n{result}"
-                elif source == "serpapi":
-                    result = self._search_with_serpapi(query)
-                    if result and "未找到" not in result:
-                        return f"🌐 SerpAPI 搜索结果:\n{result}"
+                response = self._fetch(source, query)
+                if self._is_acceptable(response):
+                    return self._format_source_result(source, response, query)
             except Exception as e:
                 print(f"⚠️ 搜索数据源 {source} 出现错误: {e}")
                 continue
         return "❌ 所有搜索数据源均未返回有效结果。"
 
-    def _search_with_tavily(self, query: str) -> str:
+    def _search_race(self, query: str) -> str:
+        """ 并发查询所有数据源，返回第一个有效结果；hedge_delay > 0 时按间隔依次启动后续数据源。 """
+        deadline = time.monotonic() + self.timeout
+        pending: Dict[Future, str] = {}
+        to_launch = list(self.search_sources)
+
+        while to_launch or pending:
+            if to_launch:
+                source = to_launch.pop(0)
+                pending[self._executor.submit(self._fetch, source, query)] = source
+                if to_launch and self.hedge_delay <= 0:
+                    continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_time = min(self.hedge_delay, remaining) if to_launch else remaining
+            done, _ = wait(list(pending), timeout=wait_time, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    print(f"⚠️ 搜索数据源 {source} 出现错误: {e}")
+                    continue
+                if self._is_acceptable(response):
+                    for other in pending:
+                        other.cancel()
+                    return self._format_source_result(source, response, query)
+        return "❌ 所有搜索数据源均未返回有效结果。"
+
+    def _search_merge(self, query: str) -> str:
+        """ 并发查询所有数据源，按 URL / 标题相似度去重，并用倒数排名融合 (RRF) 重新排序。 """
+        futures = {self._executor.submit(self._fetch, source, query): source for source in self.search_sources}
+        done, not_done = wait(list(futures), timeout=self.timeout)
+        for future in not_done:
+            print(f"⚠️ 搜索数据源 {futures[future]} 超时，已忽略。")
+            future.cancel()
+
+        responses: Dict[str, Dict[str, Any]] = {}
+        for future in done:
+            source = futures[future]
+            try:
+                responses[source] = future.result()
+            except Exception as e:
+                print(f"⚠️ 搜索数据源 {source} 出现错误: {e}")
+
+        merged = self._merge_results(responses)
+        if not merged:
+            return "❌ 所有搜索数据源均未返回有效结果。"
+
+        answers = [r["answer"] for r in responses.values() if r.get("answer")]
+        results = [
+            SearchResult(title=item["title"], url=item.get("url", ""), snippet=item.get("snippet", ""),
+                         source=item["sources"][0], rank=rank, sources=item["sources"])
+            for rank, item in enumerate(merged, 1)
+        ]
+        body = format_results(results, query, token_budget=self.snippet_budget, max_results=self.max_results,
+                              answer=answers[0] if answers else None,
+                              results_label=f"🔗 综合搜索结果 (来源: {', '.join(sorted(responses))}):")
+        return f"🧩 多源整合结果:\n{body}"
+
+    @staticmethod
+    def _merge_results(responses: Dict[str, Dict[str, Any]], rrf_k: int = 60,
+                       title_threshold: float = 0.85) -> List[Dict[str, Any]]:
+        """ 跨数据源去重并打分：同一 URL 或高度相似的标题视为同一条结果，分数为各来源 1 / (k + rank) 之和。 """
+        merged: List[Dict[str, Any]] = []
+        for source, response in responses.items():
+            for rank, item in enumerate(response.get("results", []), 1):
+                url_key = normalize_url(item.get("url", ""))
+                title_key = normalize_title(item.get("title", ""))
+                match = None
+                for existing in merged:
+                    if url_key and url_key == existing["url_key"]:
+                        match = existing
+                        break
+                    if title_key and SequenceMatcher(None, title_key, existing["title_key"]).ratio() >= title_threshold:
+                        match = existing
+                        break
+                if match is None:
+                    match = {**item, "url_key": url_key, "title_key": title_key, "score": 0.0, "sources": []}
+                    merged.append(match)
+                elif len(item.get("snippet", "")) > len(match.get("snippet", "")):
+                    match["snippet"] = item["snippet"]
+                match["score"] += 1.0 / (rrf_k + rank)
+                if source not in match["sources"]:
+                    match["sources"].append(source)
+        merged.sort(key=lambda x: x["score"], reverse=True)
+        return merged
+
+    @staticmethod
+    def _is_acceptable(response: Optional[Dict[str, Any]]) -> bool:
+        return bool(response) and bool(response.get("answer") or response.get("results"))
+
+    def _fetch(self, source: str, query: str) -> Dict[str, Any]:
+        """ 查询单个数据源，返回统一结构 {"answer": str | None, "results": [{title, url, snippet}]} """
+        if source == "local":
+            return local_search(query, top_k=self.max_results)
+        if source == "tavily":
+            return self._fetch_tavily(query)
+        if source == "serpapi":
+            return self._fetch_serpapi(query)
+        raise ValueError(f"未知的搜索数据源: {source}")
+
+    def _format_source_result(self, source: str, response: Dict[str, Any], query: str) -> str:
+        header = {"local": "📚 本地知识库搜索结果", "tavily": "📊 Tavily 搜索结果", "serpapi": "🌐 SerpAPI 搜索结果"}
+        body = format_results(from_items(response.get("results", []), source), query,
+                              token_budget=self.snippet_budget, max_results=self.max_results,
+                              answer=response.get("answer"))
+        return f"{header.get(source, source)}:\n{body}"
+
+    def _fetch_tavily(self, query: str) -> Dict[str, Any]:
         """ 使用 Tavily 进行搜索 """
-        response = self.tavily_client.search(query=query, max_results=3)
-        if response.get("answer"):
-            result = f"💡 Tavily 回答: {response['answer']}\n\n"
-        else:
-            result = ""
-        result += "🔗 相关链接:\n"
-        for i, item in enumerate(response.get('results', [])[:3], 1):
-            result += f"[{i}] {item.get('title', '')}\n"
-            result += f"    {item.get('content', '')[:150]}...\n\n"
-        return result
+        response = self.tavily_client.search(query=query, max_results=self.max_results)
+        return {
+            "answer": response.get("answer"),
+            "results": [
+                {"title": item.get("title", ""), "url": item.get("url", ""), "snippet": item.get("content", "")}
+                for item in response.get("results", [])
+            ]
+        }
 
-    def _search_with_serpapi(self, query: str) -> str:
+    def _fetch_serpapi(self, query: str) -> Dict[str, Any]:
         """ 使用 SerpAPI 进行搜索 """
-        import serpapi
-
-        search = serpapi.GoogleSearch({
+        results = serpapi_search({
             "q": query,
             "api_key": os.getenv("SERPAPI_API_KEY"),
-            "num": 3
-        })
+            "num": self.max_results
+        }, timeout=self.timeout)
+        if "error" in results:
+            raise RuntimeError(results["error"])
+        return {
+            "answer": None,
+            "results": [
+                {"title": res.get("title", ""), "url": res.get("link", ""), "snippet": res.get("snippet", "")}
+                for res in results.get("organic_results", [])
+            ]
+        }
 
-        results = search.get_dict()
+    def _search_with_tavily(self, query: str) -> str:
+        """ 使用 Tavily 进行搜索 """
+        return self._format_source_result("tavily", self._fetch_tavily(query), query)
 
-        result = "🔗 Google搜索结果：\n"
-        if "organic_results" in results:
-            for i, res in enumerate(results["organic_results"][:3], 1):
-                result += f"[{i}] {res.get('title', '')}\n"
-                result += f"    {res.get('snippet', '')}\n\n"
-        return result
+    def _search_with_serpapi(self, query: str) -> str:
+        """ 使用 SerpAPI 进行搜索 """
+        return self._format_source_result("serpapi", self._fetch_serpapi(query), query)
 
 
-def create_advanced_search_registry():
+def create_advanced_search_registry(mode: str = "sequential"):
     """ 创建并返回高级搜索工具注册表 """
     registry = ToolRegistry()
-    advanced_search_tool = MyAdvancedSearchTool()
+    advanced_search_tool = MyAdvancedSearchTool(mode=mode)
     registry.register_function(
         name="advanced_search",
         description="一个高级搜索工具，支持多源数据搜索和智能结果整合。",
@@ -127,6 +277,15 @@ def test_api_configuration():
     result = search_tool.search("机器学习算法")
     print(f"搜索结果: {result}")
 
+def test_search_modes():
+    """测试 race / merge 多源调度模式"""
+    print("\n🏁 多源调度模式测试:")
+    for mode in ("race", "merge"):
+        search_tool = MyAdvancedSearchTool(mode=mode, hedge_delay=0.5)
+        start = time.perf_counter()
+        result = search_tool.search("Python编程语言的历史")
+        print(f"[{mode}] 耗时 {time.perf_counter() - start:.2f}s\n{result}")
+
 def test_with_agent():
     """测试与Agent的集成"""
     print("\n🤖 与Agent集成测试:")
@@ -143,4 +302,5 @@ if __name__ == "__main__":
 
     test_advanced_search()
     test_api_configuration()
+    test_search_modes()
     test_with_agent()
\ No newline at end of file
@@ -1,14 +1,112 @@
 import ast
+import contextlib
+import functools
+import json
 import operator
 import math
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Union
 from hello_agents import ToolRegistry
 
-def my_calculate(expression: str) -> str:
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Resource limits: a calculator call must not be able to pin a CPU or exhaust memory
+MAX_EXPRESSION_LENGTH = 1000
+MAX_NODES = 500
+MAX_RESULT_BITS = 10_000
+MAX_BATCH_ROWS = 1_000_000
+EVAL_TIME_BUDGET = 1.0
+
+_budget = threading.local()
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _safe_pow(base, exponent):
+    """ Power with the result size estimated before computing it. """
+    if _is_int(base) and _is_int(exponent) and exponent > 0 and abs(base) > 1:
+        # Report sizes, not the operands: the base itself may already have thousands of digits
+        bits = exponent * math.log2(abs(base)) if exponent.bit_length() <= 64 else math.inf
+        if bits > MAX_RESULT_BITS:
+            raise ValueError(f"Result too large: a {base.bit_length()}-bit base to the power of a "
+                             f"{exponent.bit_length()}-bit exponent exceeds {MAX_RESULT_BITS} bits.")
+    return operator.pow(base, exponent)
+
+
+def _safe_mul(left, right):
+    """ Multiplication with the result size estimated before computing it. """
+    if _is_int(left) and _is_int(right):
+        if left.bit_length() + right.bit_length() > MAX_RESULT_BITS:
+            raise ValueError(f"Result too large: product exceeds {MAX_RESULT_BITS} bits.")
+    return operator.mul(left, right)
+
+
+@contextlib.contextmanager
+def _time_budget(seconds: float):
+    """ Set a wall-clock deadline for evaluations on the current thread. """
+    previous = getattr(_budget, 'deadline', None)
+    _budget.deadline = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _budget.deadline = previous
+
+
+def _check_budget():
+    deadline = getattr(_budget, 'deadline', None)
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError(f"Evaluation exceeded the time budget of {EVAL_TIME_BUDGET}s.")
+
+
+_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _safe_mul,
+    ast.Div: operator.truediv,
+    ast.Pow: _safe_pow,
+    ast.BitXor: operator.xor,
+}
+
+_UNARY_OPERATORS = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+_FUNCTIONS = {
+    'sqrt': math.sqrt,
+    'log': math.log,
+    'sin': math.sin,
+    'cos': math.cos,
+    'tan': math.tan,
+}
+
+if np is not None:
+    _NUMPY_FUNCTIONS = {
+        'sqrt': np.sqrt,
+        'log': np.log,
+        'sin': np.sin,
+        'cos': np.cos,
+        'tan': np.tan,
+    }
+else:
+    _NUMPY_FUNCTIONS = None
+
+Program = Callable[[Dict[str, Any]], Any]
+
+
+def my_calculate(expression: str, variables: Optional[Dict[str, Any]] = None) -> str:
     """
     Evaluates a mathematical expression safely.
 
     Args:
         expression (str): The mathematical expression to evaluate.
+        variables (dict, optional): Values for free variables in the expression, e.g. {"x": 2}.
 
     Returns:
         str: The result of the evaluation or an error message.
@@ -16,55 +114,201 @@ def my_calculate(expression: str) -> str:
     if not expression.strip():
         return "Error: The expression is empty."
 
-    operators = {
-        ast.Add: operator.add,
-        ast.Sub: operator.sub,
-        ast.Mult: operator.mul,
-        ast.Div: operator.truediv,
-        ast.Pow: operator.pow,
-        ast.BitXor: operator.xor,
-        ast.USub: operator.neg,
-    }
+    try:
+        program = compile_expression(expression)
+        with _time_budget(EVAL_TIME_BUDGET):
+            result = program(variables or {})
+        return str(result)
+    except Exception as e:
+        return f"Error: {str(e)}"
 
-    functions = {
-        'sqrt': math.sqrt,
-        'log': math.log,
-        'sin': math.sin,
-        'cos': math.cos,
-        'tan': math.tan,
-    }
 
+def my_calculate_batch(
+        expression: str,
+        variables: Optional[Union[Dict[str, List[float]], str]] = None,
+        output: str = "summary"
+) -> str:
+    """
+    Evaluates one expression over columns of input values in a single call.
+
+    The expression is compiled once and evaluated with NumPy over whole arrays
+    (falls back to a per-row loop when NumPy is not installed). When called
+    through a ToolRegistry, the whole request can be passed as a JSON string:
+    {"expression": "a * x + b", "variables": {"x": [1, 2, 3], "a": 2, "b": 1}, "output": "full"}
+
+    Args:
+        expression (str): The expression to evaluate, or the JSON request described above.
+        variables (dict | str, optional): Mapping of variable name to a list of values
+            (or a scalar that is broadcast to every row). May be a JSON string.
+        output (str): "summary" for count/sum/mean/std/min/max, "full" for every value.
+
+    Returns:
+        str: A JSON string with the summary or the full result vector, or an error message.
+    """
     try:
-        node = ast.parse(expression, mode='eval')
-        result = _eval_node(node.body, operators, functions)
-        return str(result)
+        if variables is None and expression.lstrip().startswith('{'):
+            request = json.loads(expression)
+            expression = request.get("expression", "")
+            variables = request.get("variables", {})
+            output = request.get("output", output)
+        if isinstance(variables, str):
+            variables = json.loads(variables)
+        variables = variables or {}
+        if not expression.strip():
+            return "Error: The expression is empty."
+
+        columns = {name: value for name, value in variables.items() if isinstance(value, (list, tuple))}
+        lengths = {len(value) for value in columns.values()}
+        if len(lengths) > 1:
+            return f"Error: Variable lengths differ: { {name: len(value) for name, value in columns.items()} }"
+        size = lengths.pop() if lengths else 1
+        if size > MAX_BATCH_ROWS:
+            return f"Error: Too many rows: {size} exceeds {MAX_BATCH_ROWS}."
+
+        if np is not None:
+            program = compile_expression(expression, backend="numpy")
+            arrays = {name: np.asarray(value, dtype=float) for name, value in variables.items()}
+            with np.errstate(all='ignore'), _time_budget(EVAL_TIME_BUDGET):
+                values = np.broadcast_to(np.asarray(program(arrays), dtype=float), (size,))
+        else:
+            program = compile_expression(expression)
+            values = []
+            with _time_budget(EVAL_TIME_BUDGET):
+                for row in range(size):
+                    row_variables = {name: (value[row] if name in columns else value) for name, value in variables.items()}
+                    try:
+                        values.append(program(row_variables))
+                    except (ArithmeticError, ValueError):
+                        values.append(float('nan'))
+        return json.dumps(_summarize_batch(values, output), ensure_ascii=False)
     except Exception as e:
         return f"Error: {str(e)}"
 
-def _eval_node(node, operators, functions):
-    """ Recursively evaluate an AST node. """
+
+def _summarize_batch(values, output: str) -> Dict[str, Any]:
+    """ Build the batch response: full vector (non-finite values as null) or summary statistics over finite values. """
+    if np is not None:
+        values = np.asarray(values, dtype=float)
+        finite_mask = np.isfinite(values)
+        if output == "full":
+            full = [v if finite else None for v, finite in zip(values.tolist(), finite_mask.tolist())]
+            return {"count": int(values.size), "values": full}
+        finite = values[finite_mask]
+        summary = {"count": int(values.size), "non_finite": int(values.size - finite.size)}
+        if finite.size:
+            summary.update({
+                "sum": float(finite.sum()),
+                "mean": float(finite.mean()),
+                "std": float(finite.std()),
+                "min": float(finite.min()),
+                "max": float(finite.max()),
+            })
+        return summary
+
+    values = [float(v) for v in values]
+    if output == "full":
+        return {"count": len(values), "values": [v if math.isfinite(v) else None for v in values]}
+    finite = [v for v in values if math.isfinite(v)]
+    summary: Dict[str, Any] = {"count": len(values), "non_finite": len(values) - len(finite)}
+    if finite:
+        mean = math.fsum(finite) / len(finite)
+        summary.update({
+            "sum": math.fsum(finite),
+            "mean": mean,
+            "std": math.sqrt(math.fsum((v - mean) ** 2 for v in finite) / len(finite)),
+            "min": min(finite),
+            "max": max(finite),
+        })
+    return summary
+
+
+@functools.lru_cache(maxsize=256)
+def compile_expression(expression: str, backend: str = "math") -> Program:
+    """
+    Compiles an expression into a validated closure, cached by expression text.
+
+    Parsing and validation happen once per distinct expression; evaluating the
+    returned program only walks pre-built closures. Free names that are not
+    known functions become variables looked up at evaluation time.
+
+    Args:
+        expression (str): The mathematical expression to compile.
+        backend (str): "math" for scalar evaluation, "numpy" for element-wise evaluation over arrays.
+
+    Returns:
+        Callable[[dict], Any]: A program that takes a dict of variable values.
+
+    Raises:
+        ValueError: If the expression contains unsupported syntax or exceeds the size limits.
+        SyntaxError: If the expression cannot be parsed.
+    """
+    if len(expression) > MAX_EXPRESSION_LENGTH:
+        raise ValueError(f"Expression too long: {len(expression)} characters exceeds {MAX_EXPRESSION_LENGTH}.")
+    if backend == "numpy":
+        if _NUMPY_FUNCTIONS is None:
+            raise ValueError("NumPy is not installed.")
+        functions = _NUMPY_FUNCTIONS
+    else:
+        functions = _FUNCTIONS
+    node = ast.parse(expression.strip(), mode='eval')
+    node_count = sum(1 for _ in ast.walk(node))
+    if node_count > MAX_NODES:
+        raise ValueError(f"Expression too complex: {node_count} nodes exceeds {MAX_NODES}.")
+    return _compile_node(node.body, functions)
+
+
+def _compile_node(node, functions: Dict[str, Callable]) -> Program:
+    """ Recursively compile an AST node into a closure. """
     if isinstance(node, ast.Constant):
-        return node.value
+        value = node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Unsupported constant: {value!r}")
+        return lambda variables: value
     elif isinstance(node, ast.BinOp):
-        left = _eval_node(node.left, operators, functions)
-        right = _eval_node(node.right, operators, functions)
-        op = operators.get(type(node.op), None)
-        return op(left, right)
+        op = _OPERATORS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        left = _compile_node(node.left, functions)
+        right = _compile_node(node.right, functions)
+
+        def binary(variables):
+            _check_budget()
+            return op(left(variables), right(variables))
+        return binary
+    elif isinstance(node, ast.UnaryOp):
+        op = _UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        operand = _compile_node(node.operand, functions)
+        return lambda variables: op(operand(variables))
     elif isinstance(node, ast.Call):
-        func = node.func.id
-        if func in functions:
-            args = [_eval_node(arg, operators, functions) for arg in node.args]
-            return functions[func](*args)
+        if not isinstance(node.func, ast.Name) or node.func.id not in functions or node.keywords:
+            raise ValueError(f"Unsupported function call: {ast.unparse(node.func)}")
+        func = functions[node.func.id]
+        args = [_compile_node(arg, functions) for arg in node.args]
+
+        def call(variables):
+            _check_budget()
+            return func(*[arg(variables) for arg in args])
+        return call
     elif isinstance(node, ast.Name):
-        if node.id in functions:
-            return functions[node.id]
+        name = node.id
+        if name in functions:
+            raise ValueError(f"Function used without a call: {name}")
+
+        def lookup(variables):
+            if name not in variables:
+                raise NameError(f"Unknown variable: {name}")
+            return variables[name]
+        return lookup
+    raise ValueError(f"Unsupported expression: {type(node).__name__}")
 
 def create_calculator_registry():
     """
-    Creates a ToolRegistry with the my_calculate tool.
+    Creates a ToolRegistry with the my_calculate and my_calculate_batch tools.
 
     Returns:
-        ToolRegistry: The registry containing the my_calculate tool.
+        ToolRegistry: The registry containing the calculator tools.
     """
     registry = ToolRegistry()
     registry.register_function(
@@ -72,6 +316,12 @@ def create_calculator_registry():
         description="简单的计算器，支持基本的数学运算和函数调用。",
         func=my_calculate
     )
+    registry.register_function(
+        name="my_calculator_batch",
+        description='批量计算器，对一组输入一次性求值同一个公式。输入 JSON: '
+                    '{"expression": "a * x + b", "variables": {"x": [1, 2, 3], "a": 2, "b": 1}, "output": "summary 或 full"}',
+        func=my_calculate_batch
+    )
     return registry
 
 
@@ -96,7 +346,10 @@ def test_calculator_tool():
         "2 ** 3",         # 幂运算
         "invalid_expr",   # 无效表达式
         "",                # 空表达式
-        "10 / 0"          # 除以零
+        "10 / 0",         # 除以零
+        "10 ** 10 ** 10",  # 超出资源限制
+        "(2 ** 5000) ** 3",  # 超出资源限制，错误信息不包含巨大的底数
+        "sqrt",           # 函数名未调用
     ]
 
     for i, expression in enumerate(test_cases, 1):
@@ -104,6 +357,19 @@ def test_calculator_tool():
         result = registry.execute_tool("my_calculator", expression)
         print(f"结果: {result}\n")
 
+    print("🧪 测试表达式编译缓存\n")
+    for x in range(1, 4):
+        print(f"x = {x}: x ** 2 + 2 * x + 1 = {my_calculate('x ** 2 + 2 * x + 1', {'x': x})}")
+    print(f"缓存统计: {compile_expression.cache_info()}\n")
+
+    print("🧪 测试批量计算\n")
+    batch_request = json.dumps({
+        "expression": "price * quantity * (1 - discount)",
+        "variables": {"price": [9.9, 19.9, 29.9], "quantity": [3, 1, 2], "discount": 0.1},
+        "output": "full"
+    })
+    print(f"结果: {registry.execute_tool('my_calculator_batch', batch_request)}\n")
+
 def test_with_simple_agent():
     """测试与SimpleAgent的集成"""
     from my_llm import MyLLM
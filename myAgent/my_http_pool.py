@@ -0,0 +1,178 @@
+"""
+共享 HTTP 连接池
+
+搜索 / 天气等工具统一通过这里发起 HTTP 请求，复用 keep-alive 连接，避免每次调用都重新做 TCP + TLS 握手。
+- HttpPool: 基于 requests.Session + HTTPAdapter 的连接池，可配置池大小与超时
+- tavily_client(): 按 API Key 缓存 TavilyClient，并让它使用带连接池的会话和连接池的读取超时
+- serpapi_search(): 直接通过连接池请求 SerpAPI，替代每次新建 SerpApiClient
+
+池大小与超时既可以在代码中通过 configure_http_pool() 设置，也可以通过环境变量设置：
+HTTP_POOL_SIZE、HTTP_CONNECT_TIMEOUT、HTTP_READ_TIMEOUT。
+
+与 context_engineering 中的 myAgent.my_llm 一样，共享模块统一按 myAgent.<模块名> 导入，运行时仓库根目录需在 PYTHONPATH 中。
+"""
+import functools
+import inspect
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SERPAPI_ENDPOINT = "https://serpapi.com/search"
+
+Timeout = Union[float, Tuple[float, float]]
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class HttpPool:
+    """
+    线程安全的共享 HTTP 连接池。
+
+    :param pool_size: 每个主机保留的最大连接数
+    :param timeout: 默认超时，(连接超时, 读取超时) 或单个秒数；单次请求可以用 timeout 参数覆盖
+    :param max_retries: 连接级别的自动重试次数（只针对建立连接失败，不重试已发送的请求）
+    """
+    def __init__(
+            self,
+            pool_size: Optional[int] = None,
+            timeout: Optional[Timeout] = None,
+            max_retries: int = 0,
+    ):
+        self.pool_size = pool_size or int(_env_float("HTTP_POOL_SIZE", 10))
+        self.timeout = timeout or (
+            _env_float("HTTP_CONNECT_TIMEOUT", 3.05),
+            _env_float("HTTP_READ_TIMEOUT", 10.0),
+        )
+        self.max_retries = max_retries
+        self._session: Optional[requests.Session] = None
+        self._tavily_clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=self.max_retries,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """ 共享会话，首次使用时创建。 """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._new_session()
+        return self._session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def tavily_client(self, api_key: Optional[str] = None):
+        """
+        获取缓存的 TavilyClient。
+        每个 API Key 使用独立的会话（TavilyClient 会把鉴权头写进会话），但同样走连接池。
+        search / extract 等方法默认使用连接池的读取超时（tavily-python 自身默认 60 秒），单次调用仍可传 timeout 覆盖。
+        """
+        api_key = api_key or os.getenv("TAVILY_API_KEY")
+        if not api_key:
+            raise ValueError("TAVILY_API_KEY environment variable not set.")
+        client = self._tavily_clients.get(api_key)
+        if client is not None:
+            return client
+
+        from tavily import TavilyClient
+        with self._lock:
+            client = self._tavily_clients.get(api_key)
+            if client is None:
+                try:
+                    client = TavilyClient(api_key=api_key, session=self._new_session())
+                except TypeError:
+                    # 旧版本 tavily-python 不支持传入 session
+                    client = TavilyClient(api_key=api_key)
+                self._apply_default_timeout(client)
+                self._tavily_clients[api_key] = client
+        return client
+
+    def _apply_default_timeout(self, client: Any) -> None:
+        read_timeout = self.timeout[1] if isinstance(self.timeout, tuple) else self.timeout
+        for name in ("search", "extract", "crawl", "map", "qna_search", "get_search_context"):
+            method = getattr(client, name, None)
+            if method is not None and "timeout" in inspect.signature(method).parameters:
+                setattr(client, name, functools.partial(method, timeout=read_timeout))
+
+    def close(self) -> None:
+        """ 关闭所有连接，之后再次使用会自动重建。 """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            for client in self._tavily_clients.values():
+                session = getattr(client, "session", None)
+                if session is not None:
+                    session.close()
+            self._tavily_clients.clear()
+
+
+_default_pool: Optional[HttpPool] = None
+_default_lock = threading.Lock()
+
+
+def get_http_pool() -> HttpPool:
+    """ 获取进程内共享的默认连接池。 """
+    global _default_pool
+    if _default_pool is None:
+        with _default_lock:
+            if _default_pool is None:
+                _default_pool = HttpPool()
+    return _default_pool
+
+
+def configure_http_pool(
+        pool_size: Optional[int] = None,
+        timeout: Optional[Timeout] = None,
+        max_retries: int = 0,
+) -> HttpPool:
+    """ 使用新的配置替换默认连接池，旧连接池会被关闭。 """
+    global _default_pool
+    with _default_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = HttpPool(pool_size=pool_size, timeout=timeout, max_retries=max_retries)
+    return _default_pool
+
+
+def serpapi_search(params: Dict[str, Any], timeout: Optional[Timeout] = None) -> Dict[str, Any]:
+    """
+    通过共享连接池调用 SerpAPI，返回值与 SerpApiClient.get_dict() 一致。
+    未指定 engine 时默认使用 google；未指定 api_key 时读取 SERPAPI_API_KEY。
+    """
+    query = {"engine": "google", "output": "json", "source": "python"}
+    query.update(params)
+    if not query.get("api_key"):
+        query["api_key"] = os.getenv("SERPAPI_API_KEY")
+    pool = get_http_pool()
+    response = pool.get(SERPAPI_ENDPOINT, params=query, timeout=timeout or pool.timeout)
+    try:
+        return response.json()
+    except ValueError:
+        response.raise_for_status()
+        raise
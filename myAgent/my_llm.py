@@ -37,19 +37,24 @@ class MyLLM(HelloAgentsLLM):
         except Exception as e:
             raise ValueError(f"Failed to initialize OpenAI client: {e}")
 
+    def _build_params(self, messages: List[Dict[str, str]], **kwargs) -> Dict:
+        """ 构造请求参数，调用时传入的 kwargs (如 max_tokens, response_format) 覆盖实例默认值 """
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "frequency_penalty": self.frequency_penalty,
+            "presence_penalty": self.presence_penalty,
+            "top_p": self.top_p,
+            "extra_body": {"repetition_penalty": 1.1},
+        }
+        params.update(kwargs)
+        return params
+
     def invoke(self, messages: List[Dict[str, str]], **kwargs) -> str:
         try:
-            response = self._client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                frequency_penalty=self.frequency_penalty,
-                presence_penalty=self.presence_penalty,
-                top_p=self.top_p,
-                extra_body={"repetition_penalty": 1.1},
-                **kwargs
-            )
+            response = self._client.chat.completions.create(**self._build_params(messages, **kwargs))
             return response.choices[0].message.content
         except Exception as e:
             raise RuntimeError(f"LLM invocation failed: {e}")
@@ -57,18 +62,7 @@ class MyLLM(HelloAgentsLLM):
     def stream_invoke(self, messages: list[dict[str, str]], **kwargs) -> Iterator[str]:
         """流式调用"""
         try:
-            stream = self._client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                top_p=self.top_p,
-                stream=True,
-                frequency_penalty=self.frequency_penalty,
-                presence_penalty=self.presence_penalty,
-                extra_body={"repetition_penalty": 1.1},
-                **kwargs
-            )
+            stream = self._client.chat.completions.create(**self._build_params(messages, stream=True, **kwargs))
             for chunk in stream:
                 content = chunk.choices[0].delta.content
                 if content:
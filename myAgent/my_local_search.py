@@ -0,0 +1,390 @@
+"""
+本地离线搜索后端
+
+基于 BM25 倒排索引，从一个文档目录中检索结果，可作为内部知识库数据源，也可作为压测 / 离线测试时结果确定的搜索后端。
+- 增量索引：update() 只处理新增、修改和删除的文件，新文档写入新的段 (segment)，旧版本以墓碑方式失效
+- 内存映射：倒排表以 (doc_id, tf) 的 uint32 对顺序存放在段文件中，查询时通过 mmap 按需读取
+- 段数过多或失效文档比例过高时自动合并为单个段
+- get_local_index() 返回的共享索引每隔 REFRESH_INTERVAL 秒重新检查一次语料目录，新增、修改和删除的文件随后即可检索到
+
+启用方式：
+- 环境变量 LOCAL_SEARCH_DIR 指定语料目录（索引默认存放在 <语料目录>/.bm25_index）
+- SEARCH_BACKEND=local 时搜索工具只使用本地后端
+"""
+import json
+import math
+import mmap
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_EXTENSIONS = (".txt", ".md", ".markdown", ".rst")
+INDEX_DIR_NAME = ".bm25_index"
+META_FILE = "meta.json"
+INDEX_VERSION = 1
+# 共享索引两次检查语料目录变化的最小间隔（秒）
+REFRESH_INTERVAL = 2.0
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[一-鿿]+')
+_PARAGRAPH_PATTERN = re.compile(r'\n\s*\n|(?<=[。！？!?])')
+
+
+def tokenize(text: str) -> List[str]:
+    """ 英文 / 数字按单词切分，中文按字符二元组 (bigram) 切分。 """
+    tokens: List[str] = []
+    for match in _TOKEN_PATTERN.finditer(unicodedata.normalize('NFKC', text).lower()):
+        word = match.group(0)
+        if word[0].isascii() or len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def _read_text(path: str) -> str:
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+
+def _extract_title(text: str, path: str) -> str:
+    for line in text.splitlines():
+        line = line.strip().lstrip('#').strip()
+        if line:
+            return line[:100]
+    return os.path.basename(path)
+
+
+class _Segment:
+    """ 一个只读的索引段：词典常驻内存，倒排表通过 mmap 访问。 """
+    def __init__(self, index_dir: str, name: str):
+        self.name = name
+        with open(os.path.join(index_dir, f"{name}.json"), 'r', encoding='utf-8') as f:
+            self.terms: Dict[str, List[int]] = json.load(f)
+        self._file = open(os.path.join(index_dir, f"{name}.post"), 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._postings = memoryview(self._mmap).cast('I')
+
+    def postings(self, term: str) -> Optional[memoryview]:
+        """ 返回 term 的倒排表视图，格式为 [doc_id, tf, doc_id, tf, ...]。 """
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        offset, df = entry
+        return self._postings[offset * 2:(offset + df) * 2]
+
+    def close(self) -> None:
+        self._postings.release()
+        self._mmap.close()
+        self._file.close()
+
+
+class LocalSearchIndex:
+    """
+    本地 BM25 索引。
+
+    :param corpus_dir: 语料目录，递归索引其中的文本文件
+    :param index_dir: 索引存放目录，默认 <corpus_dir>/.bm25_index
+    :param k1: BM25 词频饱和参数
+    :param b: BM25 文档长度归一化参数
+    :param extensions: 参与索引的文件扩展名
+    :param max_segments: 段数超过该值时合并
+    :param max_dead_ratio: 失效倒排占比超过该值时合并
+    """
+    def __init__(
+            self,
+            corpus_dir: str,
+            index_dir: Optional[str] = None,
+            k1: float = 1.5,
+            b: float = 0.75,
+            extensions: Tuple[str, ...] = DEFAULT_EXTENSIONS,
+            max_segments: int = 8,
+            max_dead_ratio: float = 0.3,
+    ):
+        self.corpus_dir = os.path.abspath(corpus_dir)
+        self.index_dir = os.path.abspath(index_dir or os.path.join(self.corpus_dir, INDEX_DIR_NAME))
+        self.k1 = k1
+        self.b = b
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.max_segments = max_segments
+        self.max_dead_ratio = max_dead_ratio
+        self._lock = threading.RLock()
+        self._segments: List[_Segment] = []
+        self.checked_at: Optional[float] = None
+        self._meta = self._load_meta()
+        self._open_segments()
+
+    # ---------- 元数据 ----------
+
+    def _empty_meta(self) -> Dict[str, Any]:
+        return {"version": INDEX_VERSION, "next_doc_id": 0, "next_segment": 0,
+                "docs": {}, "segments": [], "total_postings": 0, "dead_postings": 0}
+
+    def _load_meta(self) -> Dict[str, Any]:
+        path = os.path.join(self.index_dir, META_FILE)
+        if not os.path.exists(path):
+            return self._empty_meta()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return self._empty_meta()
+        if meta.get("version") != INDEX_VERSION:
+            return self._empty_meta()
+        return meta
+
+    def _save_meta(self) -> None:
+        # 先写临时文件再替换，保证元数据要么是旧版本要么是新版本
+        path = os.path.join(self.index_dir, META_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._meta, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _open_segments(self) -> None:
+        for segment in self._segments:
+            segment.close()
+        self._segments = [_Segment(self.index_dir, name) for name in self._meta["segments"]]
+        # 文档 ID -> 文档信息，只包含有效文档
+        self._docs_by_id: Dict[int, Dict[str, Any]] = {
+            info["id"]: dict(info, path=path) for path, info in self._meta["docs"].items()
+        }
+        lengths = [info["length"] for info in self._docs_by_id.values()]
+        self._avgdl = sum(lengths) / len(lengths) if lengths else 0.0
+
+    # ---------- 建索引 ----------
+
+    def _scan_corpus(self) -> Dict[str, Tuple[float, int]]:
+        files: Dict[str, Tuple[float, int]] = {}
+        for root, dirs, names in os.walk(self.corpus_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            if os.path.abspath(root).startswith(self.index_dir):
+                continue
+            for name in sorted(names):
+                if not name.lower().endswith(self.extensions):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files[os.path.relpath(path, self.corpus_dir)] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def update(self) -> Dict[str, int]:
+        """ 增量更新索引，返回新增 / 更新 / 删除的文档数。 """
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self.checked_at = time.monotonic()
+            files = self._scan_corpus()
+            docs = self._meta["docs"]
+            stats = {"added": 0, "updated": 0, "removed": 0}
+
+            for path in list(docs):
+                if path not in files:
+                    self._meta["dead_postings"] += docs.pop(path)["unique_terms"]
+                    stats["removed"] += 1
+
+            changed = []
+            for path, (mtime, size) in files.items():
+                info = docs.get(path)
+                if info is None:
+                    stats["added"] += 1
+                elif info["mtime"] != mtime or info["size"] != size:
+                    self._meta["dead_postings"] += docs.pop(path)["unique_terms"]
+                    stats["updated"] += 1
+                else:
+                    continue
+                changed.append((path, mtime, size))
+
+            if changed:
+                self._write_segment(changed)
+            if not any(stats.values()):
+                return stats
+
+            total = self._meta["total_postings"]
+            if len(self._meta["segments"]) > self.max_segments or \
+                    (total and self._meta["dead_postings"] / total > self.max_dead_ratio):
+                self._rebuild()
+            else:
+                self._save_meta()
+                self._open_segments()
+            return stats
+
+    def rebuild(self) -> None:
+        """ 丢弃现有索引，从语料目录完整重建。 """
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._meta["docs"] = {}
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        """ 把所有有效文档重新写入单个段，并删除旧段文件。 """
+        old_segments = list(self._meta["segments"])
+        files = self._scan_corpus()
+        self._meta["docs"] = {}
+        self._meta["segments"] = []
+        self._meta["total_postings"] = 0
+        self._meta["dead_postings"] = 0
+        if files:
+            self._write_segment([(path, mtime, size) for path, (mtime, size) in files.items()])
+        self._save_meta()
+        self._open_segments()
+        for name in old_segments:
+            for suffix in (".json", ".post"):
+                try:
+                    os.remove(os.path.join(self.index_dir, name + suffix))
+                except OSError:
+                    pass
+
+    def _write_segment(self, changed: List[Tuple[str, float, int]]) -> None:
+        inverted: Dict[str, List[Tuple[int, int]]] = {}
+        docs = self._meta["docs"]
+        for path, mtime, size in changed:
+            text = _read_text(os.path.join(self.corpus_dir, path))
+            tokens = tokenize(text)
+            counts = Counter(tokens)
+            doc_id = self._meta["next_doc_id"]
+            self._meta["next_doc_id"] += 1
+            docs[path] = {"id": doc_id, "mtime": mtime, "size": size, "length": len(tokens),
+                          "unique_terms": len(counts), "title": _extract_title(text, path)}
+            for term, tf in counts.items():
+                inverted.setdefault(term, []).append((doc_id, tf))
+
+        postings = array('I')
+        terms: Dict[str, List[int]] = {}
+        for term in sorted(inverted):
+            entries = inverted[term]
+            terms[term] = [len(postings) // 2, len(entries)]
+            for doc_id, tf in entries:
+                postings.append(doc_id)
+                postings.append(tf)
+        if not postings:
+            return
+
+        name = f"seg_{self._meta['next_segment']:05d}"
+        self._meta["next_segment"] += 1
+        with open(os.path.join(self.index_dir, f"{name}.post"), 'wb') as f:
+            postings.tofile(f)
+        with open(os.path.join(self.index_dir, f"{name}.json"), 'w', encoding='utf-8') as f:
+            json.dump(terms, f, ensure_ascii=False)
+        self._meta["segments"].append(name)
+        self._meta["total_postings"] += len(postings) // 2
+
+    # ---------- 查询 ----------
+
+    def search(self, query: str, top_k: int = 5, snippet_chars: int = 200) -> List[Dict[str, Any]]:
+        """ BM25 检索，返回 [{title, url, snippet, score, source}]，分数相同按文档 ID 排序以保证结果确定。 """
+        query_terms = Counter(tokenize(query))
+        if not query_terms:
+            return []
+        with self._lock:
+            n_docs = len(self._docs_by_id)
+            if not n_docs:
+                return []
+            scores: Dict[int, float] = {}
+            for term, qtf in query_terms.items():
+                # 只收集有效文档的倒排：已失效的旧版本既不计分，也不计入 df
+                matches: List[Tuple[int, int, Dict[str, Any]]] = []
+                for segment in self._segments:
+                    postings = segment.postings(term)
+                    if postings is None:
+                        continue
+                    for i in range(0, len(postings), 2):
+                        info = self._docs_by_id.get(postings[i])
+                        if info is not None:
+                            matches.append((postings[i], postings[i + 1], info))
+                    postings.release()
+                if not matches:
+                    continue
+                df = len(matches)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf, info in matches:
+                    norm = self.k1 * (1 - self.b + self.b * info["length"] / self._avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + qtf * idf * tf * (self.k1 + 1) / (tf + norm)
+
+            ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:top_k]
+            hits = [(self._docs_by_id[doc_id], score) for doc_id, score in ranked]
+
+        results = []
+        for info, score in hits:
+            path = os.path.join(self.corpus_dir, info["path"])
+            try:
+                snippet = self._best_passage(_read_text(path), query_terms, snippet_chars)
+            except OSError:
+                snippet = ""
+            results.append({"title": info["title"], "url": f"file://{path}", "snippet": snippet,
+                            "score": round(score, 4), "source": "local"})
+        return results
+
+    @staticmethod
+    def _best_passage(text: str, query_terms: Counter, max_chars: int) -> str:
+        """ 选出命中查询词最多的段落作为摘要。 """
+        best, best_hits = "", -1
+        for passage in _PARAGRAPH_PATTERN.split(text):
+            passage = ' '.join(passage.split())
+            if not passage:
+                continue
+            hits = sum(1 for token in tokenize(passage) if token in query_terms)
+            if hits > best_hits:
+                best, best_hits = passage, hits
+        return best[:max_chars]
+
+    def __len__(self) -> int:
+        return len(self._docs_by_id)
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+
+
+_indexes: Dict[str, LocalSearchIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(corpus_dir: Optional[str] = None) -> LocalSearchIndex:
+    """
+    获取指定语料目录的共享索引，默认读取 LOCAL_SEARCH_DIR。
+    距离上次检查超过 REFRESH_INTERVAL 秒时先增量更新，没有文件变化时只有一次目录扫描的开销。
+    """
+    corpus_dir = corpus_dir or os.getenv("LOCAL_SEARCH_DIR")
+    if not corpus_dir:
+        raise ValueError("LOCAL_SEARCH_DIR environment variable not set.")
+    key = os.path.abspath(corpus_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LocalSearchIndex(key)
+    if index.checked_at is None or time.monotonic() - index.checked_at >= REFRESH_INTERVAL:
+        index.update()
+    return index
+
+
+def local_search(query: str, top_k: int = 5, corpus_dir: Optional[str] = None) -> Dict[str, Any]:
+    """ 本地检索，返回与在线数据源一致的结构 {"answer": None, "results": [...]}。 """
+    return {"answer": None, "results": get_local_index(corpus_dir).search(query, top_k=top_k)}
+
+
+def is_local_backend() -> bool:
+    """ SEARCH_BACKEND=local 时只使用本地后端。 """
+    return os.getenv("SEARCH_BACKEND", "").strip().lower() == "local"
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    corpus = sys.argv[1] if len(sys.argv) > 1 else os.getenv("LOCAL_SEARCH_DIR", ".")
+    start = time.perf_counter()
+    index = LocalSearchIndex(corpus)
+    print(f"📚 增量索引: {index.update()}，文档数 {len(index)}，耗时 {time.perf_counter() - start:.2f}s")
+    for q in ["智能体 规划", "weather agent", "MCP 服务器"]:
+        start = time.perf_counter()
+        hits = index.search(q)
+        print(f"\n🔎 {q} ({(time.perf_counter() - start) * 1000:.1f}ms)")
+        for i, hit in enumerate(hits, 1):
+            print(f"[{i}] {hit['title']} ({hit['score']})\n    {hit['snippet'][:100]}")
+    index.close()
@@ -1,7 +1,11 @@
-import ast
-from typing import Optional, Dict, List
+import queue
+import re
+import threading
+from typing import Optional, Dict, List, Iterator, Any
 from hello_agents import HelloAgentsLLM, Config, SimpleAgent
 from my_llm import MyLLM
+from my_plan_cache import PlanCache
+from my_plan_parser import IncrementalPlanParser, parse_plan
 
 MY_PLANNER_PROMPT = """
 你是一个顶级的AI规划专家。你的任务是将用户提出的复杂问题分解成一个由多个简单步骤组成的行动计划。
@@ -16,10 +20,38 @@ MY_PLANNER_PROMPT = """
 ```
 """
 
+MY_JSON_PLANNER_PROMPT = """
+你是一个顶级的AI规划专家。你的任务是将用户提出的复杂问题分解成一个由多个简单步骤组成的行动计划。
+请确保计划中的每个步骤都是一个独立的、可执行的子任务，并且严格按照逻辑顺序排列。
+
+问题: {question}
+
+请只输出一个 JSON 对象，不要输出其他内容，格式如下:
+{{"plan": ["步骤1", "步骤2", "步骤3"]}}
+"""
+
+# 结构化输出的计划格式，支持 json_schema 的模型可将其作为 plan_response_format 传入
+PLAN_JSON_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "plan",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "plan": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": ["plan"],
+            "additionalProperties": False
+        }
+    }
+}
+
 MY_EXECUTOR_PROMPT = """
 你是一位顶级的AI执行专家。你的任务是严格按照给定的计划，一步步地解决问题。
 你将收到原始问题、完整的计划、以及到目前为止已经完成的步骤和结果。
 请你专注于解决"当前步骤"，并仅输出该步骤的最终答案，不要输出任何额外的解释或对话。
+如果当前步骤确实无法完成（缺少信息、前置结果错误等），请以 [STEP_FAILED] 开头并简要说明原因。
 
 # 原始问题:
 {question}
@@ -54,6 +86,42 @@ MY_SUMMARIZER_PROMPT = """
 不要输出多余的废话，直接给出最终结果。 
 """
 
+MY_REPLANNER_PROMPT = """
+你是一个顶级的AI规划专家。之前制定的计划在执行过程中遇到了失败，请根据已完成的步骤和失败原因，重新规划剩余的步骤。
+
+# 原始问题:
+{question}
+
+# 已完成的步骤与结果:
+{history}
+
+# 失败的步骤:
+{failed_step}
+
+# 失败原因:
+{reason}
+
+# 原计划中尚未执行的步骤:
+{remaining}
+
+请只输出新的剩余步骤（不要重复已完成的步骤），严格按照以下格式:
+```python
+["步骤1", "步骤2", ...]
+```
+"""
+
+STEP_FAILED_MARKER = "[STEP_FAILED]"
+
+_STEP_REF_PATTERN = re.compile(r'(?:步骤|第|step)\s*(\d+)', re.IGNORECASE)
+
+
+def _truncate(text: str, limit: int) -> str:
+    """ 将文本截断到 limit 个字符以内。 """
+    if len(text) <= limit:
+        return text
+    return text[:limit] + "...(已截断)"
+
+
 class MyPlanAndSolveAgent(SimpleAgent):
     """
     结合规划和执行能力的 Agent，能够将复杂任务分解为多个步骤并逐步解决。
@@ -65,50 +133,120 @@ class MyPlanAndSolveAgent(SimpleAgent):
             config: Optional[Config] = None,
             planner_prompt: Optional[str] = None,
             executor_prompt: Optional[str] = None,
+            plan_cache: Optional[PlanCache] = None,
+            history_mode: str = "compact",
+            history_window: int = 2,
+            max_result_chars: int = 1500,
+            max_history_chars: int = 4000,
+            max_replans: int = 2,
+            plan_mode: str = "text",
+            plan_response_format: Optional[Dict[str, Any]] = None,
+            stream_plan: bool = False,
     ):
+        """
+        :param history_mode: 执行器提示中的历史渲染方式，"full" 为完整历史，"compact" 为压缩历史
+        :param history_window: compact 模式下保留完整结果的最近步骤数
+        :param max_result_chars: compact 模式下单个步骤结果的最大字符数
+        :param max_history_chars: compact 模式下摘要行的总字符预算
+        :param max_replans: 步骤失败时允许重新规划的最大次数，用尽后任务以 error 事件终止，不再汇总答案
+        :param plan_mode: "text" 为 Python 列表格式的计划，"json" 为结构化输出 (response_format)
+        :param plan_response_format: json 模式下的 response_format，默认 json_object，可传入 PLAN_JSON_SCHEMA
+        :param stream_plan: 是否流式生成计划，解析出第一个步骤后立即开始执行
+        """
         super().__init__(name, llm, config)
-        self.planner_prompt = planner_prompt if planner_prompt else MY_PLANNER_PROMPT
+        default_planner_prompt = MY_JSON_PLANNER_PROMPT if plan_mode == "json" else MY_PLANNER_PROMPT
+        self.planner_prompt = planner_prompt if planner_prompt else default_planner_prompt
         self.executor_prompt = executor_prompt if executor_prompt else MY_EXECUTOR_PROMPT
         self.summarizer_prompt = MY_SUMMARIZER_PROMPT
+        self.plan_cache = plan_cache
+        self.history_mode = history_mode
+        self.history_window = history_window
+        self.max_result_chars = max_result_chars
+        self.max_history_chars = max_history_chars
+        self.max_replans = max_replans
+        self.replanner_prompt = MY_REPLANNER_PROMPT
+        self.plan_mode = plan_mode
+        self.plan_response_format = plan_response_format or {"type": "json_object"}
+        self.stream_plan = stream_plan
 
     def run(self, input_text: str, **kwargs) -> str:
         print(f"🤖 {self.name} 正在处理: {input_text}")
-
-        # Plan
         print("\n📋 正在制定计划...")
-        plan = self._make_plan(input_text, **kwargs)
-        if not plan:
-            return "❌ 制定计划失败，无法继续。"
-        print(f"✅ 计划已生成，共 {len(plan)} 个步骤:")
-        for i, step in enumerate(plan):
-            print(f"  {i + 1}. {step}")
 
-        # Solve
-        print("\n🚀 开始执行计划...")
-        step_history: List[Dict[str, str]] = []
+        final_answer = ""
+        for event in self.run_events(input_text, **kwargs):
+            self._print_event(event)
+            if event["type"] == "summary":
+                final_answer = event["answer"]
+            elif event["type"] == "error" and event.get("fatal"):
+                return f"❌ {event['message']}"
+        return final_answer
 
-        for i, step in enumerate(plan):
-            print(f"\n👉 正在执行步骤 {i + 1}/{len(plan)}: {step}")
-            history_text = self._format_history(step_history)
+    def run_events(self, input_text: str, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        以事件流的形式执行 Plan-and-Solve，调用方可据此渲染进度，停止迭代即可取消后续的 LLM 调用。
+        事件类型: plan / plan_step / step / result / replan / error / summary
+        stream_plan 模式下不产生 plan 事件，而是每解析出一个步骤产生一个 plan_step 事件。
+        """
+        step_source: Optional[Iterator[str]] = None
+        if self.stream_plan:
+            plan: List[str] = []
+            step_source = self._stream_plan(input_text, **kwargs)
+        else:
+            plan = self._make_plan(input_text, **kwargs)
+            if not plan:
+                yield {"type": "error", "message": "制定计划失败，无法继续。", "fatal": True}
+                return
+            yield {"type": "plan", "plan": list(plan)}
 
-            prompt = self.executor_prompt.format(
-                question=input_text,
-                plan=str(plan),
-                history=history_text,
-                current_step=step
-            )
+        step_history: List[Dict[str, str]] = []
+        pending = list(plan)
+        replans = 0
+
+        while True:
+            if pending:
+                step = pending.pop(0)
+            elif step_source is not None:
+                step = next(step_source, None)
+                if step is None:
+                    step_source = None
+                    if not plan:
+                        yield {"type": "error", "message": "制定计划失败，无法继续。", "fatal": True}
+                        return
+                    break
+                plan.append(step)
+                yield {"type": "plan_step", "index": len(plan), "step": step}
+            else:
+                break
 
-            messages = [{'role': 'user', 'content': prompt}]
-            step_result = self.llm.invoke(messages=messages, **kwargs).strip()
+            index = len(step_history) + 1
+            total = None if step_source is not None else len(step_history) + len(pending) + 1
+            yield {"type": "step", "index": index, "total": total, "step": step}
 
-            step_result = step_result.replace("```python", "").replace("```", "").strip()
-            print(f"💡 步骤结果: {step_result}")
+            step_result = self._execute_step(input_text, plan, step_history, step, **kwargs)
+            failed = self._is_step_failed(step_result)
+            yield {"type": "result", "index": index, "step": step, "result": step_result, "failed": failed}
 
             step_history.append({
                 "step": step,
                 "result": step_result
             })
-        print(f"\n🏁 所有步骤执行完毕, 正在整合最终答案...")
+            if not failed:
+                continue
+
+            if replans >= self.max_replans:
+                # 任务没有完成，不再汇总出一个看似成功的最终答案
+                yield {"type": "error", "message": f"步骤 {index} 执行失败且已达到最大重新规划次数，任务终止。",
+                       "fatal": True}
+                return
+            replans += 1
+            if step_source is not None:
+                # 尚未生成完的旧计划已经失效，直接丢弃
+                step_source.close()
+                step_source = None
+            pending = self._replan(input_text, step_history, step, step_result, pending, **kwargs)
+            plan = [item["step"] for item in step_history] + pending
+            yield {"type": "replan", "index": index, "reason": step_result, "plan": list(pending)}
 
         history_text = self._format_history(step_history)
         summary_prompt = self.summarizer_prompt.format(
@@ -117,34 +255,211 @@ class MyPlanAndSolveAgent(SimpleAgent):
         )
         messages = [{'role': 'user', 'content': summary_prompt}]
         final_answer = self.llm.invoke(messages=messages, **kwargs).strip()
+        yield {"type": "summary", "answer": final_answer}
+
+    def _execute_step(self, question: str, plan: List[str], step_history: List[Dict[str, str]], step: str, **kwargs) -> str:
+        """ 执行单个步骤，返回清洗后的结果。 """
+        history_text = self._render_step_history(step_history, step)
+        prompt = self.executor_prompt.format(
+            question=question,
+            plan=str(plan),
+            history=history_text,
+            current_step=step
+        )
+        messages = [{'role': 'user', 'content': prompt}]
+        step_result = self.llm.invoke(messages=messages, **kwargs).strip()
+        return step_result.replace("```python", "").replace("```", "").strip()
+
+    def _replan(self, question: str, step_history: List[Dict[str, str]], failed_step: str, reason: str,
+                remaining: List[str], **kwargs) -> List[str]:
+        """ 根据失败原因重新规划剩余步骤；解析失败时重试失败的步骤，再接原剩余步骤。 """
+        prompt = self.replanner_prompt.format(
+            question=question,
+            history=self._format_history(step_history[:-1]),
+            failed_step=failed_step,
+            reason=reason.replace(STEP_FAILED_MARKER, "").strip(),
+            remaining=str(remaining) if remaining else "无"
+        )
+        messages = [{'role': 'user', 'content': prompt}]
+        response = self.llm.invoke(messages=messages, **kwargs).strip()
+        new_plan = self._parse_plan_output(response)
+        if new_plan:
+            return new_plan
+        return [failed_step] + remaining
 
-        return final_answer
+    @staticmethod
+    def _is_step_failed(result: str) -> bool:
+        """ 判断步骤结果是否表示失败：显式的失败标记，或以常见失败措辞开头。 """
+        if STEP_FAILED_MARKER in result:
+            return True
+        head = result[:30]
+        return any(head.startswith(k) for k in ("无法完成", "执行失败", "无法执行", "Error:"))
+
+    @staticmethod
+    def _print_event(event: Dict[str, Any]) -> None:
+        """ 将事件渲染到控制台，保持与同步执行一致的输出。 """
+        event_type = event["type"]
+        if event_type == "plan":
+            print(f"✅ 计划已生成，共 {len(event['plan'])} 个步骤:")
+            for i, step in enumerate(event["plan"]):
+                print(f"  {i + 1}. {step}")
+            print("\n🚀 开始执行计划...")
+        elif event_type == "plan_step":
+            print(f"  {event['index']}. {event['step']}")
+        elif event_type == "step":
+            total = event['total'] if event['total'] is not None else "?"
+            print(f"\n👉 正在执行步骤 {event['index']}/{total}: {event['step']}")
+        elif event_type == "result":
+            print(f"{'⚠️ 步骤失败' if event['failed'] else '💡 步骤结果'}: {event['result']}")
+        elif event_type == "replan":
+            print(f"🔁 已重新规划剩余步骤，共 {len(event['plan'])} 个:")
+            for step in event["plan"]:
+                print(f"  - {step}")
+        elif event_type == "error":
+            print(f"❌ {event['message']}")
+        elif event_type == "summary":
+            print(f"\n🏁 所有步骤执行完毕, 已整合最终答案。")
 
     def _make_plan(self, question: str, **kwargs) -> Optional[List[str]]:
-        """ 使用 LLM 制定行动计划，将复杂问题分解为多个步骤。 """
+        """ 使用 LLM 制定行动计划，将复杂问题分解为多个步骤；配置了计划缓存时优先复用。 """
+        if self.plan_cache is not None:
+            cached_plan = self.plan_cache.get(question)
+            if cached_plan:
+                print("♻️ 命中计划缓存，跳过规划调用。")
+                return cached_plan
+
+        messages, plan_kwargs = self._plan_request(question, **kwargs)
+        response = self.llm.invoke(messages=messages, **plan_kwargs).strip()
+        plan = self._parse_plan_output(response)
+
+        if self.plan_cache is not None and plan:
+            self.plan_cache.put(question, plan)
+        return plan
+
+    def _stream_plan(self, question: str, **kwargs) -> Iterator[str]:
+        """
+        流式生成计划：后台线程消费 LLM 的流式输出并增量解析，每解析出一个步骤就立即交给调用方执行。
+        """
+        if self.plan_cache is not None:
+            cached_plan = self.plan_cache.get(question)
+            if cached_plan:
+                print("♻️ 命中计划缓存，跳过规划调用。")
+                yield from cached_plan
+                return
+
+        messages, plan_kwargs = self._plan_request(question, **kwargs)
+        steps_queue: "queue.Queue" = queue.Queue()
+        stopped = threading.Event()
+        end_of_plan = object()
+
+        def produce():
+            parser = IncrementalPlanParser()
+            emitted = 0
+            try:
+                for chunk in self.llm.stream_invoke(messages, **plan_kwargs):
+                    if stopped.is_set():
+                        return
+                    for step in parser.feed(chunk):
+                        steps_queue.put(step)
+                        emitted += 1
+                    if parser.done:
+                        break
+                for step in parser.finish()[emitted:]:
+                    steps_queue.put(step)
+            except Exception as e:
+                steps_queue.put(e)
+            finally:
+                steps_queue.put(end_of_plan)
+
+        threading.Thread(target=produce, daemon=True).start()
+
+        steps: List[str] = []
+        try:
+            while True:
+                item = steps_queue.get()
+                if item is end_of_plan:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                steps.append(item)
+                yield item
+        finally:
+            stopped.set()
+
+        if self.plan_cache is not None and steps:
+            self.plan_cache.put(question, steps)
+
+    def _plan_request(self, question: str, **kwargs):
+        """ 构造规划请求的消息和 LLM 参数，json 模式下附加 response_format。 """
         prompt = self.planner_prompt.format(question=question)
-        messages = [{'role': 'user', 'content': prompt}]
-        response = self.llm.invoke(messages=messages, **kwargs).strip()
-        return self._parse_plan_output(response)
+        if self.plan_mode == "json":
+            kwargs = {**kwargs, "response_format": self.plan_response_format}
+        return [{'role': 'user', 'content': prompt}], kwargs
 
     @staticmethod
-    def _parse_plan_output(response: str) -> List[str] | str:
-        """ 解析 LLM 输出的计划，提取步骤列表。 """
-        try:
-            start = response.find('[')
-            end = response.rfind(']') + 1
-            if start == -1 or end == 0:
-                print(f"⚠️ 无法在响应中找到列表格式: {response}")
-                return [response]
-            list_str = response[start:end]
-            plan = ast.literal_eval(list_str)
-            if isinstance(plan, list):
-                return [str(step) for step in plan]
-            else:
-                return response
-        except Exception as e:
-            print(f"⚠️ 解析计划时出错: {e}")
-            return [line.strip() for line in response.split('\n') if line.strip() and not line.strip().startswith('```')]
+    def _parse_plan_output(response: str) -> List[str]:
+        """ 解析 LLM 输出的计划，提取步骤列表；解析不出列表时按行拆分，始终返回字符串列表。 """
+        plan = parse_plan(response)
+        if not plan:
+            print(f"⚠️ 无法从响应中解析出计划: {response}")
+        return plan
+
+    def _render_step_history(self, history: List[Dict[str, str]], current_step: str) -> str:
+        """ 按 history_mode 渲染执行器使用的历史，总结阶段始终使用完整历史。 """
+        if self.history_mode == "full":
+            return self._format_history(history)
+        return self._compact_history(
+            history,
+            current_step,
+            window=self.history_window,
+            max_result_chars=self.max_result_chars,
+            max_history_chars=self.max_history_chars,
+        )
+
+    @staticmethod
+    def _compact_history(
+            history: List[Dict[str, str]],
+            current_step: str,
+            window: int = 2,
+            max_result_chars: int = 1500,
+            max_history_chars: int = 4000,
+            digest_chars: int = 80,
+    ) -> str:
+        """
+        压缩历史，使每一步的提示长度基本恒定：
+        - 最近 window 个步骤以及当前步骤显式引用的步骤（如“步骤3”）保留结果，截断到 max_result_chars
+        - 其余步骤只保留一行摘要，从近到远填充，直到用完 max_history_chars 预算
+        """
+        if not history:
+            return "无(这是第一个步骤)"
+
+        total = len(history)
+        referenced = {int(n) - 1 for n in _STEP_REF_PATTERN.findall(current_step)}
+        detailed = set(range(max(0, total - window), total)) | {i for i in referenced if 0 <= i < total}
+
+        blocks: Dict[int, str] = {}
+        for i in detailed:
+            item = history[i]
+            blocks[i] = f"步骤 {i + 1}: {item['step']}\n结果: {_truncate(item['result'], max_result_chars)}\n---\n"
+
+        budget = max_history_chars
+        omitted = 0
+        for i in range(total - 1, -1, -1):
+            if i in detailed:
+                continue
+            item = history[i]
+            digest = _truncate(item['result'].replace('\n', ' '), digest_chars)
+            line = f"步骤 {i + 1}: {item['step']} → {digest}\n"
+            if len(line) > budget:
+                omitted = i + 1
+                break
+            blocks[i] = line
+            budget -= len(line)
+
+        formatted = f"(更早的步骤 1-{omitted} 摘要已省略)\n" if omitted else ""
+        for i in sorted(blocks):
+            formatted += blocks[i]
+        return formatted
 
     @staticmethod
     def _format_history(history: List[Dict[str, str]]) -> str:
@@ -168,7 +483,8 @@ def test_plan_and_solve():
 
     agent = MyPlanAndSolveAgent(
         name="P&S助手",
-        llm=llm
+        llm=llm,
+        plan_cache=PlanCache()
     )
 
     # 测试案例 1: 逻辑推理/数学问题
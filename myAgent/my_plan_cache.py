@@ -0,0 +1,221 @@
+"""
+计划缓存
+
+对相同或高度相似的问题复用已经生成过的计划，省去一次完整的规划 LLM 调用。
+- 精确命中：按归一化后的问题文本查找
+- 近似命中：基于 MinHash（或可选的本地 Embedding）计算相似度，超过阈值即复用
+- 轻量改写：模板化问题只有数字不同时，把计划中的旧数字替换为新数字；
+  计划中含有中间结果（问题里没有的数字）时不改写，避免把过期的计算结果交给执行器
+- 运算符 (+ - * / ^ % = < >) 保留在键中，只差运算符的问题不会互相命中
+"""
+import hashlib
+import math
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Any
+
+_NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+_OPERATOR_PATTERN = re.compile(r'[+\-*/^%=<>×÷]')
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_question(question: str) -> str:
+    """ 归一化问题文本：全半角统一、小写、去标点（保留运算符）、合并空白。 """
+    text = unicodedata.normalize('NFKC', question).lower()
+    text = re.sub(r'(?<!\d)\.|\.(?!\d)', ' ', text)
+    text = re.sub(r'[^\w\s.+\-*/^%=<>×÷]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _question_template(normalized: str) -> str:
+    """ 将数字替换为占位符，得到问题的“模板”。 """
+    return _NUMBER_PATTERN.sub('#', normalized)
+
+
+class MinHasher:
+    """ 基于字符 n-gram 的 MinHash，适用于中英文混合的短文本。 """
+    def __init__(self, num_perm: int = 64, ngram: int = 3, seed: int = 42):
+        self.num_perm = num_perm
+        self.ngram = ngram
+        params = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(f"{seed}-{i}".encode(), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], 'big') % (_MERSENNE_PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], 'big') % _MERSENNE_PRIME
+            params.append((a, b))
+        self._params = params
+
+    def _shingles(self, text: str) -> set:
+        compact = text.replace(' ', '')
+        if len(compact) <= self.ngram:
+            return {compact}
+        return {compact[i:i + self.ngram] for i in range(len(compact) - self.ngram + 1)}
+
+    def signature(self, text: str) -> List[int]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big')
+            for s in self._shingles(text)
+        ]
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._params]
+
+    @staticmethod
+    def similarity(sig_a: Sequence[int], sig_b: Sequence[int]) -> float:
+        """ 估计两个签名对应集合的 Jaccard 相似度。 """
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def _cosine(vec_a: Sequence[float], vec_b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(vec_a, vec_b))
+    norm = math.sqrt(sum(x * x for x in vec_a)) * math.sqrt(sum(y * y for y in vec_b))
+    return dot / norm if norm else 0.0
+
+
+class PlanCache:
+    """
+    计划缓存，线程安全，按 LRU 淘汰。
+
+    :param threshold: 近似命中的最低相似度 (0~1)
+    :param max_entries: 最大缓存条目数
+    :param embed_fn: 可选的本地 Embedding 函数 text -> vector；提供时以余弦相似度替代 MinHash
+    :param num_perm: MinHash 的排列数，越大估计越准但越慢
+    """
+    def __init__(
+            self,
+            threshold: float = 0.85,
+            max_entries: int = 512,
+            embed_fn: Optional[Callable[[str], Sequence[float]]] = None,
+            num_perm: int = 64,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self._hasher = MinHasher(num_perm=num_perm)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str) -> Optional[List[str]]:
+        """ 查找可复用的计划，未命中返回 None。 """
+        normalized = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(normalized)
+            if entry is not None:
+                self._entries.move_to_end(normalized)
+                self.hits += 1
+                return list(entry['plan'])
+
+        vector = self._vectorize(normalized)
+        operators = _OPERATOR_PATTERN.findall(normalized)
+        best_key, best_score = None, 0.0
+        with self._lock:
+            for key, candidate in self._entries.items():
+                # 运算符不同的问题（12 + 7 与 12 - 7）计划不同，不参与近似匹配
+                if candidate['operators'] != operators:
+                    continue
+                score = self._similarity(vector, candidate['vector'])
+                if score > best_score:
+                    best_key, best_score = key, score
+            if best_key is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[best_key]
+            self._entries.move_to_end(best_key)
+
+        plan = self._adapt_plan(entry, _NUMBER_PATTERN.findall(normalized))
+        with self._lock:
+            if plan is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return plan
+
+    def put(self, question: str, plan: List[str]) -> None:
+        """ 写入一条计划，空计划不缓存。 """
+        if not plan:
+            return
+        normalized = normalize_question(question)
+        entry = {
+            'question': question,
+            'numbers': _NUMBER_PATTERN.findall(normalized),
+            'operators': _OPERATOR_PATTERN.findall(normalized),
+            'plan': [str(step) for step in plan],
+            'vector': self._vectorize(normalized),
+        }
+        with self._lock:
+            self._entries[normalized] = entry
+            self._entries.move_to_end(normalized)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _vectorize(self, normalized: str) -> Sequence:
+        if self.embed_fn is not None:
+            return list(self.embed_fn(normalized))
+        # 数字不参与相似度计算，使模板化问题的不同实例能够互相命中
+        return self._hasher.signature(_question_template(normalized))
+
+    def _similarity(self, vec_a: Sequence, vec_b: Sequence) -> float:
+        if self.embed_fn is not None:
+            return _cosine(vec_a, vec_b)
+        return MinHasher.similarity(vec_a, vec_b)
+
+    @staticmethod
+    def _adapt_plan(entry: Dict[str, Any], numbers: List[str]) -> Optional[List[str]]:
+        """
+        轻量改写缓存的计划：把旧问题中的数字一一替换为新问题中的数字。
+        数字个数不一致、映射有歧义，或计划中含有旧问题里没有的数字（中间结果，如 5*3=15 中的 15）时
+        放弃复用，返回 None；不含数字的计划原样复用。
+        """
+        old_numbers = entry['numbers']
+        if old_numbers == numbers:
+            return list(entry['plan'])
+        if len(old_numbers) != len(numbers):
+            return None
+        plan_numbers = {n for step in entry['plan'] for n in _NUMBER_PATTERN.findall(step)}
+        if not plan_numbers <= set(old_numbers):
+            return None
+
+        mapping: Dict[str, str] = {}
+        for old, new in zip(old_numbers, numbers):
+            if mapping.setdefault(old, new) != new:
+                return None
+
+        def replace(match: re.Match) -> str:
+            return mapping.get(match.group(0), match.group(0))
+
+        return [_NUMBER_PATTERN.sub(replace, step) for step in entry['plan']]
+
+
+# ==================== 测试 ====================
+
+def test_plan_cache():
+    cache = PlanCache()
+    cache.put("计算 12 + 7 的值", ["把 12 和 7 相加"])
+    assert cache.get("计算 12 + 7 的值") == ["把 12 和 7 相加"]
+    # 只差运算符的问题不能命中加法的计划
+    for question in ["计算 12 - 7 的值", "计算 12 * 7 的值", "计算 12 / 7 的值"]:
+        assert cache.get(question) is None, question
+    print("✓ 只差运算符的问题不会互相命中")
+
+    # 只含问题数字的计划可以改写
+    assert cache.get("计算 20 + 5 的值") == ["把 20 和 5 相加"]
+    # 含有中间结果的计划不改写
+    cache.put("A=5, B=5*3, 求 A+B", ["计算B=5*3=15", "步骤2: 求和 5+15=20"])
+    assert cache.get("A=6, B=6*2, 求 A+B") is None
+    print("✓ 含中间结果的计划不会被错误改写")
+
+
+if __name__ == "__main__":
+    test_plan_cache()
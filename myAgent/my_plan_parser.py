@@ -0,0 +1,221 @@
+"""
+增量计划解析器
+
+从 LLM 输出（可以是流式的片段）中提取计划步骤列表，兼容以下格式：
+- JSON 对象: {"plan": ["步骤1", "步骤2"]}
+- JSON / Python 列表: ["步骤1", '步骤2']，允许被 ``` 代码块包裹、允许末尾多余逗号
+- 列表元素为对象: [{"step": "步骤1"}, ...]
+- 以上都不满足时，退化为按行拆分（去掉编号和项目符号）
+
+只有位于行首、代码块标记之后或 "plan": 之后的 [ 才被当作计划列表的开始，
+步骤正文里的方括号（如 "读取 data.csv [使用 pandas]"）不会被误认为列表。
+每解析出一个完整的步骤就立即返回，调用方无需等待整个计划生成完毕。
+"""
+import ast
+import json
+import re
+from typing import Any, List, Optional
+
+_LINE_PREFIX_PATTERN = re.compile(r'^\s*(?:[-*•]|\d+[.、)）]|步骤\s*\d+\s*[:：.、]?|step\s*\d+\s*[:：.]?)\s*', re.IGNORECASE)
+_OBJECT_STEP_KEYS = ("step", "title", "description", "task", "content")
+# [ 之前的同一行内容满足该模式时才开始解析列表：空白、代码块标记或 "plan":
+_ARRAY_START_PATTERN = re.compile(r'(?:^|```[\w-]*|["\']plan["\']\s*:)\s*$', re.IGNORECASE)
+_CODE_FENCE_PATTERN = re.compile(r'^```[\w-]*\s*|\s*```$')
+
+
+class IncrementalPlanParser:
+    """ 逐字符的容错状态机，feed() 返回本次新解析出的步骤。 """
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._text_parts: List[str] = []
+        self._in_array = False
+        self._line = ""
+        self._done = False
+        self._quote: Optional[str] = None
+        self._escaped = False
+        self._depth = 0
+        self._bare: List[str] = []
+        self.steps: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        """ 是否已经读到计划列表的结束括号。 """
+        return self._done
+
+    def feed(self, chunk: str) -> List[str]:
+        self._text_parts.append(chunk)
+        new_steps: List[str] = []
+        if self._done:
+            return new_steps
+
+        for ch in chunk:
+            if not self._in_array:
+                if ch == '[' and _ARRAY_START_PATTERN.search(self._line):
+                    self._in_array = True
+                else:
+                    self._line = "" if ch == '\n' else self._line + ch
+                continue
+
+            if self._quote is not None:
+                self._buffer.append(ch)
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == self._quote:
+                    self._quote = None
+                    if self._depth == 0:
+                        self._emit(self._decode_string(''.join(self._buffer)), new_steps)
+                        self._buffer = []
+                continue
+
+            if self._depth > 0:
+                self._buffer.append(ch)
+                if ch in '"\'':
+                    self._quote = ch
+                elif ch in '{[':
+                    self._depth += 1
+                elif ch in '}]':
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._emit(self._decode_object(''.join(self._buffer)), new_steps)
+                        self._buffer = []
+                continue
+
+            if ch in '"\'':
+                self._flush_bare(new_steps)
+                self._quote = ch
+                self._buffer = [ch]
+            elif ch in '{[':
+                self._flush_bare(new_steps)
+                self._depth = 1
+                self._buffer = [ch]
+            elif ch == ',':
+                self._flush_bare(new_steps)
+            elif ch == ']':
+                self._flush_bare(new_steps)
+                self._done = True
+                break
+            elif not ch.isspace() or self._bare:
+                self._bare.append(ch)
+        return new_steps
+
+    def finish(self) -> List[str]:
+        """ 输入结束时调用，返回完整的步骤列表；空列表返回 []，没有读到列表时按行拆分兜底。 """
+        if not self._done:
+            self._flush_bare([])
+        if not self.steps and not self._done:
+            self.steps = self.split_lines(''.join(self._text_parts))
+        return list(self.steps)
+
+    @staticmethod
+    def split_lines(text: str) -> List[str]:
+        """ 按行拆分纯文本计划，去掉代码块标记、编号和项目符号。 """
+        steps = []
+        for line in text.split('\n'):
+            line = line.strip()
+            if not line or line.startswith('```'):
+                continue
+            line = _LINE_PREFIX_PATTERN.sub('', line).strip()
+            if line:
+                steps.append(line)
+        return steps
+
+    def _emit(self, step: Optional[str], new_steps: List[str]) -> None:
+        if step:
+            step = step.strip()
+        if step:
+            self.steps.append(step)
+            new_steps.append(step)
+
+    def _flush_bare(self, new_steps: List[str]) -> None:
+        token = ''.join(self._bare).strip()
+        self._bare = []
+        if token and token not in ('...', '…'):
+            self._emit(token, new_steps)
+
+    @staticmethod
+    def _decode_string(literal: str) -> str:
+        try:
+            if literal.startswith('"'):
+                return json.loads(literal)
+            return ast.literal_eval(literal)
+        except (ValueError, SyntaxError):
+            return literal[1:-1]
+
+    @staticmethod
+    def _decode_object(literal: str) -> Optional[str]:
+        try:
+            value = json.loads(literal)
+        except ValueError:
+            try:
+                value = ast.literal_eval(literal)
+            except (ValueError, SyntaxError):
+                return literal
+        return _step_from_value(value)
+
+
+def _step_from_value(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        for key in _OBJECT_STEP_KEYS:
+            if isinstance(value.get(key), str):
+                return value[key]
+        strings = [v for v in value.values() if isinstance(v, str)]
+        return strings[0] if strings else None
+    if isinstance(value, list):
+        return " ".join(str(v) for v in value)
+    return str(value)
+
+
+def _parse_full(text: str) -> Optional[List[str]]:
+    """ 把整段文本（去掉代码块标记）当作 JSON / Python 字面量解析；不是计划列表时返回 None。 """
+    literal = _CODE_FENCE_PATTERN.sub('', text.strip())
+    try:
+        value = json.loads(literal)
+    except ValueError:
+        try:
+            value = ast.literal_eval(literal)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    if isinstance(value, dict):
+        value = value.get("plan")
+    if not isinstance(value, list):
+        return None
+    steps = [_step_from_value(item) for item in value]
+    return [step.strip() for step in steps if step and step.strip()]
+
+
+def parse_plan(text: str) -> List[str]:
+    """ 一次性解析完整的计划文本，始终返回字符串列表；先整体解析校验，失败时再容错解析。 """
+    steps = _parse_full(text)
+    if steps is not None:
+        return steps
+    parser = IncrementalPlanParser()
+    parser.feed(text)
+    return parser.finish()
+
+
+# ==================== 测试 ====================
+
+def test_parse_plan():
+    cases = [
+        ('1. 读取 data.csv [使用 pandas]\n2. 删除空值行\n3. 保存', ['读取 data.csv [使用 pandas]', '删除空值行', '保存']),
+        ('[]', []),
+        ('```json\n{"plan": []}\n```', []),
+        ('```python\n["步骤1", \'步骤2\',]\n```', ['步骤1', '步骤2']),
+        ('计划如下：{"plan": ["读取数据", "清洗数据"]}', ['读取数据', '清洗数据']),
+        ('好的，计划如下：\n[{"step": "读取"}, {"step": "保存"}]', ['读取', '保存']),
+    ]
+    for text, expected in cases:
+        assert parse_plan(text) == expected, (text, parse_plan(text))
+
+    # 流式输入：步骤正文中的方括号被拆到不同片段中也不会触发列表解析
+    parser = IncrementalPlanParser()
+    for chunk in ['1. 读取 data.csv [使', '用 pandas]\n2. 删', '除空值行']:
+        parser.feed(chunk)
+    assert parser.finish() == ['读取 data.csv [使用 pandas]', '删除空值行']
+    print(f"✓ {len(cases) + 1} 个计划解析用例通过")
+
+
+if __name__ == "__main__":
+    test_parse_plan()
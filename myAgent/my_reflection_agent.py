@@ -1,4 +1,6 @@
-from typing import Optional, Dict
+import json
+import re
+from typing import Optional, Dict, Any
 from hello_agents import HelloAgentsLLM, Config, SimpleAgent
 
 MY_REFLECTION_PROMPTS = {
@@ -48,6 +50,21 @@ MY_REFLECTION_PROMPTS = {
     """
 }
 
+MY_VERDICT_PROMPT = """
+你是一个务实的审核员。请判断下面的回答是否存在必须修改的硬伤（事实错误、严重遗漏、逻辑错误），
+不要提出写作风格、修辞或“可以写得更好”这类主观建议。
+
+# 原始任务:
+{task}
+
+# 待审查的回答:
+{content}
+
+只输出一个 JSON 对象，不要输出其他内容:
+{{"needs_revision": true 或 false, "issues": ["硬伤1", "硬伤2"]}}
+没有硬伤时 needs_revision 为 false、issues 为空列表；每条问题不超过 50 字。
+"""
+
 class MyReflectionAgent(SimpleAgent):
     """
     基于反思机制的 Agent，能够通过多轮反思和改进来提升回答质量。
@@ -59,11 +76,22 @@ class MyReflectionAgent(SimpleAgent):
             config: Optional[Config] = None,
             system_prompt: Optional[str] = None,
             prompts: Optional[Dict[str, str]] = None,
-            max_reflections: int = 5
+            max_reflections: int = 5,
+            verdict_mode: str = "text",
+            judge_llm: Optional[HelloAgentsLLM] = None,
+            verdict_max_tokens: int = 200
     ):
+        """
+        :param verdict_mode: "text" 为自由文本反馈并匹配“无需改进”，"json" 为结构化判定 {needs_revision, issues[]}
+        :param judge_llm: json 模式下用于判定的 LLM，可以是更便宜的模型，默认与 llm 相同
+        :param verdict_max_tokens: json 模式下判定调用的 max_tokens 上限
+        """
         super().__init__(name, llm, system_prompt, config)
         self.max_reflections = max_reflections
         self.prompts = prompts if prompts else MY_REFLECTION_PROMPTS
+        self.verdict_mode = verdict_mode
+        self.judge_llm = judge_llm
+        self.verdict_max_tokens = verdict_max_tokens
 
     def run(self, input_text: str, **kwargs) -> str:
 
@@ -80,21 +108,29 @@ class MyReflectionAgent(SimpleAgent):
             print(f"\n--- 🔄 反思轮次 {i + 1}/{self.max_reflections} ---")
 
             # Reflect
-            reflect_msg = [{
-                'role': 'user',
-                'content': self.prompts['reflect'].format(
-                    task=input_text,
-                    content=current_answer
-                )
-            }]
-
-            feedback = self.llm.invoke(reflect_msg, **kwargs).strip()
-            print(f"\n反馈意见:\n{feedback}")
-
-            # Check for completion
-            if "无需改进" in feedback:
-                print("✨ 回答已达到要求，停止反思。")
-                break
+            if self.verdict_mode == "json":
+                verdict = self._judge(input_text, current_answer, **kwargs)
+                print(f"\n判定结果: {verdict}")
+                if not verdict["needs_revision"]:
+                    print("✨ 回答已达到要求，停止反思。")
+                    break
+                feedback = "\n".join(f"- {issue}" for issue in verdict["issues"]) or "请修正回答中的硬伤。"
+            else:
+                reflect_msg = [{
+                    'role': 'user',
+                    'content': self.prompts['reflect'].format(
+                        task=input_text,
+                        content=current_answer
+                    )
+                }]
+
+                feedback = self.llm.invoke(reflect_msg, **kwargs).strip()
+                print(f"\n反馈意见:\n{feedback}")
+
+                # Check for completion
+                if "无需改进" in feedback:
+                    print("✨ 回答已达到要求，停止反思。")
+                    break
 
             # Refine
             refine_msg = [{
@@ -110,6 +146,42 @@ class MyReflectionAgent(SimpleAgent):
 
         return current_answer
 
+    def _judge(self, task: str, content: str, **kwargs) -> Dict[str, Any]:
+        """ 结构化判定：用短 max_tokens 的 JSON 输出代替长篇评审，通过时几乎不产生额外 token。 """
+        judge = self.judge_llm or self.llm
+        verdict_prompt = self.prompts.get("verdict", MY_VERDICT_PROMPT)
+        messages = [{'role': 'user', 'content': verdict_prompt.format(task=task, content=content)}]
+        params = {
+            **kwargs,
+            "max_tokens": self.verdict_max_tokens,
+            "temperature": 0,
+            "response_format": {"type": "json_object"},
+        }
+        raw = judge.invoke(messages, **params).strip()
+        return self._parse_verdict(raw)
+
+    @staticmethod
+    def _parse_verdict(raw: str) -> Dict[str, Any]:
+        """ 解析判定 JSON；解析失败时退化为关键词判断，并把原文作为问题描述。 """
+        match = re.search(r'\{.*\}', raw, re.DOTALL)
+        try:
+            data = json.loads(match.group(0) if match else raw)
+            needs_revision = data.get("needs_revision", True)
+            if isinstance(needs_revision, str):
+                needs_revision = needs_revision.strip().lower() not in ("false", "no", "0")
+            issues = data.get("issues") or []
+            if not isinstance(issues, list):
+                issues = [str(issues)]
+            return {"needs_revision": bool(needs_revision), "issues": [str(i) for i in issues]}
+        except (ValueError, AttributeError):
+            # 输出被 max_tokens 截断时，判定字段通常仍然完整
+            flag = re.search(r'"needs_revision"\s*:\s*(true|false)', raw, re.IGNORECASE)
+            if flag and flag.group(1).lower() == "false":
+                return {"needs_revision": False, "issues": []}
+            if "无需改进" in raw:
+                return {"needs_revision": False, "issues": []}
+            return {"needs_revision": True, "issues": [raw]}
+
 
 def test_reflection():
     from my_llm import MyLLM
@@ -143,6 +215,16 @@ def test_reflection():
     )
     code_agent.run("写一个斐波那契数列函数")
 
+    # 测试3: 结构化判定
+    print("=== 测试3: 结构化判定反思助手 ===")
+    verdict_agent = MyReflectionAgent(
+        name="结构化判定助手",
+        llm=llm,
+        verdict_mode="json",
+        max_reflections=2
+    )
+    verdict_agent.run("用三句话解释什么是梯度下降")
+
 
 if __name__ == "__main__":
     test_reflection()
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+统一的搜索结果模型与摘要打包
+
+各搜索数据源（SerpAPI / Tavily / 本地索引）的返回格式不同，这里先统一为 SearchResult，再做：
+- 去重：同一 URL（忽略协议、www、查询参数）或高度相似的标题视为同一条结果
+- 质量评分：查询词覆盖率、标题命中、原始排名、摘要长度和多源佐证
+- 摘要打包：把摘要拆成句子级片段，在给定的 token 预算内优先放入与查询最相关的片段
+
+这样交给下游 LLM 的上下文更短，但覆盖的有效信息更多。
+"""
+import math
+import re
+from dataclasses import dataclass, field, replace
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from myAgent.my_local_search import tokenize
+
+_SENTENCE_PATTERN = re.compile(r'(?<=[。！？!?；;])\s*|(?<=[.])\s+|\n+')
+_CJK_PATTERN = re.compile(r'[一-鿿]')
+_WORD_PATTERN = re.compile(r'[A-Za-z0-9]+|[^\sA-Za-z0-9一-鿿]')
+
+# 句子放不下时截断；剩余预算少于该值时不再截断出零碎片段（第一条结果除外）
+MIN_SNIPPET_TOKENS = 20
+
+
+@dataclass
+class SearchResult:
+    """ 一条搜索结果。rank 为在原数据源中的排名（从 1 开始），score 为质量分。 """
+    title: str
+    url: str = ""
+    snippet: str = ""
+    source: str = ""
+    rank: int = 0
+    score: float = 0.0
+    sources: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if self.source and not self.sources:
+            self.sources = [self.source]
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any], source: str = "", rank: int = 0) -> "SearchResult":
+        """ 兼容常见字段名：url / link，snippet / content / description。 """
+        return cls(
+            title=(item.get("title") or "").strip(),
+            url=item.get("url") or item.get("link") or "",
+            snippet=(item.get("snippet") or item.get("content") or item.get("description") or "").strip(),
+            source=item.get("source") or source,
+            rank=item.get("rank") or rank,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"title": self.title, "url": self.url, "snippet": self.snippet, "source": self.source,
+                "rank": self.rank, "score": round(self.score, 4), "sources": list(self.sources)}
+
+
+def normalize_url(url: str) -> str:
+    """ 归一化 URL 用于去重：去掉协议、www 前缀、查询参数、片段和末尾斜杠。 """
+    if not url:
+        return ""
+    parts = urlsplit(url.strip().lower())
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    return f"{host}{parts.path.rstrip('/')}"
+
+
+def normalize_title(title: str) -> str:
+    return re.sub(r'[\W_]+', '', title.lower())
+
+
+def from_items(items: Iterable[Dict[str, Any]], source: str) -> List[SearchResult]:
+    return [SearchResult.from_dict(item, source=source, rank=i) for i, item in enumerate(items, 1)]
+
+
+def from_tavily(response: Dict[str, Any]) -> Tuple[Optional[str], List[SearchResult]]:
+    """ 解析 Tavily 返回，得到 (智能回答, 结果列表)。 """
+    return response.get("answer"), from_items(response.get("results", []), "tavily")
+
+
+def from_serpapi(response: Dict[str, Any]) -> Tuple[Optional[str], List[SearchResult]]:
+    """ 解析 SerpAPI 返回：Answer Box / 知识图谱作为直接答案，自然搜索结果作为结果列表。 """
+    answer = None
+    box = response.get("answer_box") or {}
+    if box.get("answer"):
+        answer = f"直接答案: {box['answer']}"
+    elif box.get("snippet"):
+        answer = f"精选摘要: {box['snippet']}"
+    elif box.get("snippet_highlighted_words"):
+        answer = f"重点: {box['snippet_highlighted_words']}"
+    else:
+        kg = response.get("knowledge_graph") or {}
+        if kg.get("description"):
+            answer = f"知识卡片 ({kg.get('title', '')}): {kg['description']}"
+    return answer, from_items(response.get("organic_results", []), "serpapi")
+
+
+def dedupe(results: List[SearchResult], title_threshold: float = 0.85) -> List[SearchResult]:
+    """ 合并重复结果：保留排名靠前那条的摘要（为空时才用另一条的）和更靠前的排名，并记录所有来源。 """
+    merged: List[Tuple[str, str, SearchResult]] = []
+    for result in results:
+        url_key, title_key = normalize_url(result.url), normalize_title(result.title)
+        match = None
+        for existing_url, existing_title, existing in merged:
+            if (url_key and url_key == existing_url) or (
+                    title_key and existing_title and
+                    SequenceMatcher(None, title_key, existing_title).ratio() >= title_threshold):
+                match = existing
+                break
+        if match is None:
+            merged.append((url_key, title_key, replace(result, sources=list(result.sources))))
+            continue
+        if not match.snippet:
+            match.snippet = result.snippet
+        if result.rank and (not match.rank or result.rank < match.rank):
+            match.rank = result.rank
+        for source in result.sources:
+            if source not in match.sources:
+                match.sources.append(source)
+    return [result for _, _, result in merged]
+
+
+def score_results(results: List[SearchResult], query: str) -> List[SearchResult]:
+    """ 计算质量分并按分数从高到低排序。 """
+    query_terms = set(tokenize(query))
+    for result in results:
+        body_terms = set(tokenize(f"{result.title} {result.snippet}"))
+        title_terms = set(tokenize(result.title))
+        coverage = len(query_terms & body_terms) / len(query_terms) if query_terms else 0.0
+        title_hit = len(query_terms & title_terms) / len(query_terms) if query_terms else 0.0
+        rank_prior = 1.0 / math.sqrt(result.rank) if result.rank else 0.5
+        length = min(len(result.snippet) / 200, 1.0)
+        corroboration = min(len(result.sources) - 1, 2) * 0.05 if result.sources else 0.0
+        result.score = 0.45 * coverage + 0.2 * title_hit + 0.2 * rank_prior + 0.15 * length + corroboration
+    results.sort(key=lambda r: r.score, reverse=True)
+    return results
+
+
+def estimate_tokens(text: str) -> int:
+    """ 粗略估计 token 数：每个汉字约 1 个，每个英文单词 / 数字约 1.3 个，标点 1 个。 """
+    cjk = len(_CJK_PATTERN.findall(text))
+    words = _WORD_PATTERN.findall(text)
+    ascii_words = sum(1 for w in words if w[0].isalnum())
+    return cjk + math.ceil(ascii_words * 1.3) + (len(words) - ascii_words)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """ 截取不超过 budget 个 token 的最长前缀（二分查找），被截断时末尾加省略号。 """
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + "…"
+
+
+def pack_snippets(
+        results: List[SearchResult],
+        query: str,
+        token_budget: int = 800,
+        max_results: int = 5,
+) -> List[Tuple[SearchResult, List[str]]]:
+    """
+    在 token 预算内挑选片段：每条结果的摘要拆成句子，按 (结果质量 × 与查询的重合度) 贪心放入。
+    放不下的句子截断到剩余预算；即使预算很小，也至少保留第一条结果。
+    返回 [(结果, 选中的句子)]，结果按质量分排序，句子保持原文顺序。
+    """
+    query_terms = set(tokenize(query))
+    candidates = []
+    for r_index, result in enumerate(results[:max_results]):
+        sentences = [s.strip() for s in _SENTENCE_PATTERN.split(result.snippet) if s and s.strip()]
+        for s_index, sentence in enumerate(sentences):
+            overlap = len(query_terms & set(tokenize(sentence)))
+            # 同一条结果中越靠前的句子越可能是摘要的核心
+            priority = result.score * (1 + overlap) / (1 + 0.1 * s_index)
+            candidates.append((priority, r_index, s_index, sentence))
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+
+    used = 0
+    chosen: Dict[int, List[Tuple[int, str]]] = {}
+    for _, r_index, s_index, sentence in candidates:
+        # 第一次选中某条结果时，还要算上标题和链接的开销
+        overhead = 0 if r_index in chosen else estimate_tokens(results[r_index].title) + 10
+        remaining = token_budget - used - overhead
+        if estimate_tokens(sentence) > remaining:
+            if remaining < MIN_SNIPPET_TOKENS:
+                continue
+            sentence = truncate_to_tokens(sentence, remaining)
+        used += overhead + estimate_tokens(sentence)
+        chosen.setdefault(r_index, []).append((s_index, sentence))
+
+    if not chosen and candidates:
+        # 预算连一条结果都放不下时，仍然返回最相关的片段，避免调用方拿到空上下文
+        _, r_index, s_index, sentence = candidates[0]
+        remaining = token_budget - estimate_tokens(results[r_index].title) - 10
+        chosen[r_index] = [(s_index, truncate_to_tokens(sentence, max(remaining, MIN_SNIPPET_TOKENS)))]
+
+    return [(results[r_index], [s for _, s in sorted(chosen[r_index])]) for r_index in sorted(chosen)]
+
+
+def _join_sentences(sentences: List[str]) -> str:
+    """ 中文句子之间直接拼接，其他情况用空格分隔。 """
+    text = ""
+    for sentence in sentences:
+        if text and not re.search(r'[。！？；，]$', text):
+            text += " "
+        text += sentence
+    return text
+
+
+def format_results(
+        results: List[SearchResult],
+        query: str,
+        token_budget: int = 800,
+        max_results: int = 5,
+        answer: Optional[str] = None,
+        answer_label: str = "💡 回答: ",
+        results_label: str = "🔗 相关链接:",
+        link_label: str = "来源",
+) -> str:
+    """ 去重、评分、打包后格式化为交给 LLM 的文本；直接答案（若有）放在最前面且不占用预算。 """
+    ranked = score_results(dedupe(results), query)
+    lines = []
+    if answer:
+        lines.append(f"{answer_label}{answer}\n")
+    packed = pack_snippets(ranked, query, token_budget=token_budget, max_results=max_results)
+    if packed:
+        lines.append(results_label)
+        for i, (result, sentences) in enumerate(packed, 1):
+            lines.append(f"[{i}] {result.title or '无标题'}")
+            lines.append(f"    {_join_sentences(sentences)}")
+            if result.url:
+                lines.append(f"    {link_label}: {result.url}")
+            lines.append("")
+    return "\n".join(lines).rstrip()
+
+
+# ==================== 测试 ====================
+
+def test_pack_snippets():
+    # 一条没有标点的超长摘要：截断到预算内，而不是整条丢弃导致上下文为空
+    long_snippet = " ".join(f"word{i}" for i in range(700))
+    results = [SearchResult("Agent 框架对比", "https://example.com/a", long_snippet, "tavily", rank=1)]
+    text = format_results(results, "agent 框架", token_budget=600)
+    assert text and "[1] Agent 框架对比" in text, text
+    assert estimate_tokens(text) <= 600 + 20, estimate_tokens(text)
+    print(f"✓ 超长摘要被截断: {estimate_tokens(text)} tokens")
+
+    # 预算小于标题开销时也至少保留第一条结果
+    assert format_results(results, "agent", token_budget=5)
+    print("✓ 极小预算仍保留第一条结果")
+
+    # 去重保留排名靠前那条的摘要，不会被放不下的长摘要替换
+    short = SearchResult("Agent 框架对比", "https://example.com/a?ref=x", "各框架的优缺点总结。", "serpapi", rank=1)
+    merged = dedupe([short, results[0]])
+    assert len(merged) == 1 and merged[0].snippet == short.snippet and merged[0].sources == ["serpapi", "tavily"]
+    print("✓ 去重保留靠前结果的摘要")
+
+
+if __name__ == "__main__":
+    test_pack_snippets()
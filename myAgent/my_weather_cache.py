@@ -0,0 +1,203 @@
+"""
+天气查询缓存
+
+天气变化缓慢，而用户反复查询的往往是同一批城市，因此所有天气工具共用这里的缓存：
+- 城市名归一化：中文名 / 别名 / 大小写不同的英文名都映射到同一个规范城市名，作为缓存键
+- TTL 缓存：在有效期内直接返回上次的结果，不再请求 wttr.in
+- 请求合并：同一城市的并发查询只发起一次上游请求，其余调用方等待并共享结果
+- 抖动退避：失败重试采用带随机抖动的指数退避，避免固定间隔的同步重试
+
+有效期可通过环境变量 WEATHER_CACHE_TTL（秒）配置，每次上游查询的最多尝试次数通过 WEATHER_RETRIES 配置。
+"""
+import copy
+import os
+import random
+import threading
+import time
+import unicodedata
+import urllib.parse
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from myAgent.my_http_pool import get_http_pool
+
+CITY_MAP = {
+    "北京": "Beijing",
+    "上海": "Shanghai",
+    "广州": "Guangzhou",
+    "深圳": "Shenzhen",
+    "纽约": "New York",
+    "伦敦": "London",
+    "巴黎": "Paris",
+    "东京": "Tokyo"
+}
+
+# 常见别名（小写），映射到 CITY_MAP 中的英文名
+CITY_ALIASES = {
+    "peking": "Beijing",
+    "bj": "Beijing",
+    "sh": "Shanghai",
+    "canton": "Guangzhou",
+    "gz": "Guangzhou",
+    "sz": "Shenzhen",
+    "nyc": "New York",
+    "ny": "New York",
+    "new york city": "New York",
+    "纽约市": "New York",
+    "东京都": "Tokyo",
+}
+
+_CITY_SUFFIXES = ("市", "都")
+
+WTTR_URL = "https://wttr.in/{city}?format=j1"
+# 查询 wttr.in 的最多尝试次数（含第一次）
+WEATHER_RETRIES = int(os.getenv("WEATHER_RETRIES", 3))
+WTTR_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+
+def canonical_city(city: str) -> str:
+    """ 城市名归一化：北京 / 北京市 / beijing / Peking -> Beijing；未知城市按英文标题格式返回。 """
+    name = ' '.join(unicodedata.normalize('NFKC', city).split())
+    if not name:
+        return name
+    lowered = name.lower()
+    if name in CITY_MAP:
+        return CITY_MAP[name]
+    if lowered in CITY_ALIASES:
+        return CITY_ALIASES[lowered]
+    for suffix in _CITY_SUFFIXES:
+        if name.endswith(suffix) and name[:-len(suffix)] in CITY_MAP:
+            return CITY_MAP[name[:-len(suffix)]]
+    for city_en in CITY_MAP.values():
+        if lowered == city_en.lower():
+            return city_en
+    return name.title() if name.isascii() else name
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 4.0) -> float:
+    """ 全抖动 (full jitter) 指数退避：在 [0, min(cap, base * 2^attempt)] 中随机取值。 """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_with_backoff(fn: Callable[[], Any], retries: int = 3, base: float = 0.5, cap: float = 4.0) -> Any:
+    """ 调用 fn，失败时按抖动退避重试，最后一次的异常向上抛出。 """
+    for attempt in range(retries):
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries - 1:
+                raise
+            time.sleep(backoff_delay(attempt, base, cap))
+
+
+def fetch_current_condition(city_en: str, timeout: float = 10, retries: int = WEATHER_RETRIES) -> Dict[str, Any]:
+    """ 请求 wttr.in，返回 current_condition[0]。 """
+    url = WTTR_URL.format(city=urllib.parse.quote(city_en))
+
+    def request() -> Dict[str, Any]:
+        response = get_http_pool().get(url, headers=WTTR_HEADERS, timeout=timeout)
+        response.raise_for_status()
+        return response.json()['current_condition'][0]
+
+    return retry_with_backoff(request, retries=retries)
+
+
+class _InFlight:
+    """ 一次正在进行的上游请求，后到的调用方在 event 上等待结果。 """
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+
+
+class WeatherCache:
+    """
+    线程安全的天气 TTL 缓存，带请求合并。失败结果不缓存。
+
+    :param ttl: 缓存有效期（秒）
+    :param max_entries: 最大缓存城市数，超出时淘汰最早写入的条目
+    :param fetch_fn: 上游请求函数 city_en -> current_condition，默认请求 wttr.in
+    """
+    def __init__(
+            self,
+            ttl: Optional[float] = None,
+            max_entries: int = 256,
+            fetch_fn: Callable[[str], Dict[str, Any]] = fetch_current_condition,
+    ):
+        self.ttl = ttl if ttl is not None else float(os.getenv("WEATHER_CACHE_TTL", 600))
+        self.max_entries = max_entries
+        self.fetch_fn = fetch_fn
+        self._entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._inflight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, city: str) -> Dict[str, Any]:
+        """
+        返回城市当前天气 (wttr.in 的 current_condition)，上游失败时抛出异常。
+        返回的是缓存条目的副本，调用方修改结果不会影响其他调用方。
+        """
+        key = canonical_city(city)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = self._inflight[key] = _InFlight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            inflight.event.wait()
+            if inflight.error is not None:
+                raise inflight.error
+            return copy.deepcopy(inflight.value)
+
+        try:
+            inflight.value = self.fetch_fn(key)
+            with self._lock:
+                self._entries[key] = (time.monotonic(), inflight.value)
+                while len(self._entries) > self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            return copy.deepcopy(inflight.value)
+        except Exception as e:
+            inflight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.event.set()
+
+    def invalidate(self, city: Optional[str] = None) -> None:
+        """ 清除指定城市（或全部）的缓存。 """
+        with self._lock:
+            if city is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(canonical_city(city), None)
+
+
+_default_cache: Optional[WeatherCache] = None
+_default_lock = threading.Lock()
+
+
+def get_weather_cache() -> WeatherCache:
+    """ 获取进程内共享的天气缓存。 """
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = WeatherCache()
+    return _default_cache
+
+
+def get_current_weather(city: str) -> Dict[str, Any]:
+    """ 通过共享缓存查询城市当前天气。 """
+    return get_weather_cache().get(city)
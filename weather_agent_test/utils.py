@@ -1,9 +1,9 @@
 import os
-import time
-import requests
-from tavily import TavilyClient
 from dotenv import load_dotenv
 
+from myAgent.my_http_pool import get_http_pool
+from myAgent.my_weather_cache import WEATHER_RETRIES, get_current_weather
+
 # 加载环境变量
 load_dotenv()
 
@@ -40,27 +40,16 @@ def print_colored(role, text):
 # ==========================================
 
 def get_weather(city):
-    """查询天气，内置重试机制"""
+    """查询天气，共享缓存 + 抖动退避重试"""
     print(f"   (正在连接天气服务查询 {city}...)")
-    url = f"https://wttr.in/{city}?format=j1"
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-
-            cur = data['current_condition'][0]
-            weather_desc = cur['weatherDesc'][0]['value']
-            temp_c = cur['temp_C']
-            humidity = cur['humidity']
-            return f"【{city}天气】: {weather_desc}, 温度 {temp_c}℃, 湿度 {humidity}%"
-
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(1)
-                continue
-            return f"Error: 天气查询服务暂时不可用 (已重试{max_retries}次)。请告知用户稍后再试或根据一般经验回答。"
+    try:
+        cur = get_current_weather(city)
+        weather_desc = cur['weatherDesc'][0]['value']
+        temp_c = cur['temp_C']
+        humidity = cur['humidity']
+        return f"【{city}天气】: {weather_desc}, 温度 {temp_c}℃, 湿度 {humidity}%"
+    except Exception:
+        return f"Error: 天气查询服务暂时不可用 (已尝试{WEATHER_RETRIES}次)。请告知用户稍后再试或根据一般经验回答。"
 
 
 def get_attraction(city, weather):
@@ -70,7 +59,7 @@ def get_attraction(city, weather):
         return "Error: 未配置 TAVILY_API_KEY"
 
     print(f"   (正在搜索适合 {weather} 的 {city} 景点...)")
-    tavily = TavilyClient(api_key=api_key)
+    tavily = get_http_pool().tavily_client(api_key)
     query = f"推荐适合在{city}旅游的景点，当前天气{weather}，排除广告"
 
     try: